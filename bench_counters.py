@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Banc des compteurs de counters.py: débit et exactitude sous contention
+
+Pour chaque stratégie et chaque nombre de threads (puis de processus pour
+les stratégies partagées entre processus), tous les travailleurs partent
+ensemble (Barrier) et font chacun `--increments` incréments. Le banc
+mesure les incréments par seconde et compare la valeur finale au total
+attendu: un écart signale des incréments perdus (cas du compteur 'unsafe').
+
+Exemples:
+    python bench_counters.py --threads 1,2,4,8 --processes 1,2,4
+    python bench_counters.py --strategies lock,striped,local --increments 1000000 --json
+"""
+
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+
+import counters
+
+
+def work(counter, increments, barrier):
+    increment = counter.increment
+    barrier.wait()
+    for _ in range(increments):
+        increment()
+
+
+def measure_threads(strategy, threads, increments):
+    counter = counters.make_counter(strategy)
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=work, args=(counter, increments, barrier)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return counter.value(), time.perf_counter() - start
+
+
+def measure_processes(strategy, processes, increments, context):
+    counter = counters.make_counter(strategy, context=context)
+    barrier = context.Barrier(processes + 1)
+    workers = [context.Process(target=work, args=(counter, increments, barrier)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return counter.value(), time.perf_counter() - start
+
+
+def result(strategy, mode, workers, increments, value, seconds):
+    expected = workers * increments
+    return {
+        'strategy': strategy,
+        'mode': mode,
+        'workers': workers,
+        'increments_per_sec': round(value / seconds) if seconds else None,
+        'seconds': round(seconds, 4),
+        'expected': expected,
+        'value': value,
+        'lost': expected - value,
+    }
+
+
+def run(strategies, thread_counts, process_counts, increments, start_method=None):
+    results = []
+    for strategy in strategies:
+        for threads in thread_counts:
+            value, seconds = measure_threads(strategy, threads, increments)
+            results.append(result(strategy, 'threads', threads, increments, value, seconds))
+
+    context = multiprocessing.get_context(start_method)
+    for strategy in strategies:
+        if strategy not in counters.PROCESS_SAFE:
+            continue
+        for processes in process_counts:
+            value, seconds = measure_processes(strategy, processes, increments, context)
+            results.append(result(strategy, 'processes', processes, increments, value, seconds))
+
+    return {'increments_per_worker': increments, 'start_method': context.get_start_method(),
+            'results': results}
+
+
+def print_table(report):
+    print(f"{report['increments_per_worker']} incréments par travailleur "
+          f"(processus: {report['start_method']})\n")
+    print(f"{'stratégie':>12} {'mode':>9} {'nb':>4} {'incr./s':>12} {'durée s':>8} {'perdus':>8}")
+    for row in report['results']:
+        print(f"{row['strategy']:>12} {row['mode']:>9} {row['workers']:>4} {row['increments_per_sec']:>12} "
+              f"{row['seconds']:>8} {row['lost']:>8}")
+
+
+def parse_ints(text):
+    return [int(item) for item in text.split(',') if item]
+
+
+def parse_strategies(text):
+    strategies = [item for item in text.split(',') if item]
+    for strategy in strategies:
+        if strategy not in counters.STRATEGIES:
+            raise argparse.ArgumentTypeError(f"stratégie inconnue: {strategy}")
+    return strategies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc des compteurs partagés")
+    parser.add_argument('--strategies', type=parse_strategies, default=list(counters.STRATEGIES),
+                        help="ex: unsafe,lock,striped,local,shared,process-lock")
+    parser.add_argument('--threads', type=parse_ints, default=[1, 2, 4, 8], help="nombres de threads, ex: 1,2,4,8")
+    parser.add_argument('--processes', type=parse_ints, default=[1, 2, 4],
+                        help="nombres de processus (stratégies partagées seulement), ex: 1,2,4")
+    parser.add_argument('--increments', type=int, default=200000, help="incréments par thread ou processus")
+    parser.add_argument('--start-method', choices=multiprocessing.get_all_start_methods(), default=None)
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.strategies, args.threads, args.processes, args.increments, args.start_method)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
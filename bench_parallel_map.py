@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Banc de parallel_map.py: accélération par rapport au séquentiel, charge par charge
+
+Reprend le tableau de pool.py (séquentiel contre Pool(processes=8).map) pour
+des charges variées, et ajoute parallel_map avec le mode, le nombre de
+travailleurs et la taille de lot qu'il a choisis:
+- sleep: l'exemple de pool.py (10 éléments de 0.1 s d'attente);
+- io: beaucoup de petites attentes (1 ms), comme des appels réseau;
+- cpu: calcul en pur Python (quelques ms par élément);
+- tiny: des milliers d'éléments presque gratuits (n * n), où le coût du
+  pool domine;
+- mixed: calcul et attente mélangés.
+
+Exemples:
+    python bench_parallel_map.py
+    python bench_parallel_map.py --workloads cpu,tiny --scale 2 --json
+"""
+
+import argparse
+import json
+import time
+from multiprocessing import Pool
+
+from parallel_map import ParallelMap
+
+
+def sleep_task(n):
+    time.sleep(0.1)
+    return n * n
+
+
+def io_task(n):
+    time.sleep(0.001)
+    return n
+
+
+def cpu_task(n):
+    total = 0
+    for i in range(20000):
+        total += i * i % (n + 1)
+    return total
+
+
+def tiny_task(n):
+    return n * n
+
+
+def mixed_task(n):
+    time.sleep(0.002)
+    return cpu_task(n) if n % 4 == 0 else n
+
+
+# {nom: (fonction, nombre d'éléments à l'échelle 1)}
+WORKLOADS = {
+    'sleep': (sleep_task, 10),
+    'io': (io_task, 2000),
+    'cpu': (cpu_task, 300),
+    'tiny': (tiny_task, 200000),
+    'mixed': (mixed_task, 500),
+}
+
+
+def timed(run):
+    start = time.perf_counter()
+    results = run()
+    return results, time.perf_counter() - start
+
+
+def measure(name, scale, pool_processes):
+    func, count = WORKLOADS[name]
+    items = list(range(int(count * scale)))
+
+    expected, sequential = timed(lambda: [func(item) for item in items])
+
+    def with_pool():
+        with Pool(processes=pool_processes) as pool:
+            return pool.map(func, items)
+    pool_results, pool_seconds = timed(with_pool)
+
+    with ParallelMap() as engine:
+        adaptive_results, adaptive_seconds = timed(lambda: list(engine.map(func, items)))
+        plan = engine.last_plan
+
+    return {
+        'workload': name,
+        'items': len(items),
+        'sequential_s': round(sequential, 3),
+        'pool_s': round(pool_seconds, 3),
+        'pool_speedup': round(sequential / pool_seconds, 2),
+        'adaptive_s': round(adaptive_seconds, 3),
+        'adaptive_speedup': round(sequential / adaptive_seconds, 2),
+        'mode': plan.mode,
+        'workers': plan.workers,
+        'chunksize': plan.chunksize,
+        'per_item_ms': round(plan.per_item * 1e3, 4),
+        'correct': pool_results == expected and adaptive_results == expected,
+    }
+
+
+def run(workloads, scale, pool_processes):
+    return {'scale': scale, 'pool_processes': pool_processes,
+            'results': [measure(name, scale, pool_processes) for name in workloads]}
+
+
+def print_table(report):
+    print(f"Référence: Pool(processes={report['pool_processes']}).map, chunksize par défaut\n")
+    print(f"{'charge':>7} {'éléments':>9} {'séq. s':>8} {'Pool s':>8} {'accél.':>7} "
+          f"{'adapt. s':>9} {'accél.':>7}  choix")
+    for row in report['results']:
+        status = "" if row['correct'] else "  ❌ résultats différents"
+        print(f"{row['workload']:>7} {row['items']:>9} {row['sequential_s']:>8} {row['pool_s']:>8} "
+              f"{row['pool_speedup']:>6}x {row['adaptive_s']:>9} {row['adaptive_speedup']:>6}x  "
+              f"{row['mode']}, {row['workers']} trav., lots de {row['chunksize']}{status}")
+
+
+def parse_workloads(text):
+    names = [item for item in text.split(',') if item]
+    for name in names:
+        if name not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"charge inconnue: {name}")
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc du map parallèle adaptatif")
+    parser.add_argument('--workloads', type=parse_workloads, default=list(WORKLOADS),
+                        help="ex: sleep,io,cpu,tiny,mixed")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplie le nombre d'éléments")
+    parser.add_argument('--pool-processes', type=int, default=8, help="processus du Pool de référence")
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.workloads, args.scale, args.pool_processes)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
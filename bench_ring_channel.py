@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Banc de ring_channel.py contre multiprocessing.Pipe et multiprocessing.Queue
+
+Un processus producteur envoie `--count` messages de chaque taille à un
+consommateur (le processus principal), pour chaque transport:
+- pipe: Connection.send_bytes / recv_bytes (sans pickle, le plus favorable);
+- queue: Queue.put / get (pickle et thread d'alimentation);
+- ring: RingChannel.send_bytes / recv_view (lecture sans copie);
+- ring-batch: RingChannel.send_many / recv_many par lots de `--batch`.
+Le banc mesure les messages et mégaoctets par seconde, du départ commun
+(Barrier) à la réception du dernier message.
+
+Exemples:
+    python bench_ring_channel.py
+    python bench_ring_channel.py --sizes 64,4096,262144 --count 20000 --json
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+from ring_channel import RingChannel
+
+TRANSPORTS = ('pipe', 'queue', 'ring', 'ring-batch')
+# Volume maximal par mesure: moins de messages pour les grandes tailles
+MAX_BYTES = 256 << 20
+
+
+def produce(transport, endpoint, count, size, batch, barrier):
+    payload = bytes(size)
+    barrier.wait()
+    if transport == 'pipe':
+        for _ in range(count):
+            endpoint.send_bytes(payload)
+    elif transport == 'queue':
+        for _ in range(count):
+            endpoint.put(payload)
+    elif transport == 'ring':
+        for _ in range(count):
+            endpoint.send_bytes(payload)
+        endpoint.detach()
+    else:
+        for start in range(0, count, batch):
+            endpoint.send_many([payload] * min(batch, count - start))
+        endpoint.detach()
+
+
+def consume(transport, endpoint, count, batch):
+    received = 0
+    if transport == 'pipe':
+        for _ in range(count):
+            received += len(endpoint.recv_bytes())
+    elif transport == 'queue':
+        for _ in range(count):
+            received += len(endpoint.get())
+    elif transport == 'ring':
+        for _ in range(count):
+            received += len(endpoint.recv_view())
+    else:
+        remaining = count
+        while remaining:
+            views = endpoint.recv_many(batch, copy=False)
+            remaining -= len(views)
+            received += sum(map(len, views))
+    return received
+
+
+def measure(transport, size, count, batch, capacity):
+    count = max(1, min(count, MAX_BYTES // size))
+    barrier = multiprocessing.Barrier(2)
+    channel = None
+    if transport == 'pipe':
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+    elif transport == 'queue':
+        receiver = sender = multiprocessing.Queue()
+    else:
+        channel = receiver = sender = RingChannel(capacity)
+
+    producer = multiprocessing.Process(target=produce, args=(transport, sender, count, size, batch, barrier))
+    producer.start()
+    barrier.wait()
+    start = time.perf_counter()
+    received = consume(transport, receiver, count, batch)
+    seconds = time.perf_counter() - start
+    producer.join()
+    if channel:
+        channel.detach()
+        channel.unlink()
+
+    return {
+        'transport': transport,
+        'size': size,
+        'messages': count,
+        'seconds': round(seconds, 4),
+        'messages_per_sec': round(count / seconds),
+        'mb_per_sec': round(received / seconds / 1e6, 1),
+        'correct': received == count * size,
+    }
+
+
+def run(transports, sizes, count, batch, capacity):
+    results = [measure(transport, size, count, batch, capacity) for size in sizes for transport in transports]
+    return {'count': count, 'batch': batch, 'capacity': capacity, 'results': results}
+
+
+def print_table(report):
+    print(f"{report['count']} messages par mesure (moins pour les grandes tailles), "
+          f"lots de {report['batch']}, tampon de {report['capacity']} octets\n")
+    print(f"{'transport':>11} {'taille':>8} {'messages':>9} {'msg/s':>10} {'Mo/s':>8}")
+    for row in report['results']:
+        status = "" if row['correct'] else "  ❌ octets manquants"
+        print(f"{row['transport']:>11} {row['size']:>8} {row['messages']:>9} "
+              f"{row['messages_per_sec']:>10} {row['mb_per_sec']:>8}{status}")
+
+
+def parse_ints(text):
+    return [int(item) for item in text.split(',') if item]
+
+
+def parse_transports(text):
+    transports = [item for item in text.split(',') if item]
+    for transport in transports:
+        if transport not in TRANSPORTS:
+            raise argparse.ArgumentTypeError(f"transport inconnu: {transport}")
+    return transports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc du canal en mémoire partagée")
+    parser.add_argument('--transports', type=parse_transports, default=list(TRANSPORTS),
+                        help="ex: pipe,queue,ring,ring-batch")
+    parser.add_argument('--sizes', type=parse_ints, default=[64, 1024, 16384, 262144],
+                        help="tailles des messages (octets), ex: 64,1024,16384")
+    parser.add_argument('--count', type=int, default=50000, help="messages par mesure")
+    parser.add_argument('--batch', type=int, default=64, help="messages par lot (ring-batch)")
+    parser.add_argument('--capacity', type=int, default=4 << 20, help="taille du tampon circulaire (octets)")
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.transports, args.sizes, args.count, args.batch, args.capacity)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Banc du démarrage des processus et de warm_pool.py
+
+Deux séries de mesures:
+- démarrage: pour chaque méthode (spawn, fork, forkserver), `--repeat` fois
+  Process(target=...).start() puis join(), avec une cible qui importe les
+  modules de `--preload` (déjà importés par le parent pour fork, préchargés
+  par le serveur pour forkserver). Le premier démarrage est donné à part: en
+  forkserver, il inclut le lancement du serveur;
+- de bout en bout: les scénarios d'exemple1.py (3 tâches de 0.2 s) et de
+  piddisplay.py (afficher son PID), plus un scénario de tâches courtes,
+  répétés sur `--batches` lots: en séquentiel, avec un Process par tâche
+  (comme les deux scripts) et avec un WarmPool créé une fois pour tous les
+  lots (son démarrage est mesuré à part).
+
+Exemples:
+    python bench_warm_pool.py
+    python bench_warm_pool.py --methods fork,forkserver --repeat 50 --batches 10 --json
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import statistics
+import time
+
+from warm_pool import WarmPool, calculs
+
+METHODS = [method for method in ('spawn', 'fork', 'forkserver') if method in multiprocessing.get_all_start_methods()]
+
+
+def import_modules(modules):
+    for name in modules:
+        importlib.import_module(name)
+
+
+def pid_task():
+    """Comme display_pidProcess dans piddisplay.py, sans l'affichage"""
+    return os.getpid()
+
+
+def short_task():
+    time.sleep(0.001)
+    return sum(range(1000))
+
+
+# {nom: (fonction, tâches par lot)}
+SCENARIOS = {
+    'exemple1': (calculs, 3),
+    'piddisplay': (pid_task, 2),
+    'court': (short_task, 20),
+}
+
+
+def measure_startup(method, repeat, preload):
+    context = multiprocessing.get_context(method)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = context.Process(target=import_modules, args=(preload,))
+        process.start()
+        process.join()
+        durations.append(time.perf_counter() - start)
+    rest = durations[1:] or durations
+    return {
+        'method': method,
+        'first_ms': round(durations[0] * 1e3, 2),
+        'median_ms': round(statistics.median(rest) * 1e3, 2),
+        'min_ms': round(min(rest) * 1e3, 2),
+    }
+
+
+def run_sequential(func, tasks, batches):
+    for _ in range(batches):
+        for _ in range(tasks):
+            func()
+
+
+def run_processes(func, tasks, batches):
+    for _ in range(batches):
+        processes = [multiprocessing.Process(target=func) for _ in range(tasks)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+
+def run_warm_pool(func, tasks, batches, preload, max_tasks):
+    """Renvoie le temps de démarrage du pool, celui des lots, et les travailleurs recyclés"""
+    start = time.perf_counter()
+    with WarmPool(workers=tasks, preload=preload, max_tasks=max_tasks) as pool:
+        pool.warm()
+        ready = time.perf_counter()
+        for _ in range(batches):
+            for result in [pool.submit(func) for _ in range(tasks)]:
+                result.get()
+        return ready - start, time.perf_counter() - ready, pool.recycled
+
+
+def timed(run, *args):
+    start = time.perf_counter()
+    run(*args)
+    return time.perf_counter() - start
+
+
+def measure_scenario(name, batches, preload, max_tasks):
+    func, tasks = SCENARIOS[name]
+    sequential = timed(run_sequential, func, tasks, batches)
+    processes = timed(run_processes, func, tasks, batches)
+    warm_start, warm, recycled = run_warm_pool(func, tasks, batches, preload, max_tasks)
+    return {
+        'scenario': name,
+        'tasks': tasks * batches,
+        'sequential_s': round(sequential, 4),
+        'processes_s': round(processes, 4),
+        'processes_speedup': round(sequential / processes, 2),
+        # Démarrage payé une fois, puis amorti sur tous les lots
+        'warm_pool_start_s': round(warm_start, 4),
+        'warm_pool_s': round(warm, 4),
+        'warm_pool_speedup': round(sequential / warm, 2),
+        'warm_pool_vs_processes': round(processes / warm, 2),
+        'recycled': recycled,
+    }
+
+
+def run(methods, scenarios, repeat, batches, preload, max_tasks):
+    # Le préchargement doit être réglé avant le premier démarrage du forkserver
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        multiprocessing.get_context('forkserver').set_forkserver_preload(preload)
+    # Pour fork, les modules sont déjà dans le parent
+    import_modules(preload)
+    return {
+        'repeat': repeat,
+        'batches': batches,
+        'preload': preload,
+        'max_tasks': max_tasks,
+        'default_method': multiprocessing.get_start_method(),
+        'startup': [measure_startup(method, repeat, preload) for method in methods],
+        'scenarios': [measure_scenario(name, batches, preload, max_tasks) for name in scenarios],
+    }
+
+
+def print_table(report):
+    print(f"Démarrage d'un processus ({report['repeat']} fois, imports: {', '.join(report['preload']) or 'aucun'})\n")
+    print(f"{'méthode':>11} {'premier ms':>11} {'médiane ms':>11} {'min ms':>8}")
+    for row in report['startup']:
+        print(f"{row['method']:>11} {row['first_ms']:>11} {row['median_ms']:>11} {row['min_ms']:>8}")
+
+    print(f"\nDe bout en bout, {report['batches']} lots (Process par tâche: méthode "
+          f"{report['default_method']}; WarmPool recyclé après {report['max_tasks']} tâches)\n")
+    print(f"{'scénario':>11} {'tâches':>7} {'séq. s':>8} {'Process s':>10} {'accél.':>7} "
+          f"{'démarrage s':>12} {'WarmPool s':>11} {'accél.':>7} {'/Process':>9} {'recyclés':>9}")
+    for row in report['scenarios']:
+        print(f"{row['scenario']:>11} {row['tasks']:>7} {row['sequential_s']:>8} {row['processes_s']:>10} "
+              f"{row['processes_speedup']:>6}x {row['warm_pool_start_s']:>12} {row['warm_pool_s']:>11} "
+              f"{row['warm_pool_speedup']:>6}x {row['warm_pool_vs_processes']:>8}x {row['recycled']:>9}")
+
+
+def parse_choices(choices, label):
+    def parse(text):
+        names = [item for item in text.split(',') if item]
+        for name in names:
+            if name not in choices:
+                raise argparse.ArgumentTypeError(f"{label} inconnu(e): {name}")
+        return names
+    return parse
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc du démarrage des processus et du pool au chaud")
+    parser.add_argument('--methods', type=parse_choices(METHODS, "méthode"), default=METHODS,
+                        help="ex: spawn,fork,forkserver")
+    parser.add_argument('--scenarios', type=parse_choices(SCENARIOS, "scénario"), default=list(SCENARIOS),
+                        help="ex: exemple1,piddisplay,court")
+    parser.add_argument('--repeat', type=int, default=20, help="démarrages mesurés par méthode")
+    parser.add_argument('--batches', type=int, default=5, help="lots de tâches par scénario")
+    parser.add_argument('--preload', type=lambda text: [item for item in text.split(',') if item],
+                        default=['json', 'decimal', 'asyncio'], help="modules importés (préchargés en forkserver)")
+    parser.add_argument('--max-tasks', type=int, default=100, help="tâches avant recyclage d'un travailleur")
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.methods, args.scenarios, args.repeat, args.batches, args.preload, args.max_tasks)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
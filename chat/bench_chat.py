@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Banc de charge du serveur de chat
+
+Lance un essaim de clients robots (sans terminal) qui parlent le même
+protocole que ChatClient, répartis sur quelques processus, chacun servant
+ses robots depuis une boucle asyncio. Les robots envoient un mélange
+configurable de messages de salon, /all, /to et /list, avec des départs et
+arrivées (churn), puis le banc affiche un rapport JSON: débit et latence de
+bout en bout (p50/p99/p99.9).
+
+Exemples:
+    python bench_chat.py --port 5555 --clients 500 --rate 2
+    python bench_chat.py --spawn "--backend asyncio" --clients 2000 --processes 4
+    python bench_chat.py --spawn "--backend asyncio --compression" --compression
+
+La latence est mesurée entre l'envoi par un robot et la réception par un
+autre robot, grâce à une horloge monotone commune à tous les processus
+(CLOCK_MONOTONIC sous Linux).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter, deque
+
+import protocol
+
+MARK = '⏱'
+KINDS = ('chat', 'all', 'to', 'list')
+CONNECT_ATTEMPTS = 3
+
+
+class LatencyRecorder:
+    """Histogramme logarithmique (précision ~1 %), fusionnable entre processus"""
+
+    GROWTH = 1.01
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def record(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        self.counts[int(math.log(micros, self.GROWTH))] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, fraction):
+        """Valeur (en ms) sous laquelle se trouve la fraction demandée des mesures"""
+        total = self.total()
+        if not total:
+            return None
+        threshold = fraction * total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return round(self.GROWTH ** (bucket + 1) / 1000, 3)
+
+    def summary(self):
+        return {
+            'count': self.total(),
+            'p50': self.percentile(0.50),
+            'p99': self.percentile(0.99),
+            'p999': self.percentile(0.999),
+            'max': self.percentile(1.0),
+        }
+
+
+class Bot:
+    """Client robot: poignée de main, envoi de messages horodatés, mesure des réceptions"""
+
+    def __init__(self, name, worker):
+        self.name = name
+        self.worker = worker
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        # Instants d'envoi des /list en attente de réponse
+        self.pending_lists = deque()
+
+    async def connect(self, host, port, room=None):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        decoder = protocol.FrameDecoder()
+        frames = deque()
+
+        async def next_frame():
+            while not frames:
+                data = await self.reader.read(protocol.MAX_FRAME_SIZE)
+                if not data:
+                    raise ConnectionResetError("connexion fermée par le serveur")
+                frames.extend(decoder.feed(data))
+            return frames.popleft()
+
+        hello = await next_frame()
+        if hello.kind == protocol.REJECT:
+            raise ConnectionRefusedError(f"{self.name} refusé: {hello.json()}")
+        if hello.kind != protocol.HELLO:
+            raise protocol.ProtocolError("HELLO attendu")
+        join = {'version': protocol.PROTOCOL_VERSION, 'name': self.name}
+        if self.worker.config['compression'] and protocol.COMPRESSION in hello.json().get('compression', ()):
+            join['compression'] = protocol.COMPRESSION
+        self.writer.write(protocol.encode_json(protocol.JOIN, join))
+        response = await next_frame()
+        if response.kind != protocol.ACCEPT:
+            raise ConnectionRefusedError(f"{self.name} refusé: {response.json()}")
+
+        if room:
+            self.send(f"/join {room}")
+        self.read_task = asyncio.create_task(self.read_loop(decoder, list(frames)))
+
+    async def read_loop(self, decoder, frames):
+        try:
+            while True:
+                for frame in frames:
+                    if frame.kind == protocol.TEXT:
+                        self.on_text(frame.text())
+                    elif frame.kind == protocol.PING:
+                        # Un robot silencieux serait sinon récolté par le serveur
+                        self.writer.write(protocol.encode_frame(protocol.PONG, frame.payload))
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+                self.worker.wire_received(len(data))
+                frames = decoder.feed(data)
+        except (ConnectionError, OSError, protocol.ProtocolError):
+            pass
+
+    def on_text(self, text):
+        now = time.monotonic_ns()
+        position = text.rfind(MARK)
+        if position >= 0:
+            kind, _, sent = text[position + 1:].partition(':')
+            try:
+                self.worker.delivered(kind, (now - int(sent.split()[0])) / 1e9)
+            except (ValueError, IndexError):
+                pass
+        elif text.startswith(protocol.LIST_HEADER) and self.pending_lists:
+            self.worker.delivered('list', (now - self.pending_lists.popleft()) / 1e9)
+
+    def send(self, text):
+        self.writer.write(protocol.encode_text(text))
+
+    def send_kind(self, kind, target=None):
+        stamp = f"{MARK}{kind}:{time.monotonic_ns()}"
+        if kind == 'chat':
+            self.send(f"bench {stamp}")
+        elif kind == 'all':
+            self.send(f"/all bench {stamp}")
+        elif kind == 'to':
+            self.send(f"/to {target} bench {stamp}")
+        else:
+            self.pending_lists.append(time.monotonic_ns())
+            self.send("/list")
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        if self.read_task:
+            self.read_task.cancel()
+
+
+class Worker:
+    """Un processus du banc: ses robots, ses compteurs et son histogramme"""
+
+    def __init__(self, worker_id, config):
+        self.worker_id = worker_id
+        self.config = config
+        self.bots = []
+        self.sent = Counter()
+        self.received = Counter()
+        self.latencies = {kind: LatencyRecorder() for kind in KINDS}
+        self.errors = Counter()
+        self.reconnects = 0
+        self.generation = 0
+        self.measuring = False
+        # Octets reçus sur le fil et temps CPU pendant la mesure (effet de la compression)
+        self.wire_bytes = 0
+        self.cpu_seconds = 0.0
+        kinds, weights = zip(*config['mix'].items())
+        self.kinds = kinds
+        self.weights = weights
+
+    def delivered(self, kind, latency):
+        if self.measuring and kind in self.latencies:
+            self.received[kind] += 1
+            self.latencies[kind].record(latency)
+
+    def wire_received(self, size):
+        if self.measuring:
+            self.wire_bytes += size
+
+    def room_for(self, index):
+        rooms = self.config['rooms']
+        return f"bench-{index % rooms}" if rooms > 1 else None
+
+    async def new_bot(self, index):
+        """Connecte un nouveau robot, en réessayant si la poignée de main n'aboutit pas"""
+        for attempt in range(CONNECT_ATTEMPTS):
+            self.generation += 1
+            bot = Bot(f"bot-{self.worker_id}-{index}-{self.generation}", self)
+            try:
+                await asyncio.wait_for(
+                    bot.connect(self.config['host'], self.config['port'], self.room_for(index)),
+                    self.config['connect_timeout'])
+                return bot
+            except asyncio.TimeoutError:
+                # Typiquement une file d'acceptation (listen) trop courte côté serveur
+                self.errors['connect_timeout'] += 1
+                await bot.close()
+        raise ConnectionError(f"connexion impossible après {CONNECT_ATTEMPTS} essais")
+
+    async def connect_all(self, count):
+        limit = asyncio.Semaphore(100)
+
+        async def connect_one(index):
+            async with limit:
+                try:
+                    return await self.new_bot(index)
+                except (OSError, ConnectionError, protocol.ProtocolError):
+                    self.errors['connect'] += 1
+                    return None
+
+        bots = await asyncio.gather(*(connect_one(index) for index in range(count)))
+        self.bots = [bot for bot in bots if bot is not None]
+
+    async def drive(self, slot, deadline):
+        """Fait parler le robot d'un emplacement au rythme demandé (processus de Poisson)"""
+        rate = self.config['rate']
+        while time.monotonic() < deadline:
+            await asyncio.sleep(random.expovariate(rate))
+            bot = self.bots[slot]
+            if bot is None:
+                continue
+            kind = random.choices(self.kinds, self.weights)[0]
+            target = None
+            if kind == 'to':
+                other = random.choice(self.bots)
+                if other is None or other is bot:
+                    continue
+                target = other.name
+            try:
+                bot.send_kind(kind, target)
+                self.sent[kind] += 1
+            except (ConnectionError, OSError):
+                self.errors['send'] += 1
+
+    async def churn(self, deadline):
+        """Déconnecte et reconnecte des robots au hasard"""
+        rate = self.config['churn'] / self.config['processes']
+        if rate <= 0:
+            return
+        while time.monotonic() < deadline:
+            await asyncio.sleep(random.expovariate(rate))
+            slot = random.randrange(len(self.bots))
+            bot, self.bots[slot] = self.bots[slot], None
+            if bot is None:
+                continue
+            await bot.close()
+            try:
+                self.bots[slot] = await self.new_bot(slot)
+                self.reconnects += 1
+            except (OSError, ConnectionError, protocol.ProtocolError):
+                self.errors['reconnect'] += 1
+
+    async def run(self):
+        config = self.config
+        await self.connect_all(config['clients_per_process'])
+        if not self.bots:
+            return self.report()
+
+        # Laisser passer les messages d'accueil avant de mesurer
+        await asyncio.sleep(config['warmup'])
+        self.measuring = True
+        cpu_start = time.process_time()
+        deadline = time.monotonic() + config['duration']
+        await asyncio.gather(self.churn(deadline),
+                             *(self.drive(slot, deadline) for slot in range(len(self.bots))))
+
+        # Attendre les messages encore en vol
+        await asyncio.sleep(config['grace'])
+        self.measuring = False
+        self.cpu_seconds = time.process_time() - cpu_start
+        await asyncio.gather(*(bot.close() for bot in self.bots if bot is not None))
+        return self.report()
+
+    def report(self):
+        return {
+            'sent': dict(self.sent),
+            'received': dict(self.received),
+            'latencies': {kind: dict(recorder.counts) for kind, recorder in self.latencies.items()},
+            'errors': dict(self.errors),
+            'clients': len(self.bots),
+            'reconnects': self.reconnects,
+            'wire_bytes': self.wire_bytes,
+            'cpu_s': self.cpu_seconds,
+        }
+
+
+def run_worker(worker_id, config, results):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    results.put(asyncio.run(Worker(worker_id, config).run()))
+
+
+def parse_mix(text):
+    """'chat=80,all=5,to=10,list=5' -> {'chat': 80.0, ...}"""
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"type de message inconnu: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def spawn_server(host, port, server_args):
+    """Démarre serv.py en local pour la durée du banc"""
+    command = [sys.executable, 'serv.py', '--host', host, '--port', str(port)] + server_args.split()
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL,
+                              preexec_fn=lambda: signal.signal(signal.SIGINT, signal.SIG_DFL))
+    time.sleep(1.0)
+    return server
+
+
+def stop_server(server):
+    """Arrête le serveur lancé par spawn_server et renvoie son temps CPU (secondes)"""
+    # Les robots sont déjà terminés: la différence ne compte que le serveur
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    server.send_signal(signal.SIGINT)
+    server.wait(timeout=10)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return round(after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime, 3)
+
+
+def run_benchmark(config):
+    """Lance les processus du banc et fusionne leurs résultats"""
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_worker, args=(worker_id, config, results))
+               for worker_id in range(config['processes'])]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - start
+
+    sent, received, errors = Counter(), Counter(), Counter()
+    latencies = {kind: LatencyRecorder() for kind in KINDS}
+    overall = LatencyRecorder()
+    for report in reports:
+        sent.update(report['sent'])
+        received.update(report['received'])
+        errors.update(report['errors'])
+        for kind, counts in report['latencies'].items():
+            recorder = LatencyRecorder({int(bucket): count for bucket, count in counts.items()})
+            latencies[kind].merge(recorder)
+            overall.merge(recorder)
+
+    duration = config['duration']
+    wire_bytes = sum(report['wire_bytes'] for report in reports)
+    return {
+        'config': {key: value for key, value in config.items() if key != 'clients_per_process'},
+        'elapsed_s': round(elapsed, 3),
+        'clients': sum(report['clients'] for report in reports),
+        'reconnects': sum(report['reconnects'] for report in reports),
+        'errors': dict(errors),
+        'sent': dict(sent),
+        'received': dict(received),
+        'throughput': {
+            'sent_per_s': round(sum(sent.values()) / duration, 1),
+            'delivered_per_s': round(sum(received.values()) / duration, 1),
+        },
+        'bandwidth': {
+            'received_bytes': wire_bytes,
+            'received_bytes_per_s': round(wire_bytes / duration),
+            'bytes_per_delivery': round(wire_bytes / max(1, sum(received.values())), 1),
+            'clients_cpu_s': round(sum(report['cpu_s'] for report in reports), 3),
+        },
+        'latency_ms': dict({kind: recorder.summary() for kind, recorder in latencies.items()
+                            if recorder.total()},
+                           overall=overall.summary()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de charge du serveur de chat")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--clients', type=int, default=200, help="nombre total de robots")
+    parser.add_argument('--processes', type=int, default=2, help="processus générateurs de charge")
+    parser.add_argument('--rate', type=float, default=1.0, help="messages par seconde et par robot")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('chat=80,all=5,to=10,list=5'),
+                        help="proportions des types de message (chat, all, to, list)")
+    parser.add_argument('--rooms', type=int, default=1, help="nombre de salons entre lesquels répartir les robots")
+    parser.add_argument('--churn', type=float, default=0.0, help="reconnexions par seconde (total)")
+    parser.add_argument('--duration', type=float, default=10.0, help="durée de la mesure (secondes)")
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--grace', type=float, default=1.0, help="attente des messages en vol à la fin")
+    parser.add_argument('--connect-timeout', type=float, default=5.0,
+                        help="délai maximal d'une connexion avant nouvel essai (secondes)")
+    parser.add_argument('--spawn', metavar='ARGS', default=None,
+                        help="démarrer serv.py en local avec ces arguments (ex: \"--backend asyncio\")")
+    parser.add_argument('--compression', action='store_true',
+                        help="demander la compression zlib (le serveur doit la proposer)")
+    parser.add_argument('--output', default=None, help="fichier JSON du rapport (sinon la sortie standard)")
+    args = parser.parse_args()
+
+    config = {
+        'host': args.host, 'port': args.port, 'processes': args.processes,
+        'clients': args.clients, 'clients_per_process': max(1, args.clients // args.processes),
+        'rate': args.rate, 'mix': args.mix, 'rooms': args.rooms, 'churn': args.churn,
+        'duration': args.duration, 'warmup': args.warmup, 'grace': args.grace,
+        'connect_timeout': args.connect_timeout,
+        'compression': args.compression,
+        'server': args.spawn,
+    }
+
+    server = spawn_server(args.host, args.port, args.spawn) if args.spawn is not None else None
+    try:
+        report = run_benchmark(config)
+    finally:
+        if server:
+            server_cpu = stop_server(server)
+    if server:
+        report['server_cpu_s'] = server_cpu
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    print(output)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Banc de la compression des trames: octets économisés contre temps CPU
+
+Rejoue un flux de trames représentatif d'un salon animé (messages
+horodatés, notices [SYSTÈME], listes /list, messages privés) à travers un
+Deflater par connexion, pour plusieurs niveaux et seuils, et mesure le
+taux de compression ainsi que le coût de compression et de décompression
+par trame.
+
+Exemple:
+    python bench_compression.py --frames 20000 --levels 1,6,9 --thresholds 0,64,128,256
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import protocol
+
+NAMES = ['alice', 'bob', 'charlie', 'david', 'emma', 'farid', 'gaelle', 'hugo',
+         'ines', 'jules', 'karim', 'lea', 'marc', 'nadia', 'oscar', 'paul']
+WORDS = ("salut ça va le serveur est lent aujourd'hui quelqu'un a vu le cours sur "
+         "les threads et les processus demain on teste le pool avec multiprocessing "
+         "merci bien oui non peut-être je regarde ça tout de suite").split()
+
+
+def sample_frames(count, seed=1):
+    """Trames texte telles que le serveur les envoie à un membre d'un salon"""
+    rng = random.Random(seed)
+    clock = datetime(2024, 1, 1, 14, 0, 0)
+    frames = []
+    for _ in range(count):
+        clock += timedelta(seconds=rng.expovariate(2.0))
+        timestamp = clock.strftime("%H:%M:%S")
+        sender = rng.choice(NAMES)
+        text = ' '.join(rng.choices(WORDS, k=rng.randint(2, 18)))
+        kind = rng.random()
+        if kind < 0.75:
+            line = f"[{timestamp}] [#general] {sender}: {text}\n"
+        elif kind < 0.85:
+            line = f"[{timestamp}] {sender} (à tous): {text}\n"
+        elif kind < 0.92:
+            line = f"[{timestamp}] 💌 Message privé de {sender}: {text}\n"
+        elif kind < 0.97:
+            line = f"[SYSTÈME] {sender} a {rng.choice(['rejoint', 'quitté'])} #general\n"
+        else:
+            line = "\n👥 CLIENTS CONNECTÉS:\n" + ''.join(f"   • {name}\n" for name in NAMES)
+        frames.append(protocol.encode_text(line))
+    return frames
+
+
+def measure(frames, level, threshold):
+    """Compresse puis décompresse le flux; renvoie les octets et les temps"""
+    deflater = protocol.Deflater(threshold, level)
+    start = time.perf_counter()
+    wire = [deflater.frame(frame) for frame in frames]
+    compress_seconds = time.perf_counter() - start
+
+    decoder = protocol.FrameDecoder()
+    start = time.perf_counter()
+    for data in wire:
+        decoder.feed(data)
+    decode_seconds = time.perf_counter() - start
+
+    return sum(map(len, wire)), compress_seconds, decode_seconds
+
+
+def run(frame_count, levels, thresholds):
+    frames = sample_frames(frame_count)
+    raw_bytes = sum(map(len, frames))
+
+    # Référence: décodage sans compression
+    _, _, baseline_decode = measure(frames, 1, protocol.MAX_FRAME_SIZE + 1)
+
+    results = []
+    for level in levels:
+        for threshold in thresholds:
+            wire_bytes, compress_seconds, decode_seconds = measure(frames, level, threshold)
+            results.append({
+                'level': level,
+                'threshold': threshold,
+                'wire_bytes': wire_bytes,
+                'ratio': round(wire_bytes / raw_bytes, 3),
+                'saved_pct': round(100 * (1 - wire_bytes / raw_bytes), 1),
+                'compress_us_per_frame': round(compress_seconds / frame_count * 1e6, 2),
+                'decode_us_per_frame': round(decode_seconds / frame_count * 1e6, 2),
+                'saved_bytes_per_cpu_ms': round((raw_bytes - wire_bytes) / max(compress_seconds * 1e3, 1e-9)),
+            })
+    return {'frames': frame_count, 'raw_bytes': raw_bytes,
+            'baseline_decode_us_per_frame': round(baseline_decode / frame_count * 1e6, 2),
+            'results': results}
+
+
+def print_table(report):
+    print(f"{report['frames']} trames, {report['raw_bytes']} octets sans compression, "
+          f"décodage {report['baseline_decode_us_per_frame']} µs/trame\n")
+    print(f"{'niveau':>6} {'seuil':>6} {'octets':>10} {'gain':>7} {'compr. µs':>10} {'décomp. µs':>11}")
+    for row in report['results']:
+        print(f"{row['level']:>6} {row['threshold']:>6} {row['wire_bytes']:>10} "
+              f"{row['saved_pct']:>6}% {row['compress_us_per_frame']:>10} {row['decode_us_per_frame']:>11}")
+
+
+def parse_ints(text):
+    return [int(item) for item in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de la compression des trames du chat")
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--levels', type=parse_ints, default=[1, 6, 9], help="niveaux zlib, ex: 1,6,9")
+    parser.add_argument('--thresholds', type=parse_ints, default=[0, 64, 128, 256],
+                        help="seuils de compression (octets), ex: 0,64,128,256")
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.frames, args.levels, args.thresholds)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
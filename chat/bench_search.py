@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Banc de l'index de recherche (search.py): indexation et temps de requête
+
+Indexe `--messages` messages synthétiques (vocabulaire courant plus des mots
+rares tirés selon une loi de Zipf, seize auteurs, quelques salons), puis
+mesure pour plusieurs requêtes typiques la médiane et le pire des temps de
+réponse sur `--repeat` exécutions. Les fusions et abandons de segments sont
+faits pendant l'indexation, comme dans le serveur.
+
+Exemple:
+    python bench_search.py --messages 2000000 --max-messages 1000000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from history import HistoryEntry
+from search import SEGMENT_DOCS, SearchIndex, parse_query
+
+NAMES = ['alice', 'bob', 'charlie', 'david', 'emma', 'farid', 'gaelle', 'hugo',
+         'ines', 'jules', 'karim', 'lea', 'marc', 'nadia', 'oscar', 'paul']
+ROOMS = ['general', 'dev', 'cours', 'random', None]
+WORDS = ("salut ça va le serveur est lent aujourd'hui quelqu'un a vu le cours sur "
+         "les threads et les processus demain on teste le pool avec multiprocessing "
+         "merci bien oui non peut-être je regarde ça tout de suite").split()
+
+QUERIES = [
+    ('mot fréquent', "serveur"),
+    ('deux mots fréquents', "threads pool"),
+    ('mot rare', "mot4321"),
+    ('mot + auteur', "multiprocessing from:alice"),
+    ('mot rare + auteur', "mot777 from:bob"),
+    ('auteur + 1h', "from:karim since:1h"),
+    ('absent', "introuvable"),
+]
+
+
+def sample_entries(count, seed=1):
+    """Messages archivés, une seconde d'écart, se terminant maintenant"""
+    rng = random.Random(seed)
+    rare = [f"mot{index}" for index in range(20000)]
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(rare))))
+    start = time.time() - count
+    for seq in range(count):
+        words = rng.choices(WORDS, k=rng.randint(2, 12))
+        if rng.random() < 0.3:
+            words += rng.choices(rare, cum_weights=weights, k=1)
+        sender = rng.choice(NAMES)
+        text = ' '.join(words)
+        yield HistoryEntry(seq, start + seq, rng.choice(ROOMS), sender, text, f"[--:--:--] {sender}: {text}")
+
+
+def run(messages, max_messages, segment_docs, repeat):
+    entries = list(sample_entries(messages))
+    index = SearchIndex(max_messages, segment_docs)
+    started = time.perf_counter()
+    index.add_many(entries)
+    # Attendre que le thread indexeur ait tout vu
+    while index.indexed < messages:
+        time.sleep(0.01)
+    indexing = time.perf_counter() - started
+
+    results = []
+    for label, text in QUERIES:
+        query = parse_query(text)
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = index.search(query, visible={'dev', 'general', None})
+            durations.append(time.perf_counter() - start)
+        results.append({
+            'query': label,
+            'text': text,
+            'found': len(found),
+            'median_ms': round(statistics.median(durations) * 1e3, 3),
+            'max_ms': round(max(durations) * 1e3, 3),
+        })
+    report = {
+        'messages': messages,
+        'indexed': len(index),
+        'segments': len(index.sealed) + 1,
+        'merges': index.merges,
+        'evicted': index.evicted,
+        'index_rate_per_s': round(messages / indexing),
+        'queries': results,
+    }
+    index.close()
+    return report
+
+
+def print_table(report):
+    print(f"{report['messages']} messages indexés à {report['index_rate_per_s']}/s; "
+          f"{report['indexed']} gardés en {report['segments']} segments "
+          f"({report['merges']} fusions, {report['evicted']} abandonnés)\n")
+    print(f"{'requête':>20} {'texte':>28} {'trouvés':>8} {'médiane ms':>11} {'max ms':>8}")
+    for row in report['queries']:
+        print(f"{row['query']:>20} {row['text']:>28} {row['found']:>8} {row['median_ms']:>11} {row['max_ms']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de l'index de recherche du chat")
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--max-messages', type=int, default=1_000_000, help="taille maximale de l'index")
+    parser.add_argument('--segment-docs', type=int, default=SEGMENT_DOCS)
+    parser.add_argument('--repeat', type=int, default=50, help="exécutions de chaque requête")
+    parser.add_argument('--json', action='store_true', help="rapport JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    report = run(args.messages, args.max_messages, args.segment_docs, args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_table(report)
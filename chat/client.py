@@ -1,55 +1,55 @@
 #!/usr/bin/env python3
 """
 Client de chat pour se connecter au serveur
-Utilise threading pour recevoir et envoyer des messages simultanément
+Interface terminal au-dessus de la bibliothèque asyncio (client_lib.py):
+un thread lit le clavier, la boucle asyncio affiche les messages reçus
+par images (renderer.py)
 """
 
-import socket
-import threading
+import asyncio
+import os
 import sys
-from datetime import datetime
+import threading
+
+from client_lib import AsyncChatClient, ChatRejected, SHUTDOWN, STATUS
+from renderer import TerminalRenderer
+
+# Lignes réaffichées par /scroll sans argument
+SCROLL_LINES = 50
 
 class ChatClient:
     def __init__(self, host='127.0.0.1', port=5555):
         self.host = host
         self.port = port
-        self.client_socket = None
-        self.connected = False
+        self.client = None
         self.name = None
+        self.renderer = None
         
-    def connect(self):
+    async def connect(self):
         """Se connecte au serveur de chat"""
+        # Demander le nom à l'utilisateur
+        self.name = input("Entrez votre nom: ").strip()
+        
+        while not self.name:
+            print("Le nom ne peut pas être vide!")
+            self.name = input("Entrez votre nom: ").strip()
+        
+        self.client = AsyncChatClient(self.host, self.port, self.name,
+                                      admin_token=os.environ.get('CHAT_ADMIN_TOKEN'))
         try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect((self.host, self.port))
-            
-            # Recevoir la demande de nom
-            response = self.client_socket.recv(1024).decode('utf-8')
-            
-            if response == "ENTER_NAME":
-                # Demander le nom à l'utilisateur
-                self.name = input("Entrez votre nom: ").strip()
-                
-                while not self.name:
-                    print("Le nom ne peut pas être vide!")
-                    self.name = input("Entrez votre nom: ").strip()
-                
-                # Envoyer le nom au serveur
-                self.client_socket.send(self.name.encode('utf-8'))
-                
-                # Vérifier si le nom est accepté
-                response = self.client_socket.recv(1024).decode('utf-8')
-                
-                if response == "NAME_TAKEN":
-                    print(f"❌ Le nom '{self.name}' est déjà utilisé!")
-                    self.client_socket.close()
-                    return False
-                else:
-                    # Le nom est accepté, afficher le message de bienvenue
-                    print(response, end='')
-                    self.connected = True
-                    return True
+            await self.client.connect()
+            return True
             
+        except ChatRejected as e:
+            if e.reason == 'NAME_TAKEN':
+                print(f"❌ Le nom '{self.name}' est déjà utilisé!")
+            elif e.reason == 'SERVER_FULL':
+                print("❌ Le serveur est plein, réessayez plus tard")
+            elif e.reason == 'VERSION':
+                print("❌ Version du protocole incompatible avec le serveur")
+            else:
+                print(f"❌ Connexion refusée par le serveur ({e.reason})")
+            return False
         except ConnectionRefusedError:
             print("❌ Impossible de se connecter au serveur. Assurez-vous qu'il est démarré.")
             return False
@@ -57,88 +57,80 @@ class ChatClient:
             print(f"❌ Erreur de connexion: {e}")
             return False
     
-    def receive_messages(self):
-        """Thread pour recevoir les messages du serveur"""
-        while self.connected:
-            try:
-                message = self.client_socket.recv(4096).decode('utf-8')
-                
-                if not message:
-                    break
-                
-                if message == "SERVER_SHUTDOWN":
-                    print("\n[SYSTÈME] Le serveur a été arrêté")
-                    self.connected = False
-                    break
-                
-                # Afficher le message reçu
-                print(message, end='')
-                
-            except Exception as e:
-                if self.connected:
-                    print(f"\n❌ Erreur de réception: {e}")
-                break
-        
-        self.disconnect()
+    async def receive_messages(self):
+        """Affiche les messages du serveur et les événements de connexion"""
+        render = self.renderer.write
+        async for message in self.client:
+            if message.kind == STATUS:
+                render(f"\n[CLIENT] {message.text}\n")
+            elif message.kind == SHUTDOWN:
+                render("\n[SYSTÈME] Le serveur a été arrêté\n")
+            else:
+                render(message.text)
     
-    def send_messages(self):
-        """Thread pour envoyer les messages au serveur"""
-        print("\n💬 Vous pouvez commencer à chatter!\n")
+    async def send_messages(self):
+        """Envoie au serveur les lignes tapées au clavier"""
+        print("\n💬 Vous pouvez commencer à chatter! (/scroll [n] réaffiche les derniers messages)\n")
         
-        while self.connected:
-            try:
-                message = input()
-                
-                if not self.connected:
+        lines = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        
+        def read_keyboard():
+            # input() bloque: il tourne dans un thread démon qui alimente la file
+            while True:
+                try:
+                    line = input()
+                except (EOFError, KeyboardInterrupt):
+                    line = None
+                loop.call_soon_threadsafe(lines.put_nowait, line)
+                if line is None:
                     break
-                
-                if message.strip():
-                    if message.strip().lower() == '/quit':
-                        self.connected = False
-                        self.client_socket.send(message.encode('utf-8'))
-                        break
-                    
-                    self.client_socket.send(message.encode('utf-8'))
-                    
-            except EOFError:
-                break
-            except Exception as e:
-                if self.connected:
-                    print(f"❌ Erreur d'envoi: {e}")
-                break
         
-        self.disconnect()
+        threading.Thread(target=read_keyboard, daemon=True).start()
+        
+        while True:
+            message = await lines.get()
+            if message is None or message.strip().lower() == '/quit':
+                break
+            words = message.split()
+            if words and words[0].lower() == '/scroll':
+                # Commande locale: relit l'historique du terminal, rien n'est envoyé
+                count = int(words[1]) if len(words) > 1 and words[1].isdigit() else SCROLL_LINES
+                self.renderer.replay(count)
+            elif message.strip():
+                self.client.send(message)
     
-    def start(self):
-        """Démarre le client de chat"""
-        if not self.connect():
+    async def run(self):
+        if not await self.connect():
             return
         
         print(f"\n✅ Connecté au serveur {self.host}:{self.port}")
         
-        # Créer deux threads: un pour recevoir, un pour envoyer
-        receive_thread = threading.Thread(target=self.receive_messages)
-        receive_thread.daemon = True
-        receive_thread.start()
-        
-        # Le thread principal gère l'envoi
+        self.renderer = TerminalRenderer()
+        display = asyncio.create_task(self.renderer.run())
+        receiver = asyncio.create_task(self.receive_messages())
+        sender = asyncio.create_task(self.send_messages())
+        # Fin quand l'utilisateur quitte ou que la connexion est perdue pour de bon
+        await asyncio.wait((receiver, sender), return_when=asyncio.FIRST_COMPLETED)
+        sender.cancel()
+        await self.disconnect()
+        receiver.cancel()
+        display.cancel()
+    
+    def start(self):
+        """Démarre le client de chat"""
         try:
-            self.send_messages()
+            asyncio.run(self.run())
         except KeyboardInterrupt:
             print("\n\n👋 Déconnexion...")
-            self.disconnect()
     
-    def disconnect(self):
+    async def disconnect(self):
         """Déconnecte le client du serveur"""
-        if self.connected:
-            self.connected = False
-            
-        if self.client_socket:
-            try:
-                self.client_socket.close()
-            except:
-                pass
+        if self.client:
+            await self.client.close()
         
+        # Ce qui reste à l'écran passe avant le message de fin
+        self.renderer.flush()
         print("\n[CLIENT] Déconnecté du serveur")
 
 
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Bibliothèque cliente asyncio pour le serveur de chat
+
+Utilisable depuis un service, un robot ou une interface: aucune entrée ni
+sortie terminal ici. Exemple:
+
+    client = AsyncChatClient('127.0.0.1', 5555, 'robot')
+    await client.connect()
+    client.send("bonjour")                 # n'attend pas: les envois sont pipelinés
+    client.send_private('alice', "psst")
+    print(await client.list())
+    async for message in client:
+        print(message.text, end='')
+
+Si la connexion tombe, le client se reconnecte tout seul (attente
+exponentielle avec gigue) et reprend sa session: le serveur lui renvoie les
+messages manqués, et les messages envoyés pendant la coupure partent à la
+reconnexion sans doublon.
+"""
+
+import asyncio
+import codecs
+import random
+from collections import deque, namedtuple
+
+import protocol
+
+RECV_SIZE = 65536
+# Messages envoyés gardés jusqu'à confirmation par le serveur (à la reprise)
+RESEND_BUFFER = 1000
+# Serveur réparti (--shards): nouvelles tentatives rapides quand la session est sur un autre shard
+SHARD_RETRIES = 32
+SHARD_RETRY_DELAY = 0.05
+
+# Types de messages rendus par l'itération
+TEXT = 'text'        # texte envoyé par le serveur
+STATUS = 'status'    # événement de connexion (coupure, reconnexion, reprise...)
+SHUTDOWN = 'shutdown'
+
+
+class Message(namedtuple('Message', 'kind text')):
+    """Message reçu du serveur, ou événement de la connexion"""
+
+    __slots__ = ()
+
+
+class ChatRejected(ConnectionError):
+    """Le serveur a refusé la connexion (nom déjà pris, version...)"""
+
+    def __init__(self, reason):
+        super().__init__(f"connexion refusée par le serveur ({reason})")
+        self.reason = reason
+
+
+class AsyncChatClient:
+    """Client de chat asyncio avec reconnexion automatique et reprise de session"""
+
+    def __init__(self, host, port, name, compression=True, reconnect=True,
+                 min_backoff=0.2, max_backoff=10.0, max_attempts=None,
+                 resend_buffer=RESEND_BUFFER, admin_token=None):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.compression = compression
+        self.reconnect = reconnect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        # Preuve des droits d'administrateur (--admin-token du serveur), envoyée dans JOIN
+        self.admin_token = admin_token
+
+        self.reader = None
+        self.writer = None
+        self.deflater = None
+        self.connected = False
+        self.closing = False
+        self.read_task = None
+        # Silence maximal toléré du serveur (annoncé dans HELLO), None = illimité
+        self.idle_timeout = None
+        self.incoming = asyncio.Queue()
+        # Texte décodé au fil des trames: un caractère coupé entre deux trames est
+        # complété par la suivante, un octet invalide devient « � » au lieu de couper la connexion
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        # Session côté client: jeton, trames reçues, messages non confirmés
+        self.token = None
+        self.received = 0
+        self.sent = 0
+        self.written = 0
+        self.unacked = deque(maxlen=resend_buffer)
+        # Réponses /list attendues par list()
+        self.pending_lists = deque()
+
+    async def connect(self):
+        """Première connexion; lève ChatRejected ou OSError en cas d'échec"""
+        early = await self.open()
+        self.read_task = asyncio.create_task(self.read_loop(early))
+
+    async def open(self):
+        """Ouvre une connexion et fait la poignée de main, en reprenant la session si possible
+
+        Renvoie les trames arrivées avant ACCEPT (elles font partie de la session).
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        decoder = protocol.FrameDecoder()
+        frames = deque()
+
+        async def next_frame():
+            while not frames:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    raise ConnectionResetError("connexion fermée par le serveur")
+                frames.extend(decoder.feed(data))
+            return frames.popleft()
+
+        try:
+            hello = await next_frame()
+            if hello.kind == protocol.REJECT:
+                # Refus à l'admission (serveur plein), avant même la poignée de main
+                raise ChatRejected(hello.json().get('reason'))
+            info = hello.json() if hello.kind == protocol.HELLO else {}
+            if info.get('version') != protocol.PROTOCOL_VERSION:
+                raise ChatRejected('VERSION')
+
+            join = {'version': protocol.PROTOCOL_VERSION, 'name': self.name}
+            if self.compression and protocol.COMPRESSION in info.get('compression', ()):
+                join['compression'] = protocol.COMPRESSION
+            if self.admin_token:
+                join['admin_token'] = self.admin_token
+            if info.get('resume'):
+                # Un jeton pour reprendre la session, ou True pour en ouvrir une
+                join['session'] = self.token or True
+                join['received'] = self.received
+            writer.write(protocol.encode_json(protocol.JOIN, join))
+
+            # Des messages peuvent précéder ACCEPT: ils sont gardés pour la suite
+            early = []
+            while True:
+                frame = await next_frame()
+                if frame.kind == protocol.REJECT:
+                    raise ChatRejected(frame.json().get('reason'))
+                if frame.kind == protocol.ACCEPT:
+                    break
+                early.append(frame)
+        except BaseException:
+            writer.close()
+            raise
+
+        accept = frame.json()
+        # Le serveur pingue avant ce délai: au-delà, le lien est considéré comme mort
+        self.idle_timeout = info.get('idle_timeout') or None
+        self.reader, self.writer = reader, writer
+        self.decoder = decoder
+        self.text_decoder.reset()
+        self.deflater = protocol.Deflater() if accept.get('compression') == protocol.COMPRESSION else None
+        self.connected = True
+
+        if accept.get('resumed'):
+            # Le serveur a traité `received` de nos messages: renvoyer les suivants
+            processed = accept.get('received', 0)
+            while self.unacked and self.unacked[0][0] <= processed:
+                self.unacked.popleft()
+            for _, text in list(self.unacked):
+                self.write(text)
+            self.written = self.sent
+        else:
+            # Nouvelle session: seuls les messages jamais écrits sont renvoyés
+            unsent = [text for seq, text in self.unacked if seq > self.written]
+            self.token = accept.get('session')
+            self.received = self.sent = self.written = 0
+            self.unacked.clear()
+            for text in unsent:
+                self.send(text)
+
+        return early + list(frames)
+
+    async def read_loop(self, frames):
+        """Lit les trames du serveur; se reconnecte si la connexion tombe"""
+        while True:
+            try:
+                while True:
+                    for frame in frames:
+                        self.dispatch(frame)
+                    data = await asyncio.wait_for(self.reader.read(RECV_SIZE), self.idle_timeout)
+                    if not data:
+                        break
+                    frames = self.decoder.feed(data)
+            except (ConnectionError, OSError, ValueError, protocol.ProtocolError, asyncio.TimeoutError):
+                # Connexion perdue ou muette, ou trame / texte invalide: on repart d'une connexion neuve
+                pass
+
+            self.connected = False
+            self.writer.close()
+            if self.closing or not self.reconnect:
+                break
+            frames = await self.reconnect_loop()
+            if frames is None:
+                break
+
+        self.incoming.put_nowait(None)
+
+    def dispatch(self, frame):
+        # Les battements de cœur ne font pas partie de la session (ni comptés, ni rejoués)
+        if frame.kind == protocol.PING:
+            self.writer.write(protocol.encode_frame(protocol.PONG, frame.payload))
+            return
+        if frame.kind == protocol.PONG:
+            return
+        self.received += 1
+        if frame.kind == protocol.TEXT:
+            text = self.text_decoder.decode(frame.payload)
+            if not text:
+                return
+            if self.pending_lists and text.startswith(protocol.LIST_HEADER):
+                future = self.pending_lists.popleft()
+                if not future.done():
+                    future.set_result(parse_clients_list(text))
+                    return
+            self.incoming.put_nowait(Message(TEXT, text))
+        elif frame.kind == protocol.SHUTDOWN:
+            # Sans reprise possible (nouveau processus serveur), on repartira de zéro
+            self.token = None
+            self.incoming.put_nowait(Message(SHUTDOWN, "Le serveur a été arrêté"))
+
+    async def reconnect_loop(self):
+        """Se reconnecte avec une attente exponentielle et aléatoire (full jitter)"""
+        self.incoming.put_nowait(Message(STATUS, "Connexion perdue, reconnexion..."))
+        attempt = 0
+        redirects = 0
+        redirected = False
+        while not self.closing:
+            if redirected:
+                # Le noyau choisit le shard de chaque connexion: une autre tombera sur le bon
+                await asyncio.sleep(random.uniform(0, SHARD_RETRY_DELAY))
+            else:
+                if self.max_attempts is not None and attempt >= self.max_attempts:
+                    self.incoming.put_nowait(Message(STATUS, "Reconnexion abandonnée"))
+                    return None
+                delay = min(self.max_backoff, self.min_backoff * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                attempt += 1
+            redirected = False
+            try:
+                resuming = self.token is not None
+                frames = await self.open()
+            except ChatRejected as e:
+                if e.reason == 'WRONG_SHARD' and redirects < SHARD_RETRIES:
+                    # Session tenue par un autre shard: réessayer sans attente exponentielle
+                    redirects += 1
+                    redirected = True
+                    continue
+                if e.reason not in ('NAME_TAKEN', 'SERVER_FULL', 'WRONG_SHARD'):
+                    self.incoming.put_nowait(Message(STATUS, str(e)))
+                    return None
+                # Nom encore tenu par l'ancienne session (ou un autre shard), ou serveur
+                # momentanément plein: réessayer
+                continue
+            except (ConnectionError, OSError, protocol.ProtocolError):
+                continue
+
+            if resuming and self.token is not None:
+                self.incoming.put_nowait(Message(STATUS, "Reconnecté, session reprise"))
+            else:
+                self.incoming.put_nowait(Message(STATUS, "Reconnecté (nouvelle session)"))
+            return frames
+        return None
+
+    def write(self, text):
+        frame = protocol.encode_text(text)
+        if self.deflater:
+            frame = self.deflater.frame(frame)
+        self.writer.write(frame)
+
+    def send(self, text):
+        """Envoie un message sans attendre de réponse (pendant une coupure, il part à la reconnexion)"""
+        self.sent += 1
+        self.unacked.append((self.sent, text))
+        if self.connected:
+            self.write(text)
+            self.written = self.sent
+
+    def send_private(self, recipient, text):
+        self.send(f"/to {recipient} {text}")
+
+    def send_all(self, text):
+        self.send(f"/all {text}")
+
+    async def list(self, prefix='', page=1, timeout=5.0):
+        """Noms des clients connectés (une page, éventuellement filtrée par préfixe)"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_lists.append(future)
+        self.send(f"/list {prefix} {page}" if prefix else f"/list {page}")
+        names = await asyncio.wait_for(future, timeout)
+        # Le serveur répond « Vous êtes seul » sans liste quand on est seul
+        return names if names or prefix else [self.name]
+
+    async def drain(self):
+        """Attend que les messages en attente d'écriture aient été passés au noyau"""
+        if self.connected:
+            await self.writer.drain()
+
+    async def close(self):
+        """Quitte le chat et ferme la connexion"""
+        self.closing = True
+        if self.connected:
+            try:
+                self.write("/quit")
+                await self.writer.drain()
+            except (ConnectionError, OSError):
+                pass
+        if self.read_task:
+            # Laisser le serveur fermer en premier: fermer avec des données non lues
+            # provoquerait un RST au lieu d'une fin de connexion normale
+            try:
+                await asyncio.wait_for(self.read_task, 2.0)
+            except asyncio.TimeoutError:
+                self.read_task.cancel()
+        if self.writer:
+            self.writer.close()
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            self.incoming.put_nowait(None)  # les itérations suivantes s'arrêtent aussi
+            raise StopAsyncIteration
+        return message
+
+
+def parse_clients_list(text):
+    """Extrait les noms d'une réponse /list"""
+    names = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('• '):
+            names.append(line[2:].removesuffix(' (vous)'))
+    return names
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Table des commandes du chat et pool de travailleurs pour les commandes lourdes
+
+handle_command était une chaîne de if/elif exécutée sur le chemin de lecture
+de la connexion: une commande coûteuse (/history qui relit le journal sur
+disque, /stats qui parcourt toutes les files) retardait tous les messages
+suivants du client. Chaque commande est maintenant inscrite dans une table
+(recherche en O(1)) avec ses métadonnées:
+
+- légère: exécutée sur place, comme avant;
+- lourde: confiée à un pool borné de threads, servie par priorité (SYSTEM,
+  puis CONTROL, puis BULK) puis par ordre d'arrivée. Quand la file du pool
+  est pleine, la commande est refusée plutôt qu'attendue sans fin; les
+  tâches SYSTEM du serveur passent toujours.
+
+Une commande lourde ne fait que lire l'état du serveur et répondre: sa
+réponse peut arriver après celle des messages envoyés ensuite par le client.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# Priorités du pool (la plus petite passe d'abord)
+SYSTEM = 0    # tâches du serveur (purge des boîtes aux lettres)
+CONTROL = 1   # administration et contrôle (/stats)
+BULK = 2      # contenu demandé par les clients (historique, recherche, exports)
+PRIORITY_NAMES = {SYSTEM: 'system', CONTROL: 'control', BULK: 'bulk'}
+
+COMMAND_WORKERS = 2
+COMMAND_QUEUE = 256
+
+
+class Command(namedtuple('Command', 'name handler heavy priority needs_args admin usage')):
+    """Commande inscrite: handler(server, expéditeur, arguments, socket)
+
+    Inscrite par le décorateur, handler est le nom de la méthode: elle est
+    cherchée sur le serveur à chaque appel, si bien qu'une sous-classe qui la
+    redéfinit (shards, fédération) est bien appelée.
+    """
+
+    __slots__ = ()
+
+    def run(self, server, sender, args, sender_socket):
+        if isinstance(self.handler, str):
+            return getattr(server, self.handler)(sender, args, sender_socket)
+        return self.handler(server, sender, args, sender_socket)
+
+
+class CommandTable:
+    """Table {nom: Command}; chaque serveur en a une copie qu'il peut compléter"""
+
+    def __init__(self, commands=None):
+        self.commands = dict(commands or {})
+
+    def register(self, name, handler=None, heavy=False, priority=BULK, needs_args=False,
+                 admin=False, usage=None):
+        """Inscrit une commande (fonction ou nom de méthode); sans handler, s'utilise comme décorateur"""
+        if handler is None:
+            def decorator(function):
+                self.register(name, function.__name__, heavy, priority, needs_args, admin, usage)
+                return function
+            return decorator
+        self.commands[name] = Command(name, handler, heavy, priority, needs_args, admin, usage)
+        return handler
+
+    def get(self, name):
+        return self.commands.get(name)
+
+    def copy(self):
+        return CommandTable(self.commands)
+
+    def __contains__(self, name):
+        return name in self.commands
+
+    def __iter__(self):
+        return iter(sorted(self.commands))
+
+
+class CommandPool:
+    """Threads qui exécutent les tâches par priorité, avec une file bornée"""
+
+    def __init__(self, workers=COMMAND_WORKERS, max_pending=COMMAND_QUEUE, wait_histogram=None):
+        self.max_pending = max_pending
+        # Tâches en file: compté sous le verrou, pour que la borne tienne entre lecteurs concurrents
+        self.pending = 0
+        self.lock = threading.Lock()
+        # (priorité, numéro d'arrivée, fonction, arguments, heure de dépôt)
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        # Temps passé en file par une tâche (metrics.Histogram), si donné
+        self.wait_histogram = wait_histogram
+        self.threads = [threading.Thread(target=self.work, name=f"commandes-{index}", daemon=True)
+                        for index in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, priority, func, *args):
+        """Met une tâche en file; False si la file est pleine (jamais pour SYSTEM)"""
+        with self.lock:
+            if priority > SYSTEM and self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+        self.queue.put((priority, next(self.sequence), func, args, time.perf_counter()))
+        return True
+
+    def work(self):
+        while True:
+            priority, _, func, args, queued = self.queue.get()
+            if func is None:
+                break
+            with self.lock:
+                self.pending -= 1
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(time.perf_counter() - queued)
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[SERVEUR] ❌ Tâche {PRIORITY_NAMES.get(priority, priority)} "
+                      f"{getattr(func, '__name__', func)} échouée: {e}")
+
+    def depth(self):
+        return self.pending
+
+    def stop(self, timeout=1.0):
+        """Arrête les travailleurs; les tâches encore en file sont abandonnées"""
+        for _ in self.threads:
+            # Priorité -1: passe devant les tâches en attente
+            self.queue.put((-1, next(self.sequence), None, (), 0.0))
+        for thread in self.threads:
+            thread.join(timeout)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Connexions clients avec file de sortie bornée
+
+broadcast() ne fait plus que déposer les trames dans la file (Outbox) de
+chaque destinataire; un écrivain propre à la connexion (thread ou tâche
+asyncio) vide la file vers le socket. Un client lent ne bloque donc plus
+les autres: quand sa file est pleine, la politique choisie s'applique.
+"""
+
+import asyncio
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+# Politiques appliquées quand la file d'un client est pleine
+DROP_OLDEST = 'drop_oldest'   # jeter le plus ancien message en attente
+DISCONNECT = 'disconnect'     # déconnecter le consommateur lent
+BLOCK = 'block'               # attendre au plus `timeout` secondes, puis déconnecter
+POLICIES = (DROP_OLDEST, DISCONNECT, BLOCK)
+
+BATCH_SIZE = 64
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+
+class SlowConsumerError(ConnectionError):
+    """Le client ne lit pas assez vite: sa file de sortie a débordé"""
+
+
+class Outbox:
+    """File de sortie bornée, partagée entre les émetteurs et l'écrivain"""
+
+    def __init__(self, maxsize=1024, policy=DROP_OLDEST, timeout=1.0, blocking=True):
+        if policy not in POLICIES:
+            raise ValueError(f"politique inconnue: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.timeout = timeout
+        # False pour la boucle asyncio: put() ne doit jamais y bloquer
+        self.blocking = blocking
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        # Vrai quand la connexion est transmise à un autre processus (relais à chaud)
+        self.detached = False
+        self.dropped = 0
+        self.full_since = None
+        # Appelé après chaque dépôt (réveil de l'écrivain asyncio)
+        self.on_put = None
+
+    def put(self, data, block=True):
+        """Dépose une trame; renvoie False si le client doit être déconnecté
+
+        block=False: ne jamais attendre, même avec la politique BLOCK (minuteurs).
+        """
+        with self.cond:
+            if self.closed:
+                return False
+
+            if len(self.queue) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.policy == BLOCK and self.blocking and block:
+                    if not self.cond.wait_for(self._has_room, self.timeout) or self.closed:
+                        return False
+                elif self.policy == BLOCK:
+                    # Sans pouvoir bloquer, on tolère le débordement pendant `timeout`
+                    now = time.monotonic()
+                    if self.full_since is None:
+                        self.full_since = now
+                    elif now - self.full_since > self.timeout:
+                        return False
+                else:
+                    return False
+
+            self.queue.append(data)
+            self.cond.notify_all()
+
+        if self.on_put:
+            self.on_put()
+        return True
+
+    def _has_room(self):
+        return self.closed or len(self.queue) < self.maxsize
+
+    def take_batch(self, max_items=BATCH_SIZE):
+        """Retire jusqu'à max_items trames sans attendre"""
+        with self.cond:
+            return self._take(max_items)
+
+    def get_batch(self, max_items=BATCH_SIZE, linger=0.0):
+        """Attend au moins une trame; renvoie [] une fois fermée et vidée
+        
+        Avec linger > 0, attend encore jusqu'à `linger` secondes que d'autres
+        trames arrivent, pour les écrire toutes en un seul appel système.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.queue or self.closed)
+            if linger and len(self.queue) < max_items:
+                self.cond.wait_for(lambda: self.closed or len(self.queue) >= min(max_items, self.maxsize),
+                                   linger)
+            return self._take(max_items)
+
+    def _take(self, max_items):
+        queue = self.queue
+        count = min(max_items, len(queue))
+        batch = [queue.popleft() for _ in range(count)]
+        if count:
+            if len(queue) < self.maxsize:
+                self.full_since = None
+            # Réveiller les émetteurs bloqués (politique BLOCK)
+            self.cond.notify_all()
+        return batch
+
+    def close(self, discard=False):
+        """Refuse les nouveaux dépôts; l'écrivain vide ce qui reste"""
+        with self.cond:
+            self.closed = True
+            if discard:
+                self.queue.clear()
+            self.cond.notify_all()
+
+        if self.on_put:
+            self.on_put()
+
+    def detach(self):
+        """Arrête l'écrivain sans fermer le socket; renvoie les trames non envoyées"""
+        with self.cond:
+            self.closed = True
+            self.detached = True
+            pending = list(self.queue)
+            self.queue.clear()
+            self.cond.notify_all()
+
+        if self.on_put:
+            self.on_put()
+        return pending
+
+    def depth(self):
+        return len(self.queue)
+
+
+def sendmsg_all(sock, buffers):
+    """Écrit toutes les trames avec des écritures vectorisées (sendmsg)
+    
+    Un seul appel système pour tout le lot tant que le noyau accepte tout;
+    en cas d'écriture partielle, on reprend au premier octet non envoyé.
+    """
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(buffers))
+        return
+    
+    views = [memoryview(data) for data in buffers]
+    first = 0
+    while first < len(views):
+        sent = sock.sendmsg(views[first:first + IOV_MAX])
+        while first < len(views) and sent >= len(views[first]):
+            sent -= len(views[first])
+            first += 1
+        if sent:
+            views[first] = views[first][sent:]
+
+
+class ClientConnection:
+    """Connexion d'un client servie par un thread écrivain dédié
+
+    Expose send/sendall/close comme un socket, si bien que ChatServer
+    l'utilise sans savoir que les envois sont mis en file.
+    """
+
+    def __init__(self, sock, outbox, coalesce=0.0):
+        self.sock = sock
+        self.outbox = outbox
+        # Fenêtre de regroupement des écritures (secondes, 0 = aucune)
+        self.coalesce = coalesce
+        # Compression négociée (protocol.Deflater), appliquée au moment d'écrire
+        self.deflater = None
+        # Appelé après chaque écriture avec (trames, octets), pour les métriques
+        self.on_sent = None
+        self.writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer_thread.start()
+
+    def send(self, data, block=True):
+        if not self.outbox.put(data, block):
+            if self.outbox.closed:
+                raise ConnectionResetError("connexion fermée")
+            self.abort()
+            raise SlowConsumerError("file de sortie pleine")
+        return len(data)
+
+    sendall = send
+
+    def write_loop(self):
+        """Vide la file de sortie vers le socket"""
+        try:
+            while True:
+                batch = self.outbox.get_batch(linger=self.coalesce)
+                if not batch:
+                    break
+                if self.deflater:
+                    batch = [self.deflater.frame(frame) for frame in batch]
+                sendmsg_all(self.sock, batch)
+                if self.on_sent:
+                    self.on_sent(len(batch), sum(map(len, batch)))
+        except OSError:
+            self.outbox.close(discard=True)
+        finally:
+            # Réveille le thread lecteur bloqué dans recv() (sauf si le socket change de processus)
+            if not self.outbox.detached:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def close(self):
+        """Fermeture douce: les trames déjà en file sont encore envoyées"""
+        self.outbox.close()
+
+    def abort(self):
+        """Fermeture immédiate: la file est abandonnée"""
+        self.outbox.close(discard=True)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def detach(self, timeout=2.0):
+        """Arrête l'écrivain en laissant le socket ouvert, pour le transmettre
+        
+        Renvoie les trames pas encore écrites, ou None si l'écrivain est resté
+        bloqué au milieu d'une écriture.
+        """
+        pending = self.outbox.detach()
+        self.writer_thread.join(timeout)
+        return None if self.writer_thread.is_alive() else pending
+
+    def wait_closed(self, timeout=2.0):
+        """Attend la fin de l'écrivain puis libère le socket"""
+        self.writer_thread.join(timeout)
+        if self.writer_thread.is_alive():
+            self.abort()
+            self.writer_thread.join(timeout)
+        self.sock.close()
+
+    def queue_depth(self):
+        return self.outbox.depth()
+
+
+class AsyncConnection:
+    """Connexion d'un client servie par une tâche écrivain asyncio"""
+
+    def __init__(self, writer, outbox, coalesce=0.0):
+        self.writer = writer
+        self.outbox = outbox
+        self.coalesce = coalesce
+        self.deflater = None
+        self.on_sent = None
+        self.ready = asyncio.Event()
+        # Les commandes lourdes répondent depuis le pool de threads (commands.py)
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        outbox.on_put = self.wake
+        self.writer_task = self.loop.create_task(self.write_loop())
+
+    def wake(self):
+        """Réveille l'écrivain; appelable depuis un autre thread que celui de la boucle"""
+        if threading.get_ident() == self.loop_thread:
+            self.ready.set()
+        else:
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    def send(self, data, block=False):
+        # Jamais bloquant (voir Outbox.blocking); block garde la signature de ClientConnection
+        if not self.outbox.put(data):
+            if self.outbox.closed:
+                raise ConnectionResetError("connexion fermée")
+            self.abort()
+            raise SlowConsumerError("file de sortie pleine")
+        return len(data)
+
+    sendall = send
+
+    async def write_loop(self):
+        """Vide la file de sortie vers le transport, au rythme du client"""
+        try:
+            while True:
+                batch = self.outbox.take_batch()
+                if batch:
+                    if self.deflater:
+                        batch = [self.deflater.frame(frame) for frame in batch]
+                    self.writer.writelines(batch)
+                    await self.writer.drain()
+                    if self.on_sent:
+                        self.on_sent(len(batch), sum(map(len, batch)))
+                    continue
+
+                if self.outbox.closed:
+                    break
+                self.ready.clear()
+                await self.ready.wait()
+                if self.coalesce and not self.outbox.closed:
+                    # Laisser d'autres trames s'accumuler avant d'écrire
+                    await asyncio.sleep(self.coalesce)
+        except (ConnectionError, OSError):
+            self.outbox.close(discard=True)
+        finally:
+            if not self.outbox.detached:
+                self.writer.close()
+
+    def close(self):
+        self.outbox.close()
+
+    def abort(self):
+        self.outbox.close(discard=True)
+        if threading.get_ident() == self.loop_thread:
+            self.writer.transport.abort()
+        else:
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+
+    async def detach(self, timeout=2.0):
+        """Comme ClientConnection.detach, en vidant aussi le tampon du transport"""
+        pending = self.outbox.detach()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.writer_task), timeout)
+            self.writer.transport.set_write_buffer_limits(0)
+            await asyncio.wait_for(self.writer.drain(), timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError):
+            return None
+        return pending
+
+    async def wait_closed(self, timeout=2.0):
+        try:
+            await asyncio.wait_for(asyncio.shield(self.writer_task), timeout)
+        except asyncio.TimeoutError:
+            self.abort()
+
+    def queue_depth(self):
+        return self.outbox.depth()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Fédération de serveurs de chat sur plusieurs machines
+
+shards.py répartit les clients entre les processus d'une même machine. Ici,
+des serveurs indépendants (autres machines, ou autres ports) se relient par
+TCP et forment un seul réseau de chat:
+
+- chaque nœud est identifié par l'adresse de son port de fédération
+  (hôte:port) et se relie à tous les autres: il connaît au départ quelques
+  pairs (--peer), puis apprend les autres par les condensés qu'ils envoient;
+- table de présence répartie {nom: nœud}: chaque nœud fait autorité pour ses
+  propres clients. À l'ouverture d'une liaison il envoie sa liste complète,
+  puis seulement les changements (arrivées, départs), numérotés. Un condensé
+  (version courante) part toutes les secondes: un pair qui n'a pas la même
+  version redemande la liste complète;
+- /to est transmis au nœud qui tient le destinataire; broadcast et les
+  messages de salon partent une seule fois par nœud, qui les diffuse à ses
+  propres clients;
+- un nœud qui part (fin de liaison, ou silence de PEER_TIMEOUT secondes)
+  emporte ses clients de la table; il est rappelé toutes les
+  RECONNECT_INTERVAL secondes et retrouve sa place à son retour.
+
+Les liaisons ne sont pas authentifiées: réservé à un réseau de confiance.
+Limites: /rooms ne compte que les membres locaux, et un message gardé pour
+un client hors ligne attend dans la boîte du nœud où il a été envoyé.
+
+Exemple (trois nœuds sur une machine):
+    python serv.py --host 127.0.0.1 --port 5001 --federation-port 7001
+    python serv.py --host 127.0.0.1 --port 5002 --federation-port 7002 --peer 127.0.0.1:7001
+    python serv.py --host 127.0.0.1 --port 5003 --federation-port 7003 --peer 127.0.0.1:7001
+"""
+
+import socket
+import threading
+import time
+
+import protocol
+from connection import ClientConnection, DISCONNECT, Outbox
+from serv import AsyncChatServer, ChatServer, RECV_SIZE
+
+# Trames en attente vers un pair avant de couper la liaison (il se resynchronise au retour)
+PEER_QUEUE = 8192
+GOSSIP_INTERVAL = 1.0
+PEER_TIMEOUT = 5.0
+RECONNECT_INTERVAL = 2.0
+CONNECT_TIMEOUT = 1.0
+
+
+def parse_address(text):
+    """'hôte:port' -> (hôte, port)"""
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class PeerLink:
+    """Liaison TCP avec un autre nœud, servie par un thread lecteur et un écrivain"""
+
+    def __init__(self, sock, outbound, address=None):
+        self.sock = sock
+        # Envois jamais bloquants: un pair trop lent est coupé, pas attendu
+        self.connection = ClientConnection(sock, Outbox(PEER_QUEUE, DISCONNECT))
+        # Vrai si c'est nous qui avons appelé (address: l'adresse composée)
+        self.outbound = outbound
+        self.address = address
+        # Connus après son HELLO
+        self.node = None
+        self.incarnation = None
+        # Dernière version de sa présence appliquée, et noms qu'il annonce
+        self.version = None
+        self.names = set()
+
+    def send(self, op, **fields):
+        self.send_frame(protocol.encode_json(protocol.PEER, dict(fields, op=op)))
+
+    def send_frame(self, frame):
+        try:
+            self.connection.send(frame)
+        except ConnectionError:
+            pass  # liaison en train de tomber: le lecteur fait le ménage
+
+    def close(self):
+        self.connection.abort()
+
+
+class FederationMixin:
+    """Ajoute à un serveur de chat des liaisons avec les autres nœuds du réseau"""
+
+    def __init__(self, *args, federation_port=0, peers=(), node_name=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.federation_port = federation_port
+        # Identifiant = adresse à laquelle les autres nœuds nous joignent
+        # (--node-name si le serveur écoute sur 0.0.0.0 ou derrière une autre adresse)
+        self.node_id = node_name or f"{self.host}:{federation_port}"
+        # Distingue un nœud redémarré (sa numérotation repart de zéro)
+        self.incarnation = time.time()
+        # Protège les liaisons, la table de présence et les nœuds connus
+        self.federation_lock = threading.Lock()
+        # Liaisons établies {nœud: PeerLink}
+        self.peers = {}
+        # Nœuds à rappeler s'ils ne sont pas reliés, et heure du prochain essai
+        self.known_nodes = set(peers)
+        self.next_dial = {}
+        # Présence: {nom: nœud} pour les clients des autres nœuds, et notre propre version
+        self.presence = {}
+        self.presence_version = 0
+        # Change à chaque mise à jour de la présence distante (cache de /list)
+        self.presence_changes = 0
+        self.network_listing = (None, ())
+        self.federation_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.federation_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.metrics.registry.gauge('chat_federation_peers', "Nœuds reliés", lambda: len(self.peers))
+        self.metrics.registry.gauge('chat_federation_remote_clients', "Clients des autres nœuds",
+                                    lambda: len(self.presence))
+
+    def on_started(self):
+        super().on_started()
+        self.federation_socket.bind((self.host, self.federation_port))
+        self.federation_socket.listen()
+        print(f"[SERVEUR] 🌐 Fédération sur {self.node_id}")
+        threading.Thread(target=self.accept_peers, daemon=True).start()
+        threading.Thread(target=self.gossip_loop, daemon=True).start()
+
+    # Liaisons
+
+    def accept_peers(self):
+        while True:
+            try:
+                sock, _ = self.federation_socket.accept()
+            except OSError:
+                break  # socket fermé à l'arrêt
+            self.start_link(PeerLink(sock, outbound=False))
+
+    def dial(self, node):
+        """Appelle un nœud connu (depuis le thread de bavardage)"""
+        try:
+            sock = socket.create_connection(parse_address(node), timeout=CONNECT_TIMEOUT)
+        except (OSError, ValueError):
+            return
+        self.start_link(PeerLink(sock, outbound=True, address=node))
+
+    def start_link(self, link):
+        link.sock.settimeout(PEER_TIMEOUT)
+        with self.federation_lock:
+            nodes = sorted(self.known_nodes | set(self.peers))
+        link.send('hello', node=self.node_id, incarnation=self.incarnation, nodes=nodes)
+        threading.Thread(target=self.read_peer, args=(link,), daemon=True).start()
+
+    def read_peer(self, link):
+        """Lit les trames d'un pair jusqu'à la fin de la liaison"""
+        decoder = protocol.FrameDecoder()
+        try:
+            while True:
+                data = link.sock.recv(RECV_SIZE)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    if frame.kind != protocol.PEER:
+                        raise protocol.ProtocolError(f"trame de type {frame.kind} sur une liaison de fédération")
+                    self.handle_peer(link, frame.json())
+        except (OSError, ValueError, KeyError, TypeError, protocol.ProtocolError) as e:
+            # Silence trop long (socket.timeout), coupure ou pair qui ne parle pas le protocole
+            if link.node:
+                print(f"[SERVEUR] 🌐 Liaison avec {link.node} interrompue: {e or type(e).__name__}")
+        finally:
+            self.drop_link(link)
+
+    def handle_peer(self, link, message):
+        op = message['op']
+        if op == 'hello':
+            self.peer_hello(link, message)
+            return
+        if link.node is None or self.peers.get(link.node) is not link:
+            return  # liaison en double, en cours de fermeture
+        if op == 'presence':
+            self.apply_presence(link, message)
+        elif op == 'digest':
+            self.learn_nodes(message['nodes'])
+            if message['version'] != link.version or message['incarnation'] != link.incarnation:
+                link.send('sync')
+        elif op == 'sync':
+            self.send_presence(link)
+        elif op == 'broadcast':
+            self.call_soon(self.local_broadcast, message['text'], message['exclude'])
+        elif op == 'rooms':
+            self.call_soon(self.local_rooms_broadcast, tuple(message['rooms']), message['text'], message['exclude'])
+        elif op == 'history':
+            self.call_soon(self.local_record_message, message['room'], message['sender'],
+                           message['text'], message['line'])
+        elif op == 'private':
+            self.call_soon(self.receive_private, message['sender'], message['recipient'], message['text'])
+        elif op == 'notice':
+            self.call_soon(self.local_notify, message['name'], message['text'])
+
+    def peer_hello(self, link, message):
+        node = message['node']
+        if node == self.node_id:
+            link.close()  # on s'est appelé soi-même (adresse annoncée par un pair)
+            return
+        link.node = node
+        link.incarnation = message['incarnation']
+        with self.federation_lock:
+            if link.outbound and link.address != node:
+                # Adresse composée différente de l'identifiant (nom d'hôte, alias): garder l'identifiant
+                self.known_nodes.discard(link.address)
+            self.known_nodes.add(node)
+            existing = self.peers.get(node)
+            if existing is not None and not self.prefer(link, existing):
+                link.close()
+                return
+            self.peers[node] = link
+        self.learn_nodes(message['nodes'])
+        if existing is not None:
+            existing.close()
+        else:
+            print(f"[SERVEUR] 🌐 Relié au nœud {node}")
+        self.send_presence(link)
+
+    def prefer(self, link, existing):
+        """Deux liaisons avec le même nœud (appels croisés): les deux côtés gardent la même"""
+        if existing.incarnation != link.incarnation:
+            return True  # le nœud a redémarré: l'ancienne liaison est morte
+        # Garder celle appelée par le plus petit identifiant; à égalité, la plus récente
+        dialer = min(self.node_id, link.node)
+        return (self.node_id if link.outbound else link.node) == dialer or \
+            (self.node_id if existing.outbound else existing.node) != dialer
+
+    def learn_nodes(self, nodes):
+        with self.federation_lock:
+            self.known_nodes.update(node for node in nodes if node != self.node_id)
+
+    def drop_link(self, link):
+        link.close()
+        with self.federation_lock:
+            if link.node is None or self.peers.get(link.node) is not link:
+                removed = None
+            else:
+                del self.peers[link.node]
+                removed = [name for name, node in self.presence.items() if node == link.node]
+                for name in removed:
+                    del self.presence[name]
+                self.presence_changes += 1
+        if removed is not None:
+            print(f"[SERVEUR] 🌐 Nœud {link.node} déconnecté ({len(removed)} client(s) retiré(s))")
+        link.connection.wait_closed(timeout=1.0)
+
+    def gossip_loop(self):
+        """Envoie les condensés et rappelle les nœuds connus qui ne sont pas reliés"""
+        while True:
+            time.sleep(GOSSIP_INTERVAL)
+            now = time.monotonic()
+            with self.federation_lock:
+                nodes = sorted(self.known_nodes | set(self.peers))
+                digest = protocol.encode_json(protocol.PEER, {
+                    'op': 'digest', 'version': self.presence_version,
+                    'incarnation': self.incarnation, 'nodes': nodes})
+                links = list(self.peers.values())
+                missing = [node for node in self.known_nodes
+                           if node not in self.peers and self.next_dial.get(node, 0) <= now]
+                for node in missing:
+                    self.next_dial[node] = now + RECONNECT_INTERVAL
+            for link in links:
+                link.send_frame(digest)
+            for node in missing:
+                self.dial(node)
+
+    # Présence
+
+    def send_presence(self, link):
+        """Liste complète de nos clients, à l'ouverture ou sur demande (sync)"""
+        with self.federation_lock:
+            link.send('presence', full=True, version=self.presence_version, names=list(self.clients))
+
+    def announce(self, joined=(), left=()):
+        """Envoie un changement de notre présence à chaque nœud relié"""
+        with self.federation_lock:
+            # Sous le verrou: les versions partent dans l'ordre, après une éventuelle liste complète
+            self.presence_version += 1
+            frame = protocol.encode_json(protocol.PEER, {
+                'op': 'presence', 'version': self.presence_version,
+                'joined': list(joined), 'left': list(left)})
+            for link in self.peers.values():
+                link.send_frame(frame)
+
+    def apply_presence(self, link, message):
+        node = link.node
+        evicted = []
+        with self.federation_lock:
+            if message.get('full'):
+                joined, left = message['names'], list(link.names)
+                link.names = set()
+            elif link.version is None or message['version'] != link.version + 1:
+                # Un changement manque: redemander la liste complète
+                link.send('sync')
+                return
+            else:
+                joined, left = message['joined'], message['left']
+            link.version = message['version']
+
+            for name in left:
+                link.names.discard(name)
+                if self.presence.get(name) == node:
+                    del self.presence[name]
+            for name in joined:
+                link.names.add(name)
+                owner = self.presence.get(name)
+                if owner is not None and owner != node and owner < node:
+                    continue  # nom déjà tenu par un nœud prioritaire
+                if name in self.clients:
+                    # Même nom arrivé en même temps sur deux nœuds: le plus petit identifiant le garde
+                    if self.node_id < node:
+                        continue
+                    evicted.append(name)
+                self.presence[name] = node
+            self.presence_changes += 1
+        for name in evicted:
+            self.call_soon(self.evict_duplicate, name, node)
+
+    def evict_duplicate(self, name, node):
+        client_socket = self.clients.get(name)
+        if client_socket is None:
+            return
+        print(f"[SERVEUR] 🌐 '{name}' aussi connecté sur {node}: déconnecté ici")
+        try:
+            protocol.send_text(client_socket, f"❌ Le nom '{name}' est déjà utilisé sur un autre serveur du réseau\n")
+            client_socket.close()
+        except ConnectionError:
+            pass
+
+    def register_client(self, client_name, client_socket):
+        if client_name in self.presence:
+            protocol.send_json(client_socket, protocol.REJECT, {'reason': 'NAME_TAKEN'})
+            client_socket.close()
+            return False
+        if not super().register_client(client_name, client_socket):
+            return False
+        self.announce(joined=[client_name])
+        return True
+
+    def unregister_client(self, client_name):
+        super().unregister_client(client_name)
+        self.announce(left=[client_name])
+
+    def locate(self, name):
+        """Nœud distant qui tient ce client, None s'il est ici ou inconnu"""
+        if name in self.clients:
+            return None
+        return self.presence.get(name)
+
+    def client_names(self):
+        return list(self.clients) + list(self.presence)
+
+    def listing(self):
+        key = (self.clients.snapshot.version, self.presence_changes)
+        if self.network_listing[0] != key:
+            with self.federation_lock:
+                names = sorted(set(self.clients) | set(self.presence))
+            self.network_listing = (key, tuple(names))
+        return self.network_listing
+
+    # Routage: un envoi par nœud, diffusé ensuite par ce nœud à ses propres clients
+
+    def publish(self, op, **fields):
+        frame = protocol.encode_json(protocol.PEER, dict(fields, op=op))
+        for link in list(self.peers.values()):
+            link.send_frame(frame)
+        self.metrics.messages_out.inc(len(self.peers), 'federation')
+
+    def broadcast(self, message, exclude=None):
+        self.local_broadcast(message, exclude)
+        self.publish('broadcast', text=message, exclude=exclude)
+
+    def local_broadcast(self, message, exclude=None):
+        """Diffuse aux seuls clients de ce nœud"""
+        super().broadcast(message, exclude)
+
+    def rooms_broadcast(self, rooms, message, exclude=None):
+        self.local_rooms_broadcast(rooms, message, exclude)
+        self.publish('rooms', rooms=list(rooms), text=message, exclude=exclude)
+
+    def local_rooms_broadcast(self, rooms, message, exclude=None):
+        super().rooms_broadcast(rooms, message, exclude)
+
+    def record_message(self, room, sender, text, line):
+        # Chaque nœud garde l'historique de tout le réseau
+        self.local_record_message(room, sender, text, line)
+        self.publish('history', room=room, sender=sender, text=text, line=line)
+
+    def local_record_message(self, room, sender, text, line):
+        super().record_message(room, sender, text, line)
+
+    def send_private_message(self, sender, recipient, message, sender_socket):
+        node = self.locate(recipient)
+        link = self.peers.get(node) if node else None
+        if link is None:
+            super().send_private_message(sender, recipient, message, sender_socket)
+            return
+        link.send('private', sender=sender, recipient=recipient, text=message)
+        protocol.send_text(sender_socket, f"✓ Message privé envoyé à {recipient}\n")
+
+    def receive_private(self, sender, recipient, message):
+        """Message privé transmis par un autre nœud"""
+        if not self.deliver_private(sender, recipient, message):
+            # Parti entre-temps: l'expéditeur est prévenu sur son propre nœud
+            self.notify(sender, f"❌ Impossible d'envoyer le message à {recipient}")
+
+    def notify(self, client_name, text):
+        node = self.locate(client_name)
+        link = self.peers.get(node) if node else None
+        if link is None:
+            super().notify(client_name, text)
+        else:
+            link.send('notice', name=client_name, text=text)
+
+    def local_notify(self, client_name, text):
+        """Avis venu d'un autre nœud: jamais renvoyé plus loin"""
+        super().notify(client_name, text)
+
+    def shutdown(self):
+        # Les pairs retirent nos clients dès la fin des liaisons
+        self.federation_socket.close()
+        with self.federation_lock:
+            links = list(self.peers.values())
+        for link in links:
+            link.close()
+        return super().shutdown()
+
+
+class FederatedChatServer(FederationMixin, ChatServer):
+    """Nœud de fédération utilisant un thread par client"""
+
+
+class AsyncFederatedChatServer(FederationMixin, AsyncChatServer):
+    """Nœud de fédération servant ses clients depuis une boucle asyncio"""
+
+
+FEDERATED_BACKENDS = {
+    'threads': FederatedChatServer,
+    'asyncio': AsyncFederatedChatServer,
+}
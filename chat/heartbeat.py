@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Battements de cœur et récolte des connexions mortes
+
+Chaque connexion a un seul minuteur dans la roue (timing_wheel.py):
+- avant JOIN, le délai de poignée de main;
+- ensuite, une vérification périodique: après ping_interval secondes sans
+  rien recevoir, le serveur envoie un PING; après idle_timeout secondes
+  de silence, la connexion est récoltée (abort).
+
+Le chemin de réception ne fait que noter l'heure (touch): le minuteur
+n'est pas réarmé à chaque trame, il recalcule l'échéance quand il expire.
+"""
+
+import struct
+import time
+
+import protocol
+
+PING_PAYLOAD = struct.Struct('!Q')
+
+# Raisons de récolte (étiquette de la métrique)
+HANDSHAKE = 'handshake'
+IDLE = 'idle'
+
+
+class Watch:
+    """État de vivacité d'une connexion"""
+
+    __slots__ = ('connection', 'last_seen', 'timer', 'joined', 'closed')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_seen = time.monotonic()
+        self.timer = None
+        self.joined = False
+        self.closed = False
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class HeartbeatMonitor:
+    """Arme les délais de chaque connexion dans une roue de temporisation"""
+
+    def __init__(self, wheel, ping_interval=15.0, idle_timeout=45.0, handshake_timeout=10.0,
+                 on_reap=None, on_rtt=None):
+        self.wheel = wheel
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        # on_reap(connexion, raison) doit fermer la connexion; on_rtt(secondes) mesure les pongs
+        self.on_reap = on_reap
+        self.on_rtt = on_rtt
+
+    def watch(self, connection):
+        """Commence la surveillance d'une nouvelle connexion"""
+        watch = Watch(connection)
+        if self.handshake_timeout:
+            watch.timer = self.wheel.schedule(self.handshake_timeout, self.handshake_expired, watch)
+        return watch
+
+    def joined(self, watch):
+        """Poignée de main terminée: passage aux battements de cœur"""
+        if watch.timer:
+            watch.timer.cancel()
+        watch.joined = True
+        self.arm(watch, self.ping_interval or self.idle_timeout)
+
+    def release(self, watch):
+        watch.closed = True
+        if watch.timer:
+            watch.timer.cancel()
+
+    def arm(self, watch, delay):
+        if delay and not watch.closed:
+            watch.timer = self.wheel.schedule(delay, self.check, watch)
+
+    def handshake_expired(self, watch):
+        if not watch.closed and not watch.joined:
+            self.reap(watch, HANDSHAKE)
+
+    def check(self, watch):
+        """Échéance du minuteur: ping, récolte, ou nouvelle échéance"""
+        if watch.closed:
+            return
+        idle = time.monotonic() - watch.last_seen
+
+        if self.idle_timeout and idle >= self.idle_timeout:
+            self.reap(watch, IDLE)
+            return
+
+        if self.ping_interval and idle >= self.ping_interval:
+            self.ping(watch)
+            delay = self.ping_interval
+        else:
+            # Activité récente: prochaine vérification à la date où le silence atteindra le seuil
+            delay = (self.ping_interval or self.idle_timeout) - idle
+        if self.idle_timeout:
+            delay = min(delay, self.idle_timeout - idle)
+        self.arm(watch, delay)
+
+    def ping(self, watch):
+        payload = PING_PAYLOAD.pack(time.monotonic_ns())
+        try:
+            # Depuis le thread de la roue: ne jamais attendre un client lent
+            watch.connection.send(protocol.encode_frame(protocol.PING, payload), block=False)
+        except ConnectionError:
+            pass
+
+    def pong(self, payload):
+        """Mesure l'aller-retour d'un PING revenu"""
+        if self.on_rtt and len(payload) == PING_PAYLOAD.size:
+            (sent,) = PING_PAYLOAD.unpack(payload)
+            self.on_rtt((time.monotonic_ns() - sent) / 1e9)
+
+    def reap(self, watch, reason):
+        watch.closed = True
+        self.on_reap(watch.connection, reason)
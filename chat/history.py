@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Historique des messages du chat
+
+Deux niveaux:
+- en mémoire, un tampon circulaire (deque bornée) par salon, qui sert
+  /history et le rejeu à l'arrivée sans toucher au disque;
+- sur disque (optionnel), un journal append-only découpé en segments de
+  taille bornée. Les écritures sont faites par un thread dédié, par lots,
+  pour ne jamais ralentir la diffusion des messages; les lectures passent
+  par mmap.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+# Chaque enregistrement du journal: longueur (u32) puis JSON
+RECORD_HEADER = struct.Struct('!I')
+SEGMENT_SIZE = 4 << 20
+MAX_SEGMENTS = 64
+# Segments relus au plus pour compléter /history ou le rejeu (les plus récents)
+SCAN_SEGMENTS = 2
+
+
+class HistoryEntry(namedtuple('HistoryEntry', 'seq timestamp room sender text line')):
+    """Message archivé (room vaut None pour un message à tous)"""
+
+    __slots__ = ()
+
+    def encode(self):
+        payload = json.dumps(list(self), ensure_ascii=False).encode('utf-8')
+        return RECORD_HEADER.pack(len(payload)) + payload
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(*json.loads(payload.decode('utf-8')))
+
+
+class SegmentedLog:
+    """Journal append-only découpé en fichiers segment-NNNNNN.log"""
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith('segment-') and name.endswith('.log')
+        )
+        if not self.segments:
+            self.segments.append(self.segment_path(1))
+        self.current = open(self.segments[-1], 'ab')
+
+    def segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.log")
+
+    def append_batch(self, entries):
+        """Écrit un lot d'enregistrements en un seul write()"""
+        data = b''.join(entry.encode() for entry in entries)
+        if self.current.tell() and self.current.tell() + len(data) > self.segment_size:
+            self.rotate()
+        self.current.write(data)
+        self.current.flush()
+
+    def rotate(self):
+        """Ouvre un nouveau segment et supprime les plus anciens au-delà de max_segments"""
+        self.current.close()
+        number = int(os.path.basename(self.segments[-1])[8:14]) + 1
+        self.segments.append(self.segment_path(number))
+        self.current = open(self.segments[-1], 'ab')
+
+        while len(self.segments) > self.max_segments:
+            os.remove(self.segments.pop(0))
+
+    @staticmethod
+    def read_segment(path):
+        """Lit tous les enregistrements complets d'un segment via mmap"""
+        entries = []
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return entries
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                offset = 0
+                while offset + RECORD_HEADER.size <= size:
+                    (length,) = RECORD_HEADER.unpack_from(data, offset)
+                    start = offset + RECORD_HEADER.size
+                    if start + length > size:
+                        break  # enregistrement en cours d'écriture
+                    entries.append(HistoryEntry.decode(data[start:start + length]))
+                    offset = start + length
+        return entries
+
+    def tail(self, count, predicate=None, max_segments=None):
+        """Les `count` derniers enregistrements (filtrés), du plus ancien au plus récent
+
+        max_segments borne la lecture aux segments les plus récents (None: tous).
+        """
+        result = []
+        if count <= 0:
+            return result
+        for path in list(reversed(self.segments))[:max_segments]:
+            try:
+                entries = self.read_segment(path)
+            except FileNotFoundError:
+                continue  # segment supprimé par une rotation
+            if predicate:
+                entries = [entry for entry in entries if predicate(entry)]
+            result = entries[-(count - len(result)):] + result
+            if len(result) >= count:
+                break
+        return result
+
+    def close(self):
+        self.current.close()
+
+
+class History:
+    """Historique des messages: tampons circulaires par salon + journal disque"""
+
+    def __init__(self, ring_size=1000, directory=None, flush_interval=0.05,
+                 segment_size=SEGMENT_SIZE, max_segments=MAX_SEGMENTS, scan_segments=SCAN_SEGMENTS):
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.scan_segments = scan_segments
+        self.lock = threading.Lock()
+        # {salon: deque}, la clé None regroupe les messages envoyés à tous
+        self.rings = {}
+        # Salons dont le tampon a déjà perdu des messages: les seuls à chercher sur disque
+        self.wrapped = set()
+        # Vrai si le journal contenait plus que ce qui a été rechargé au démarrage
+        self.older_on_disk = False
+        self.seq = 0
+        self.log = None
+        self.pending = queue.SimpleQueue()
+        self.writer_thread = None
+
+        if directory:
+            self.log = SegmentedLog(directory, segment_size, max_segments)
+            # Recharger les messages récents après un redémarrage
+            entries = self.log.tail(ring_size)
+            for entry in entries:
+                self.ring(entry.room).append(entry)
+                self.seq = max(self.seq, entry.seq)
+            self.older_on_disk = len(entries) >= ring_size
+            self.writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+            self.writer_thread.start()
+
+    def ring(self, room):
+        ring = self.rings.get(room)
+        if ring is None:
+            ring = self.rings[room] = deque(maxlen=self.ring_size)
+        elif len(ring) == self.ring_size:
+            self.wrapped.add(room)  # le prochain ajout fait sortir le plus ancien
+        return ring
+
+    def append(self, room, sender, text, line):
+        """Archive un message; l'écriture disque est laissée au thread écrivain"""
+        with self.lock:
+            self.seq += 1
+            entry = HistoryEntry(self.seq, time.time(), room, sender, text, line)
+            self.ring(room).append(entry)
+
+        if self.log:
+            self.pending.put(entry)
+        return entry
+
+    def recent(self, room, count):
+        """Les `count` derniers messages visibles dans un salon (messages à tous compris)"""
+        with self.lock:
+            own = list(self.rings.get(room, ()))
+            shared = list(self.rings.get(None, ())) if room is not None else []
+        entries = list(heapq.merge(own, shared, key=lambda entry: entry.seq))[-count:]
+
+        # Le disque n'a rien de plus si aucun des deux tampons n'a jamais débordé
+        # (sauf messages antérieurs au démarrage); sinon, lecture bornée à scan_segments:
+        # appelé sur le chemin de /join, qui ne doit pas relire tout le journal
+        may_have_more = self.older_on_disk or room in self.wrapped or None in self.wrapped
+        if len(entries) < count and self.log and may_have_more:
+            # Compléter avec les messages plus anciens encore sur disque
+            oldest = entries[0].seq if entries else self.seq + 1
+            older = self.log.tail(count - len(entries),
+                                  lambda entry: entry.room in (room, None) and entry.seq < oldest,
+                                  self.scan_segments)
+            entries = older + entries
+        return entries
+
+    def entries(self):
+        """Messages gardés en mémoire, dans l'ordre d'arrivée"""
+        with self.lock:
+            entries = [entry for ring in self.rings.values() for entry in ring]
+        return sorted(entries, key=lambda entry: entry.seq)
+
+    def restore(self, entries):
+        """Recharge des messages en mémoire (transmis par un autre processus)"""
+        with self.lock:
+            for entry in entries:
+                self.ring(entry.room).append(entry)
+                self.seq = max(self.seq, entry.seq)
+
+    def write_loop(self):
+        """Écrit les messages sur disque par lots"""
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.pending.get(timeout=max(remaining, 0)))
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            entries = [entry for entry in batch if entry is not None]
+            if entries:
+                self.log.append_batch(entries)
+            if stop:
+                break
+
+    def close(self):
+        """Vide la file d'écriture et ferme le journal"""
+        if self.writer_thread:
+            self.pending.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+            self.log.close()
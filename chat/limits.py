@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Limites de débit et contrôle d'admission
+
+- TokenBucket: seau à jetons (débit moyen + rafale), un par client pour les
+  messages et un pour les octets reçus;
+- ConnectionLimiter: plafond global de connexions simultanées, sur le modèle
+  de semaphore_ex.py, mais sans attente: une connexion de trop est refusée
+  tout de suite au lieu de bloquer la boucle d'acceptation.
+"""
+
+import threading
+import time
+
+# Raisons des refus et limitations (étiquettes des métriques)
+SERVER_FULL = 'SERVER_FULL'
+MESSAGES = 'messages'
+BYTES = 'bytes'
+
+
+class TokenBucket:
+    """Seau à jetons: `rate` jetons par seconde, au plus `burst` en réserve"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'clock')
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount=1):
+        """Prend `amount` jetons; sinon renvoie l'attente (secondes) avant d'en avoir assez"""
+        self.refill()
+        # Une demande plus grosse que la rafale passe quand le seau est plein,
+        # et le laisse en dette: le débit moyen reste respecté
+        needed = min(amount, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Limites d'un client: messages par seconde et octets par seconde (0 = illimité)"""
+
+    def __init__(self, message_rate=0, message_burst=0, byte_rate=0, byte_burst=0):
+        self.messages = TokenBucket(message_rate, message_burst or message_rate) if message_rate else None
+        self.bytes = TokenBucket(byte_rate, byte_burst or byte_rate) if byte_rate else None
+        # Vrai tant que le client dépasse: il n'est prévenu qu'une fois par épisode
+        self.throttled = False
+
+    def check(self, size):
+        """Renvoie None si le message passe, sinon (limite dépassée, attente en secondes)
+
+        Un message refusé ne consomme pas de jetons dans l'autre seau.
+        """
+        if self.messages:
+            self.messages.refill()
+            if self.messages.tokens < 1:
+                return MESSAGES, self.messages.consume(1)
+        if self.bytes:
+            wait = self.bytes.consume(size)
+            if wait:
+                return BYTES, wait
+        if self.messages:
+            self.messages.consume(1)
+        return None
+
+
+class ConnectionLimiter:
+    """Nombre maximal de connexions simultanées (0 = illimité)"""
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.semaphore = threading.BoundedSemaphore(limit) if limit else None
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Réserve une place sans attendre; False si le serveur est plein"""
+        if self.semaphore and not self.semaphore.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.active += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+        if self.semaphore:
+            self.semaphore.release()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Verrous instrumentés: ordre d'acquisition, interblocages et contention
+
+deadlock.py montre l'interblocage classique: thread1 prend lock1 puis lock2,
+thread2 prend lock2 puis lock1, et tout se fige sans un mot. Lock() et
+RLock() s'utilisent comme threading.Lock/RLock, et en plus:
+
+- ils notent l'ordre d'acquisition dans un graphe global (verrou détenu →
+  verrou pris): dès qu'une nouvelle arête ferme un cycle, l'interblocage
+  *possible* est signalé avec la pile de chaque ordre incompatible, avant
+  même que les threads ne se croisent au mauvais moment;
+- ils attendent par tranches de `check_interval` secondes: à chaque
+  échéance, le graphe d'attente (thread → verrou attendu → thread qui le
+  détient) est parcouru, et un interblocage *réel* est signalé avec la
+  pile de chaque thread bloqué;
+- ils mesurent l'attente et la durée de détention de chaque verrou
+  (profile(), et les histogrammes de metrics.py si on leur en donne).
+
+Avec sample_every=N, une acquisition sur N seulement est chronométrée et
+entre dans le graphe d'ordre: les autres coûtent un acquire non bloquant et
+deux affectations, assez peu pour rester activé en production. Une
+acquisition qui doit attendre passe toujours par la détection
+d'interblocage: ce coût-là n'est payé que quand on attend déjà.
+"""
+
+import itertools
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+
+# Types de rapport
+POTENTIAL = 'potential'
+DEADLOCK = 'deadlock'
+
+STACK_DEPTH = 12
+
+
+class DeadlockError(RuntimeError):
+    """Levée dans un thread interbloqué quand le moniteur casse les interblocages"""
+
+
+class Report:
+    """Interblocage possible (cycle dans l'ordre d'acquisition) ou réel (cycle d'attente)"""
+
+    def __init__(self, kind, cycle, stacks):
+        self.kind = kind
+        # Étapes du cycle, dans l'ordre
+        self.cycle = cycle
+        # [(légende, pile formatée)]
+        self.stacks = stacks
+
+    def format(self):
+        if self.kind == POTENTIAL:
+            title = "⚠️ Ordre d'acquisition incohérent, interblocage possible: " + " → ".join(self.cycle)
+        else:
+            title = "💀 Interblocage: " + ", ".join(self.cycle)
+        lines = [f"[VERROUS] {title}"]
+        for label, stack in self.stacks:
+            lines.append(f"  {label}:")
+            lines.append(stack.rstrip("\n"))
+        return "\n".join(lines)
+
+
+def print_report(report):
+    print(report.format(), file=sys.stderr, flush=True)
+
+
+def format_stack(frame):
+    """Pile à partir de `frame`, sans les cadres internes des verrous"""
+    while frame.f_code in _INTERNAL_CODES and frame.f_back is not None:
+        frame = frame.f_back
+    return "".join(traceback.format_stack(frame, STACK_DEPTH))
+
+
+class LockStats:
+    """Compteurs d'un verrou, modifiés seulement par le thread qui le détient"""
+
+    __slots__ = ('acquisitions', 'contended', 'samples', 'wait_total', 'wait_max',
+                 'hold_total', 'hold_max')
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        # Acquisitions chronométrées (une sur sample_every)
+        self.samples = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+
+class LockMonitor:
+    """Graphe d'ordre d'acquisition et graphe d'attente, communs à tous les verrous"""
+
+    def __init__(self, check_interval=1.0, break_deadlocks=False):
+        # Tranche d'attente entre deux recherches d'interblocage (secondes)
+        self.check_interval = check_interval
+        # Lever DeadlockError dans le thread qui découvre l'interblocage
+        self.break_deadlocks = break_deadlocks
+        self.lock = threading.Lock()
+        # {verrou détenu: {verrou pris ensuite: (thread, pile de la première fois)}}
+        self.edges = {}
+        # Verrous détenus (acquisitions chronométrées) {thread: [verrous]}
+        self.held = {}
+        # {thread: verrou attendu}
+        self.waiting = {}
+        # Interblocages réels en cours {thread: cycle}, signalés une fois par épisode
+        self.deadlocked = {}
+        self.reported = set()
+        self.reports = deque(maxlen=100)
+        self.counts = {POTENTIAL: 0, DEADLOCK: 0}
+        self.listeners = [print_report]
+        self.locks = weakref.WeakSet()
+
+    def register(self, lock):
+        with self.lock:
+            self.locks.add(lock)
+
+    def report(self, report):
+        with self.lock:
+            self.reports.append(report)
+            self.counts[report.kind] += 1
+        for listener in self.listeners:
+            listener(report)
+
+    # Ordre d'acquisition
+
+    def acquired(self, lock, ident, frame):
+        """Le thread `ident` vient de prendre `lock` (acquisition chronométrée)"""
+        reports = []
+        with self.lock:
+            held = self.held.setdefault(ident, [])
+            stack = None
+            for previous in held:
+                successors = self.edges.setdefault(previous, {})
+                if previous is lock or lock in successors:
+                    continue
+                if stack is None:
+                    stack = format_stack(frame)
+                successors[lock] = (threading.current_thread().name, stack)
+                path = self.path(lock, previous)
+                if path:
+                    reports.append(self.potential([previous] + path))
+            held.append(lock)
+
+        for report in reports:
+            if report:
+                self.report(report)
+
+    def released(self, lock, ident):
+        with self.lock:
+            held = self.held.get(ident)
+            if held and lock in held:
+                # Retirer la dernière occurrence (les verrous ne sont pas toujours rendus dans l'ordre)
+                del held[len(held) - 1 - held[::-1].index(lock)]
+                if not held:
+                    del self.held[ident]
+
+    def path(self, start, goal):
+        """Chemin start → ... → goal dans le graphe d'ordre, ou None"""
+        stack = [(start, [start])]
+        seen = {start}
+        while stack:
+            node, path = stack.pop()
+            if node is goal:
+                return path
+            for successor in self.edges.get(node, ()):
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append((successor, path + [successor]))
+        return None
+
+    def potential(self, cycle):
+        """Rapport pour le cycle [a, b, ..., a] (None s'il a déjà été signalé)"""
+        key = frozenset(zip(cycle, cycle[1:]))
+        if key in self.reported:
+            return None
+        self.reported.add(key)
+        stacks = []
+        for before, after in zip(cycle, cycle[1:]):
+            thread, stack = self.edges[before][after]
+            stacks.append((f"{after.name} pris en détenant {before.name} ({thread})", stack))
+        return Report(POTENTIAL, [lock.name for lock in cycle], stacks)
+
+    # Attente
+
+    def wait(self, lock, ident, timeout=-1):
+        """Attend `lock` par tranches, en cherchant un interblocage à chaque échéance
+
+        Une attente bornée (timeout) ne peut pas s'interbloquer: elle n'entre
+        pas dans le graphe d'attente.
+        """
+        if timeout is not None and timeout >= 0:
+            return lock._lock.acquire(True, timeout)
+        self.waiting[ident] = lock
+        try:
+            while True:
+                if lock._lock.acquire(True, self.check_interval):
+                    return True
+                report = self.deadlock(ident)
+                if report:
+                    self.report(report)
+                    if self.break_deadlocks:
+                        raise DeadlockError(report.format())
+        finally:
+            del self.waiting[ident]
+            key = self.deadlocked.pop(ident, None)
+            if key:
+                with self.lock:
+                    self.reported.discard(key)
+
+    def deadlock(self, ident):
+        """Rapport si `ident` attend au bout d'un cycle d'attente qui revient à lui"""
+        chain = []
+        thread = ident
+        with self.lock:
+            while True:
+                lock = self.waiting.get(thread)
+                owner = lock._owner if lock else None
+                if owner is None:
+                    return None
+                chain.append((thread, lock, owner))
+                if owner == ident:
+                    break
+                if any(owner == step[0] for step in chain):
+                    # Cycle qui ne passe pas par nous: ses threads le signaleront
+                    return None
+                thread = owner
+            key = frozenset((step[0], step[1]) for step in chain)
+            if key in self.reported:
+                return None
+            self.reported.add(key)
+            for step in chain:
+                self.deadlocked[step[0]] = key
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        cycle = [f"{names.get(thread, thread)} attend {lock.name} (détenu par {names.get(owner, owner)})"
+                 for thread, lock, owner in chain]
+        stacks = [(names.get(thread, str(thread)), format_stack(frames[thread]))
+                  for thread, _, _ in chain if thread in frames]
+        return Report(DEADLOCK, cycle, stacks)
+
+    # Profil de contention
+
+    def profile(self):
+        """Une ligne par verrou: acquisitions, contention, attente et détention (secondes)"""
+        with self.lock:
+            locks = list(self.locks)
+        rows = []
+        for lock in locks:
+            stats = lock.stats
+            samples = stats.samples
+            rows.append({
+                'name': lock.name,
+                'acquisitions': stats.acquisitions,
+                'contended': stats.contended,
+                'contention': stats.contended / stats.acquisitions if stats.acquisitions else 0.0,
+                'samples': samples,
+                'wait_mean': stats.wait_total / samples if samples else 0.0,
+                'wait_max': stats.wait_max,
+                'hold_mean': stats.hold_total / samples if samples else 0.0,
+                'hold_max': stats.hold_max,
+            })
+        return sorted(rows, key=lambda row: row['wait_mean'] * row['acquisitions'], reverse=True)
+
+    def format_profile(self):
+        lines = [f"{'verrou':<20} {'acquis.':>9} {'contention':>10} {'attente moy.':>13} {'max':>10} "
+                 f"{'détention moy.':>15} {'max':>10}"]
+        for row in self.profile():
+            lines.append(f"{row['name']:<20} {row['acquisitions']:>9} {row['contention']:>9.1%} "
+                         f"{row['wait_mean'] * 1e6:>10.1f} µs {row['wait_max'] * 1e6:>7.0f} µs "
+                         f"{row['hold_mean'] * 1e6:>12.1f} µs {row['hold_max'] * 1e6:>7.0f} µs")
+        return "\n".join(lines)
+
+
+MONITOR = LockMonitor()
+
+
+class InstrumentedLock:
+    """Verrou (réentrant ou non) suivi par un LockMonitor"""
+
+    _numbers = itertools.count(1)
+
+    def __init__(self, name=None, reentrant=False, sample_every=1,
+                 wait_histogram=None, hold_histogram=None, monitor=None):
+        self.reentrant = reentrant
+        self.name = name or f"{'rlock' if reentrant else 'lock'}-{next(self._numbers)}"
+        self.sample_every = max(1, sample_every)
+        # Histogrammes optionnels (metrics.Histogram) alimentés par les mesures
+        self.wait_histogram = wait_histogram
+        self.hold_histogram = hold_histogram
+        self.monitor = monitor or MONITOR
+        self.stats = LockStats()
+        self._lock = threading.Lock()
+        self._owner = None
+        self._count = 0
+        # Début de la détention, None si l'acquisition n'est pas chronométrée
+        self._acquired_at = None
+        self._ticks = 0
+        self.monitor.register(self)
+
+    def acquire(self, blocking=True, timeout=-1):
+        me = threading.get_ident()
+        if self.reentrant and self._owner == me:
+            self._count += 1
+            return True
+
+        # Compteur sans verrou: un échantillonnage approximatif suffit
+        self._ticks += 1
+        sampled = self._ticks % self.sample_every == 0
+        start = time.perf_counter() if sampled else 0.0
+
+        contended = False
+        if not self._lock.acquire(False):
+            if not blocking or not self.monitor.wait(self, me, timeout):
+                return False
+            contended = True
+
+        # Désormais détenu: les statistiques ne sont modifiées que par le détenteur
+        self._owner = me
+        self._count = 1
+        stats = self.stats
+        stats.acquisitions += 1
+        if contended:
+            stats.contended += 1
+        if not sampled:
+            self._acquired_at = None
+            return True
+
+        self._acquired_at = now = time.perf_counter()
+        waited = now - start
+        stats.samples += 1
+        stats.wait_total += waited
+        if waited > stats.wait_max:
+            stats.wait_max = waited
+        self.monitor.acquired(self, me, sys._getframe(1))
+        if self.wait_histogram:
+            self.wait_histogram.observe(waited)
+        return True
+
+    def release(self):
+        if self.reentrant:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("cannot release un-acquired lock")
+            self._count -= 1
+            if self._count:
+                return
+        elif not self._lock.locked():
+            raise RuntimeError("release unlocked lock")
+
+        owner = self._owner
+        acquired_at = self._acquired_at
+        if acquired_at is not None:
+            held = time.perf_counter() - acquired_at
+            stats = self.stats
+            stats.hold_total += held
+            if held > stats.hold_max:
+                stats.hold_max = held
+        self._owner = None
+        self._acquired_at = None
+        self._count = 0
+        self._lock.release()
+
+        if acquired_at is not None:
+            self.monitor.released(self, owner)
+            if self.hold_histogram:
+                self.hold_histogram.observe(held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    # Interface attendue par threading.Condition
+
+    def _is_owned(self):
+        return self._owner == threading.get_ident()
+
+    def _release_save(self):
+        count = self._count
+        self._count = 1
+        self.release()
+        return count
+
+    def _acquire_restore(self, count):
+        self.acquire()
+        self._count = count
+
+    def __repr__(self):
+        state = f"détenu par {self._owner}" if self._owner else "libre"
+        return f"<{type(self).__name__} {self.name} {state}>"
+
+
+# Cadres sautés dans les piles des rapports
+_INTERNAL_CODES = {InstrumentedLock.acquire.__code__, InstrumentedLock._acquire_restore.__code__,
+                   LockMonitor.wait.__code__, LockMonitor.deadlock.__code__, format_stack.__code__}
+
+
+def Lock(name=None, **options):
+    """Remplace threading.Lock()"""
+    return InstrumentedLock(name, reentrant=False, **options)
+
+
+def RLock(name=None, **options):
+    """Remplace threading.RLock()"""
+    return InstrumentedLock(name, reentrant=True, **options)
+
+
+if __name__ == "__main__":
+    # Le scénario de deadlock.py, avec des verrous instrumentés
+    MONITOR.check_interval = 0.5
+    MONITOR.break_deadlocks = True
+    lock1 = Lock('lock1')
+    lock2 = Lock('lock2')
+    ready = threading.Barrier(2)
+
+    def take(first, second):
+        with first:
+            ready.wait()
+            try:
+                with second:
+                    pass
+            except DeadlockError:
+                print(f"{threading.current_thread().name}: interblocage cassé, {first.name} rendu")
+
+    # Une première passe sans concurrence: l'ordre incohérent est déjà signalé
+    for first, second in ((lock1, lock2), (lock2, lock1)):
+        with first:
+            with second:
+                pass
+
+    threads = [threading.Thread(target=take, args=pair, name=f"Thread {number}")
+               for number, pair in enumerate(((lock1, lock2), (lock2, lock1)), 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(MONITOR.format_profile())
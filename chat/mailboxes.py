@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Boîtes aux lettres des clients hors ligne
+
+Un message privé pour un client absent est gardé dans sa boîte jusqu'à
+sa prochaine connexion (ou jusqu'à expiration, `ttl` secondes). Les
+boîtes vivent en mémoire tant qu'elles sont petites; au-delà de
+`spill_threshold` messages, ou quand la mémoire totale dépasse
+`memory_budget` octets, leur contenu part sur disque (un fichier
+append-only par destinataire, une ligne JSON par message). Sans
+répertoire, les nouveaux messages sont refusés au-delà du budget: la
+mémoire reste bornée quel que soit le nombre de destinataires.
+
+Le verrou ne protège que la comptabilité en mémoire. Les fichiers sont
+écrits, relus et réécrits par un thread dédié, dans l'ordre des dépôts
+(comme l'écriture du journal dans history.py): un /to vers un absent ne
+touche jamais le disque, et la boucle asyncio n'attend pas une lecture.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+MAIL_TTL = 24 * 3600
+MAILBOX_SIZE = 100
+SPILL_THRESHOLD = 16
+MEMORY_BUDGET = 4 << 20
+MAX_MAILBOXES = 10000
+
+# Raisons de refus
+FULL = 'full'            # la boîte du destinataire est pleine
+NO_ROOM = 'no_room'      # plus de place sur le serveur (mémoire ou nombre de boîtes)
+
+
+class Mail(namedtuple('Mail', 'id sent expires sender text')):
+    """Message en attente (sender vaut None pour un avis du serveur: accusé, expiration)"""
+
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return len(self.text) + len(self.sender or '') + 64
+
+
+class Mailbox:
+    """Boîte d'un destinataire: messages en mémoire + compte de ceux sur disque"""
+
+    __slots__ = ('memory', 'on_disk', 'disk_expires')
+
+    def __init__(self):
+        self.memory = deque()
+        self.on_disk = 0
+        # Plus proche expiration parmi les messages sur disque
+        self.disk_expires = None
+
+    def __len__(self):
+        return len(self.memory) + self.on_disk
+
+
+class MailboxStore:
+    """Ensemble des boîtes aux lettres, borné en mémoire"""
+
+    def __init__(self, directory=None, ttl=MAIL_TTL, size=MAILBOX_SIZE,
+                 spill_threshold=SPILL_THRESHOLD, memory_budget=MEMORY_BUDGET,
+                 max_mailboxes=MAX_MAILBOXES, dispatch=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.size = size
+        self.spill_threshold = spill_threshold
+        self.memory_budget = memory_budget
+        self.max_mailboxes = max_mailboxes
+        self.lock = threading.Lock()
+        self.boxes = {}
+        self.memory = 0
+        self.next_id = 1
+        # Exécute les rappels du thread disque (par défaut: dans ce thread)
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self.jobs = queue.SimpleQueue()
+        self.disk_thread = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # Les boîtes déjà sur disque (redémarrage) sont indexées, pas chargées
+            for name in os.listdir(directory):
+                if name.endswith('.mbox'):
+                    self._index(os.path.join(directory, name))
+            self.disk_thread = threading.Thread(target=self.disk_loop, daemon=True)
+            self.disk_thread.start()
+
+    def path(self, recipient):
+        digest = hashlib.sha1(recipient.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.mbox")
+
+    def _index(self, path):
+        mails = self._read(path)
+        if not mails:
+            os.remove(path)
+            return
+        recipient = mails[0][0]
+        box = self.boxes.setdefault(recipient, Mailbox())
+        box.on_disk = len(mails)
+        box.disk_expires = min(mail.expires for _, mail in mails)
+        self.next_id = max(self.next_id, max(mail.id for _, mail in mails) + 1)
+
+    @staticmethod
+    def _read(path):
+        """[(destinataire, Mail)] d'un fichier de boîte"""
+        mails = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        recipient, *fields = json.loads(line)
+                    except ValueError:
+                        continue  # ligne tronquée par un arrêt brutal
+                    mails.append((recipient, Mail(*fields)))
+        except FileNotFoundError:
+            pass
+        return mails
+
+    def put(self, recipient, sender, text, now=None):
+        """Dépose un message; renvoie (Mail, None) ou (None, raison du refus)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            box = self.boxes.get(recipient)
+            if box is None:
+                if len(self.boxes) >= self.max_mailboxes:
+                    return None, NO_ROOM
+                box = Mailbox()
+            if len(box) >= self.size:
+                return None, FULL
+
+            mail = Mail(self.next_id, now, now + self.ttl, sender, text)
+            if self.memory + mail.size > self.memory_budget and not self.directory:
+                return None, NO_ROOM
+            self.next_id += 1
+            self.boxes[recipient] = box
+            box.memory.append(mail)
+            self.memory += mail.size
+
+            if self.directory:
+                if len(box.memory) > self.spill_threshold:
+                    self._spill(recipient, box)
+                if self.memory > self.memory_budget:
+                    self._spill_until(self.memory_budget // 2)
+        return mail, None
+
+    def _spill(self, recipient, box):
+        """Confie au thread disque les messages en mémoire d'une boîte (sous self.lock)"""
+        mails = list(box.memory)
+        self.jobs.put((self._append, recipient, mails))
+        expires = min(mail.expires for mail in mails)
+        box.disk_expires = expires if box.disk_expires is None else min(box.disk_expires, expires)
+        box.on_disk += len(mails)
+        self.memory -= sum(mail.size for mail in mails)
+        box.memory.clear()
+
+    def _spill_until(self, target):
+        """Vide les boîtes les plus anciennes sur disque jusqu'à repasser sous `target` octets"""
+        for recipient, box in list(self.boxes.items()):
+            if self.memory <= target:
+                break
+            if box.memory:
+                self._spill(recipient, box)
+
+    def take(self, recipient, deliver, now=None):
+        """Retire tous les messages encore valides d'un destinataire et les passe à deliver(mails),
+        du plus ancien au plus récent
+
+        deliver est appelé tout de suite si la boîte n'a rien sur disque, sinon via
+        dispatch une fois le fichier relu par le thread disque.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            box = self.boxes.pop(recipient, None)
+            mails = list(box.memory) if box else []
+            self.memory -= sum(mail.size for mail in mails)
+            if box and box.on_disk:
+                # Passe après les écritures déjà en file pour ce destinataire
+                self.jobs.put((self._take, recipient, mails, deliver, now))
+                return
+        deliver([mail for mail in mails if mail.expires > now])
+
+    def pending(self, recipient):
+        with self.lock:
+            box = self.boxes.get(recipient)
+            return len(box) if box else 0
+
+    def purge(self, report, now=None):
+        """Retire les messages expirés et appelle report(destinataire, Mail) pour chacun
+
+        Ceux du disque sont signalés via dispatch, après réécriture du fichier.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            for recipient, box in list(self.boxes.items()):
+                while box.memory and box.memory[0].expires <= now:
+                    mail = box.memory.popleft()
+                    self.memory -= mail.size
+                    expired.append((recipient, mail))
+                if box.on_disk and box.disk_expires <= now:
+                    # Jusqu'à la réécriture, une purge suivante ne relance pas la même
+                    box.disk_expires = float('inf')
+                    self.jobs.put((self._purge_disk, recipient, box, report, now))
+                if not len(box):
+                    del self.boxes[recipient]
+        for recipient, mail in expired:
+            report(recipient, mail)
+
+    # Thread disque: seul à ouvrir les fichiers des boîtes, dans l'ordre des tâches
+
+    def disk_loop(self):
+        while True:
+            func, *args = self.jobs.get()
+            if func is None:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[ERREUR] Boîtes aux lettres: {e}")
+
+    def _append(self, recipient, mails):
+        lines = ''.join(json.dumps([recipient, *mail], ensure_ascii=False) + '\n' for mail in mails)
+        with open(self.path(recipient), 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def _take(self, recipient, mails, deliver, now):
+        path = self.path(recipient)
+        mails = [mail for _, mail in self._read(path)] + mails
+        if os.path.exists(path):
+            os.remove(path)
+        self.dispatch(deliver, [mail for mail in mails if mail.expires > now])
+
+    def _purge_disk(self, recipient, box, report, now):
+        """Réécrit le fichier d'une boîte sans ses messages expirés"""
+        path = self.path(recipient)
+        mails = [mail for _, mail in self._read(path)]
+        kept = [mail for mail in mails if mail.expires > now]
+        if kept:
+            temporary = path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(''.join(json.dumps([recipient, *mail], ensure_ascii=False) + '\n' for mail in kept))
+            os.replace(temporary, path)
+        elif mails:
+            os.remove(path)
+        expired = [mail for mail in mails if mail.expires <= now]
+
+        with self.lock:
+            # Boîte retirée entre-temps (take): sa lecture, en file après nous, voit le fichier réécrit
+            if self.boxes.get(recipient) is box:
+                box.on_disk -= len(expired)
+                if kept:
+                    box.disk_expires = min(mail.expires for mail in kept)
+                elif box.on_disk:
+                    # Seulement des écritures en file depuis: revérifiées à la prochaine purge
+                    box.disk_expires = now
+                else:
+                    box.disk_expires = None
+                    if not box.memory:
+                        del self.boxes[recipient]
+        for mail in expired:
+            self.dispatch(report, recipient, mail)
+
+    def flush(self):
+        """Attend que les tâches disque déjà en file soient faites"""
+        if self.disk_thread:
+            done = threading.Event()
+            self.jobs.put((done.set,))
+            done.wait()
+
+    def close(self):
+        """Termine les tâches disque en file puis arrête le thread"""
+        if self.disk_thread:
+            self.jobs.put((None,))
+            self.disk_thread.join()
+            self.disk_thread = None
+
+    def entries(self):
+        """[(destinataire, Mail)] gardés en mémoire (relais à chaud: le disque reste en place)"""
+        with self.lock:
+            return [(recipient, mail) for recipient, box in self.boxes.items() for mail in box.memory]
+
+    def restore(self, entries):
+        """Recharge des messages en mémoire (transmis par un autre processus)"""
+        with self.lock:
+            for recipient, mail in entries:
+                self.boxes.setdefault(recipient, Mailbox()).memory.append(mail)
+                self.memory += mail.size
+                self.next_id = max(self.next_id, mail.id + 1)
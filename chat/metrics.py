@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Métriques d'exécution du serveur de chat
+
+Compteurs, jauges et histogrammes à seaux fixes, assez légers pour rester
+activés en production (un verrou et quelques additions par mesure). Ils
+sont lisibles par la commande /stats et, au format texte de Prometheus,
+par un petit serveur HTTP local (/metrics).
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import locks
+
+# Seaux des histogrammes de durée (secondes)
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    """Compteur monotone, éventuellement décliné par une étiquette"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, value=None):
+        with self.lock:
+            self.values[value] = self.values.get(value, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items(), key=lambda item: str(item[0]))
+        for value, count in items:
+            labels = {self.label: value} if self.label else {}
+            yield self.name, labels, count
+
+
+class Gauge:
+    """Valeur instantanée lue au moment de l'export"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self):
+        yield self.name, {}, self.read()
+
+
+class Histogram:
+    """Histogramme cumulatif à seaux fixes (comme ceux de Prometheus)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimation d'un quantile par interpolation dans les seaux"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, value_sum = self.count, self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f"{self.name}_bucket", {'le': repr(bound)}, cumulative
+        yield f"{self.name}_bucket", {'le': '+Inf'}, total
+        yield f"{self.name}_sum", {}, value_sum
+        yield f"{self.name}_count", {}, total
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """Ensemble des métriques exportées"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, label=None):
+        return self.register(Counter(name, help, label))
+
+    def gauge(self, name, help, read):
+        return self.register(Gauge(name, help, read))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def render_prometheus(self):
+        """Export au format texte de Prometheus"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    rendered = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{rendered}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class ChatMetrics:
+    """Métriques du serveur de chat"""
+
+    def __init__(self):
+        self.started = time.time()
+        registry = self.registry = Registry()
+        self.messages_in = registry.counter(
+            'chat_messages_in_total', "Messages reçus des clients, par commande", 'command')
+        self.messages_out = registry.counter(
+            'chat_messages_out_total', "Messages déposés dans les files de sortie, par route", 'route')
+        self.frames_sent = registry.counter(
+            'chat_frames_sent_total', "Trames écrites sur les sockets")
+        self.bytes_sent = registry.counter(
+            'chat_bytes_sent_total', "Octets écrits sur les sockets")
+        self.slow_consumers = registry.counter(
+            'chat_slow_consumers_total', "Clients retirés pour file pleine ou connexion perdue")
+        self.throttled = registry.counter(
+            'chat_throttled_messages_total', "Messages ignorés par la limite de débit", 'limit')
+        self.rejected = registry.counter(
+            'chat_rejected_connections_total', "Connexions refusées à l'admission", 'reason')
+        self.reaped = registry.counter(
+            'chat_reaped_connections_total', "Connexions fermées faute de poignée de main ou d'activité", 'reason')
+        self.ping_rtt_seconds = registry.histogram(
+            'chat_ping_rtt_seconds', "Aller-retour PING/PONG")
+        self.fanout_seconds = registry.histogram(
+            'chat_fanout_seconds', "Durée d'une diffusion (dépôt dans toutes les files)")
+        self.lock_wait_seconds = registry.histogram(
+            'chat_clients_lock_wait_seconds', "Attente pour obtenir clients_lock")
+        self.lock_hold_seconds = registry.histogram(
+            'chat_clients_lock_hold_seconds', "Durée de détention de clients_lock")
+        self.command_wait_seconds = registry.histogram(
+            'chat_command_wait_seconds', "Attente d'une commande lourde dans la file du pool")
+        self.command_seconds = registry.histogram(
+            'chat_command_seconds', "Durée d'exécution d'une commande lourde")
+        self.commands_rejected = registry.counter(
+            'chat_commands_rejected_total', "Commandes lourdes refusées, file du pool pleine", 'command')
+        self.lock_reports = registry.counter(
+            'chat_lock_reports_total', "Interblocages possibles (ordre) ou réels signalés par locks.py", 'kind')
+
+    def count_lock_report(self, report):
+        """Écouteur de locks.MONITOR, branché par le serveur le temps de son exécution"""
+        self.lock_reports.inc(value=report.kind)
+
+    def timed_lock(self, name='clients_lock', sample_every=1):
+        """Verrou instrumenté (locks.py) qui alimente les histogrammes d'attente et de détention"""
+        lock = locks.Lock(name, sample_every=sample_every,
+                          wait_histogram=self.lock_wait_seconds, hold_histogram=self.lock_hold_seconds)
+        self.registry.gauge(f'chat_{name}_acquisitions', f"Acquisitions de {name}",
+                            lambda: lock.stats.acquisitions)
+        self.registry.gauge(f'chat_{name}_contended', f"Acquisitions de {name} qui ont dû attendre",
+                            lambda: lock.stats.contended)
+        return lock
+
+    def note_sent(self, frames, size):
+        """Appelé par les écrivains des connexions après chaque écriture"""
+        self.frames_sent.inc(frames)
+        self.bytes_sent.inc(size)
+
+
+def serve_metrics(registry, host='127.0.0.1', port=9100):
+    """Démarre un serveur HTTP local exposant /metrics (thread démon)"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # pas de trace pour chaque collecte
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Protocole filaire du chat: trames préfixées par leur longueur
+
+Chaque trame est un en-tête fixe suivi de sa charge utile:
+
+    +----------------+--------+-----------+----------------+
+    | longueur (u32) | type   | drapeaux  | charge utile   |
+    +----------------+--------+-----------+----------------+
+
+Un recv() peut contenir plusieurs trames, ou seulement un morceau d'une
+trame: FrameDecoder accumule les octets et ne rend que les trames complètes.
+
+Compression (négociée pendant la poignée de main): chaque sens d'une
+connexion a son propre flux deflate persistant, si bien que le dictionnaire
+profite des messages précédents. Seules les trames dépassant un seuil sont
+compressées; elles portent le drapeau COMPRESSED.
+"""
+
+import json
+import struct
+import zlib
+from collections import namedtuple
+
+PROTOCOL_VERSION = 1
+
+# longueur de la charge utile, type de trame, drapeaux
+HEADER = struct.Struct('!IBB')
+MAX_FRAME_SIZE = 1 << 20
+
+# Types de trames
+HELLO = 1     # serveur -> client : {"version": ...}
+JOIN = 2      # client -> serveur : {"version": ..., "name": ...}
+ACCEPT = 3    # serveur -> client : nom accepté
+REJECT = 4    # serveur -> client : {"reason": "NAME_TAKEN" | "VERSION" | "WRONG_SHARD" | ...}
+TEXT = 5      # texte UTF-8, dans les deux sens
+SHUTDOWN = 6  # serveur -> client : arrêt du serveur
+PING = 7      # dans les deux sens : charge utile libre, renvoyée telle quelle
+PONG = 8      # réponse à PING
+PEER = 9      # serveur -> serveur : {"op": ...} (fédération, voir federation.py)
+
+# Début de toute réponse à /list (une trame TEXT): les clients la reconnaissent
+# à ce préfixe exact, jamais présent en tête d'un message de chat (horodaté)
+LIST_HEADER = "\n👥 CLIENTS CONNECTÉS"
+
+# Drapeaux
+COMPRESSED = 0x01  # charge utile compressée dans le flux deflate de la connexion
+
+# Compression proposée dans HELLO et demandée dans JOIN
+COMPRESSION = 'zlib'
+COMPRESS_THRESHOLD = 64
+# Fin de bloc produite par Z_SYNC_FLUSH: retirée à l'envoi, remise à la réception
+SYNC_TRAILER = b'\x00\x00\xff\xff'
+# Fenêtre deflate: ce qu'il faut garder du texte décompressé pour reprendre
+# un flux entrant dans un autre processus (relais à chaud)
+WINDOW_SIZE = 1 << zlib.MAX_WBITS
+
+
+class ProtocolError(Exception):
+    """Trame invalide ou poignée de main non respectée"""
+
+
+class Frame(namedtuple('Frame', 'kind flags payload')):
+    """Trame décodée"""
+
+    __slots__ = ()
+
+    def text(self):
+        return self.payload.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.payload.decode('utf-8')) if self.payload else {}
+
+
+def encode_frame(kind, payload=b'', flags=0):
+    """Construit une trame complète (en-tête + charge utile)"""
+    return HEADER.pack(len(payload), kind, flags) + payload
+
+
+def encode_text(text):
+    return encode_frame(TEXT, text.encode('utf-8'))
+
+
+def encode_json(kind, obj):
+    return encode_frame(kind, json.dumps(obj).encode('utf-8'))
+
+
+def send_frame(sock, kind, payload=b'', flags=0):
+    """Envoie une trame en entier (sendall gère les écritures partielles)"""
+    sock.sendall(encode_frame(kind, payload, flags))
+
+
+def send_text(sock, text):
+    sock.sendall(encode_text(text))
+
+
+def send_json(sock, kind, obj):
+    sock.sendall(encode_json(kind, obj))
+
+
+class Deflater:
+    """Compresse les trames sortantes d'une connexion dans un flux persistant
+
+    Chaque trame compressée se termine par un Z_SYNC_FLUSH: le récepteur
+    peut la décoder immédiatement, sans attendre la suite du flux.
+    """
+
+    def __init__(self, threshold=COMPRESS_THRESHOLD, level=6):
+        self.threshold = threshold
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def frame(self, frame):
+        """Compresse une trame encodée si sa charge utile atteint le seuil"""
+        length, kind, flags = HEADER.unpack_from(frame)
+        if length < self.threshold or flags & COMPRESSED:
+            return frame
+
+        payload = memoryview(frame)[HEADER.size:]
+        compressed = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        # Une fois passée dans le flux, la trame doit être envoyée compressée,
+        # même si elle n'a pas rétréci: le récepteur doit garder le même dictionnaire
+        return encode_frame(kind, compressed[:-len(SYNC_TRAILER)], flags | COMPRESSED)
+
+
+class FrameDecoder:
+    """Tampon de réception incrémental
+
+    feed() ajoute les octets reçus et renvoie toutes les trames complètes
+    qu'ils contiennent. Le découpage se fait à travers un memoryview, sans
+    recopier le tampon pour chaque trame; les octets consommés ne sont
+    retirés qu'une fois par appel. Les trames marquées COMPRESSED sont
+    décompressées au passage, dans l'ordre du flux.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._inflater = None
+        # Derniers octets décompressés (au plus 2 fenêtres), voir export()
+        self._window = bytearray()
+
+    def feed(self, data):
+        """Ajoute des octets reçus et renvoie la liste des trames complètes"""
+        buffer = self._buffer
+        buffer += data
+        size = len(buffer)
+        offset = 0
+        frames = []
+
+        with memoryview(buffer) as view:
+            while size - offset >= HEADER.size:
+                length, kind, flags = HEADER.unpack_from(view, offset)
+                if length > self.max_frame_size:
+                    raise ProtocolError(f"trame trop grande ({length} octets)")
+
+                start = offset + HEADER.size
+                end = start + length
+                if end > size:
+                    break  # trame incomplète: attendre le prochain recv
+
+                payload = bytes(view[start:end])
+                if flags & COMPRESSED:
+                    payload = self.inflate(payload)
+                    flags &= ~COMPRESSED
+                frames.append(Frame(kind, flags, payload))
+                offset = end
+
+        if offset:
+            del buffer[:offset]
+        return frames
+
+    def inflate(self, payload):
+        """Décompresse une charge utile du flux deflate de la connexion"""
+        if self._inflater is None:
+            self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            data = self._inflater.decompress(payload + SYNC_TRAILER, self.max_frame_size + 1)
+        except zlib.error as e:
+            raise ProtocolError(f"trame compressée invalide: {e}")
+        if len(data) > self.max_frame_size or self._inflater.unconsumed_tail:
+            raise ProtocolError("trame décompressée trop grande")
+        window = self._window
+        window += data
+        if len(window) > 2 * WINDOW_SIZE:
+            del window[:-WINDOW_SIZE]
+        return data
+
+    def export(self):
+        """État à transmettre à un autre processus: (octets non décodés, fenêtre deflate ou None)"""
+        window = bytes(self._window[-WINDOW_SIZE:]) if self._inflater else None
+        return bytes(self._buffer), window
+
+    @classmethod
+    def restore(cls, buffered, window=None, max_frame_size=MAX_FRAME_SIZE):
+        """Recrée un décodeur à partir de export(): le flux deflate reprend où il en était"""
+        decoder = cls(max_frame_size)
+        decoder._buffer += buffered
+        if window is not None:
+            # En deflate brut, le dictionnaire initialise directement la fenêtre
+            decoder._inflater = (zlib.decompressobj(-zlib.MAX_WBITS, zdict=window) if window
+                                 else zlib.decompressobj(-zlib.MAX_WBITS))
+            decoder._window += window
+        return decoder
+
+    def pending(self):
+        """Nombre d'octets reçus mais pas encore décodés"""
+        return len(self._buffer)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Registre des clients en copie sur écriture
+
+Les lectures (diffusion, message privé, /list) sont bien plus fréquentes
+que les arrivées et départs. Le registre publie donc des instantanés
+immuables: un écrivain copie le dictionnaire, le modifie, puis remplace
+l'instantané d'une seule affectation (atomique en CPython). Un lecteur
+prend l'instantané courant et le parcourt sans verrou, sans jamais voir
+de modification en cours.
+"""
+
+import threading
+from types import MappingProxyType
+
+
+class Snapshot:
+    """État figé du registre: il ne change plus une fois publié"""
+
+    __slots__ = ('clients', 'version', '_sorted_names')
+
+    def __init__(self, clients, version):
+        self.clients = MappingProxyType(clients)
+        self.version = version
+        self._sorted_names = None
+
+    def sorted_names(self):
+        """Noms triés, calculés une seule fois par instantané"""
+        names = self._sorted_names
+        if names is None:
+            # Deux lecteurs peuvent le calculer en même temps: le résultat est identique
+            names = self._sorted_names = tuple(sorted(self.clients))
+        return names
+
+
+class ClientRegistry:
+    """Registre {nom: connexion}: lectures sans verrou, écritures sérialisées"""
+
+    def __init__(self):
+        self.snapshot = Snapshot({}, 0)
+        # Ne protège que les écrivains entre eux
+        self._write_lock = threading.Lock()
+
+    def _publish(self, clients):
+        self.snapshot = Snapshot(clients, self.snapshot.version + 1)
+
+    def add(self, name, client):
+        """Ajoute un client; False si le nom est déjà pris"""
+        with self._write_lock:
+            current = self.snapshot.clients
+            if name in current:
+                return False
+            clients = dict(current)
+            clients[name] = client
+            self._publish(clients)
+        return True
+
+    def remove(self, name, client=None):
+        """Retire un nom (seulement s'il désigne encore `client`, si donné)"""
+        with self._write_lock:
+            current = self.snapshot.clients
+            if name not in current or (client is not None and current[name] is not client):
+                return False
+            clients = dict(current)
+            del clients[name]
+            self._publish(clients)
+        return True
+
+    def clear(self):
+        """Vide le registre et renvoie les connexions qu'il contenait"""
+        with self._write_lock:
+            clients = list(self.snapshot.clients.values())
+            self._publish({})
+        return clients
+
+    # Lectures: toujours sur l'instantané courant, sans verrou
+
+    def get(self, name):
+        return self.snapshot.clients.get(name)
+
+    def items(self):
+        return self.snapshot.clients.items()
+
+    def values(self):
+        return self.snapshot.clients.values()
+
+    def __contains__(self, name):
+        return name in self.snapshot.clients
+
+    def __iter__(self):
+        return iter(self.snapshot.clients)
+
+    def __len__(self):
+        return len(self.snapshot.clients)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Affichage des messages reçus par images, avec un historique local borné
+
+Un print() par message, c'est une écriture (et un redessin du terminal) par
+ligne: dans un salon animé, le client prend du retard sur le serveur.
+TerminalRenderer accumule le texte reçu et l'écrit d'un seul bloc, suivi
+d'un seul flush, au plus une fois par image (`interval` secondes). Le premier
+message après un silence part tout de suite; seuls ceux qui le suivent de
+près attendent l'image suivante.
+
+Les lignes reçues sont gardées dans un historique (scrollback) d'au plus
+`scrollback` lignes: la mémoire reste constante pendant une longue session,
+et replay() réaffiche les dernières. Si plus de `max_pending` lignes arrivent
+pendant une image, seules les dernières sont écrites, précédées du nombre de
+lignes sautées (elles restent dans l'historique).
+"""
+
+import asyncio
+import sys
+from collections import deque
+
+FRAME_INTERVAL = 0.05
+SCROLLBACK_LINES = 5000
+MAX_PENDING_LINES = 500
+
+
+class TerminalRenderer:
+    """Tampon d'affichage vidé par une tâche asyncio (run), image par image"""
+
+    def __init__(self, stream=None, interval=FRAME_INTERVAL, scrollback=SCROLLBACK_LINES,
+                 max_pending=MAX_PENDING_LINES):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.max_pending = max_pending
+        self.scrollback = deque(maxlen=scrollback)
+        # Morceaux de texte pas encore écrits, et leur nombre de lignes
+        self.pending = []
+        self.pending_lines = 0
+        # Lignes sautées depuis la dernière image (annoncées en tête de la suivante)
+        self.dropped = 0
+        self.dirty = asyncio.Event()
+        # Compteurs, pour le banc: écritures faites et lignes sautées
+        self.writes = 0
+        self.skipped = 0
+
+    def write(self, text):
+        """Ajoute du texte à l'image en cours (ne bloque jamais)"""
+        if not text:
+            return
+        self.pending.append(text)
+        lines = text.count('\n')
+        self.pending_lines += lines
+        self.scrollback.extend(text.splitlines())
+        if self.pending_lines > 2 * self.max_pending:
+            # Salon trop rapide pour le terminal: ne pas laisser le tampon grossir
+            self.trim()
+        self.dirty.set()
+
+    def trim(self):
+        """Ne garde que les max_pending dernières lignes en attente"""
+        lines = ''.join(self.pending).splitlines(keepends=True)
+        skipped = len(lines) - self.max_pending
+        if skipped > 0:
+            self.dropped += skipped
+            self.skipped += skipped
+            self.pending = lines[skipped:]
+        self.pending_lines = min(self.pending_lines, self.max_pending)
+
+    def flush(self):
+        """Écrit tout ce qui est en attente, en une écriture"""
+        if self.pending_lines > self.max_pending:
+            self.trim()
+        if self.pending:
+            text = ''.join(self.pending)
+            if self.dropped:
+                text = f"\n[CLIENT] ⏩ {self.dropped} ligne(s) sautée(s) (/scroll pour les revoir)\n" + text
+                self.dropped = 0
+            self.pending.clear()
+            self.pending_lines = 0
+            self.stream.write(text)
+            self.stream.flush()
+            self.writes += 1
+        self.dirty.clear()
+
+    async def run(self):
+        """Vide le tampon à chaque image tant que la tâche n'est pas annulée"""
+        try:
+            while True:
+                await self.dirty.wait()
+                self.flush()
+                await asyncio.sleep(self.interval)
+        finally:
+            self.flush()
+
+    def replay(self, count):
+        """Réaffiche les `count` dernières lignes de l'historique"""
+        lines = list(self.scrollback)[-count:] if count > 0 else []
+        self.flush()
+        header = f"\n📜 {len(lines)} dernière(s) ligne(s) reçue(s):\n"
+        self.stream.write(header + ''.join(f"{line}\n" for line in lines))
+        self.stream.flush()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Recherche dans les messages récents: index inversé par segments
+
+/search répond à « qui a dit X ? » sans relire le journal: chaque message
+archivé (salons et messages à tous, jamais les messages privés) est découpé
+en mots, et chaque mot pointe vers la liste triée des messages qui le
+contiennent.
+
+- L'indexation est faite par un thread dédié, par lots, comme l'écriture du
+  journal dans history.py: record_message ne fait que déposer le message
+  dans une file, la diffusion n'attend jamais l'index. Un message devient
+  cherchable au plus INDEX_INTERVAL secondes après son envoi.
+- Les messages s'accumulent dans un segment actif; à SEGMENT_DOCS messages
+  il est scellé (plus jamais modifié). Quand MERGE_FACTOR segments du même
+  niveau se suivent, ils sont fusionnés en un segment du niveau suivant
+  (hors verrou, puis échangés): une recherche parcourt peu de segments.
+- Mémoire bornée: au-delà de max_messages, les segments les plus anciens
+  sont abandonnés (un segment fusionné ne dépasse pas max_messages / 4).
+- Une requête croise les listes du mot le plus rare vers les autres (par
+  dichotomie), du message le plus récent au plus ancien, et s'arrête dès
+  qu'elle a `limit` résultats; since: coupe par dichotomie sur les dates.
+
+Exemple:
+    /search threads pool from:alice since:2h
+"""
+
+import bisect
+import queue
+import re
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import islice
+
+SEARCH_SIZE = 1_000_000
+SEGMENT_DOCS = 4096
+MERGE_FACTOR = 8
+INDEX_INTERVAL = 0.05
+# Messages indexés au plus par prise du verrou (une recherche attend au plus un lot)
+INDEX_BATCH = 1024
+SEARCH_RESULTS = 20
+SEARCH_USAGE = "/search <mots> [from:<nom>] [since:<2h|HH:MM|AAAA-MM-JJ>]"
+
+WORD = re.compile(r"\w+")
+DURATION = re.compile(r"(\d+)([smhj])$")
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'j': 86400}
+
+
+def tokenize(text):
+    """Mots d'un texte, sans casse ni doublon"""
+    return set(WORD.findall(text.casefold()))
+
+
+class Query(namedtuple('Query', 'terms sender since')):
+    """Requête analysée: mots (tous requis), auteur et date de début (None = sans filtre)"""
+
+    __slots__ = ()
+
+
+def parse_since(text, now=None):
+    """'30m', '2h', '3j', 'HH:MM' (dernière occurrence) ou 'AAAA-MM-JJ' -> horodatage"""
+    now = now or datetime.now()
+    match = DURATION.match(text)
+    if match:
+        return now.timestamp() - int(match.group(1)) * UNITS[match.group(2)]
+    for layout in ('%H:%M', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(text, layout)
+        except ValueError:
+            continue
+        if layout == '%H:%M':
+            parsed = now.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+            if parsed > now:
+                parsed -= timedelta(days=1)
+        return parsed.timestamp()
+    raise ValueError(f"date inconnue: {text}")
+
+
+def parse_query(args, now=None):
+    """Analyse les arguments de /search; ValueError si la requête est vide ou invalide"""
+    words, sender, since = [], None, None
+    for token in args.split():
+        key, _, value = token.partition(':')
+        if key.lower() == 'from' and value:
+            sender = value.casefold()
+        elif key.lower() == 'since' and value:
+            since = parse_since(value, now)
+        else:
+            words.append(token)
+    terms = tokenize(' '.join(words))
+    if not terms and sender is None:
+        raise ValueError("aucun mot ni auteur à chercher")
+    return Query(terms, sender, since)
+
+
+def contains(docs, doc):
+    index = bisect.bisect_left(docs, doc)
+    return index < len(docs) and docs[index] == doc
+
+
+class Segment:
+    """Messages consécutifs et leurs listes de positions {mot: array}, {auteur: array}"""
+
+    __slots__ = ('level', 'entries', 'times', 'postings', 'senders')
+
+    def __init__(self, level=0):
+        self.level = level
+        self.entries = []
+        # Dates des messages, croissantes (since: par dichotomie)
+        self.times = array('d')
+        self.postings = {}
+        self.senders = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        doc = len(self.entries)
+        self.entries.append(entry)
+        self.times.append(entry.timestamp)
+        for term in tokenize(entry.text):
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = array('I')
+            docs.append(doc)
+        sender = (entry.sender or '').casefold()
+        docs = self.senders.get(sender)
+        if docs is None:
+            docs = self.senders[sender] = array('I')
+        docs.append(doc)
+
+    @classmethod
+    def merge(cls, segments):
+        """Segment du niveau suivant regroupant des segments consécutifs"""
+        merged = cls(max(segment.level for segment in segments) + 1)
+        for segment in segments:
+            offset = len(merged.entries)
+            merged.entries.extend(segment.entries)
+            merged.times.extend(segment.times)
+            for target, source in ((merged.postings, segment.postings), (merged.senders, segment.senders)):
+                for key, docs in source.items():
+                    if offset:
+                        docs = array('I', [doc + offset for doc in docs])
+                    existing = target.get(key)
+                    if existing is None:
+                        target[key] = array('I', docs)
+                    else:
+                        existing.extend(docs)
+        return merged
+
+    def search(self, query, visible=None):
+        """Messages correspondants, du plus récent au plus ancien"""
+        lists = []
+        for term in query.terms:
+            docs = self.postings.get(term)
+            if docs is None:
+                return
+            lists.append(docs)
+        if query.sender is not None:
+            docs = self.senders.get(query.sender)
+            if docs is None:
+                return
+            lists.append(docs)
+
+        first = bisect.bisect_left(self.times, query.since) if query.since else 0
+        if lists:
+            lists.sort(key=len)
+            candidates, others = reversed(lists[0]), lists[1:]
+        else:
+            candidates, others = range(len(self.entries) - 1, -1, -1), ()
+        for doc in candidates:
+            if doc < first:
+                break
+            if all(contains(docs, doc) for docs in others):
+                entry = self.entries[doc]
+                if visible is None or entry.room in visible:
+                    yield entry
+
+
+class SearchIndex:
+    """Index inversé des messages récents, tenu à jour par un thread dédié"""
+
+    def __init__(self, max_messages=SEARCH_SIZE, segment_docs=SEGMENT_DOCS,
+                 merge_factor=MERGE_FACTOR, flush_interval=INDEX_INTERVAL):
+        self.max_messages = max_messages
+        self.segment_docs = segment_docs
+        self.merge_factor = merge_factor
+        self.max_segment_docs = max(segment_docs, max_messages // 4)
+        self.flush_interval = flush_interval
+        # Protège le segment actif et la liste des segments scellés (du plus ancien au plus récent)
+        self.lock = threading.Lock()
+        self.active = Segment()
+        self.sealed = []
+        self.pending = queue.SimpleQueue()
+        # Compteurs, pour /stats et le banc
+        self.indexed = 0
+        self.merges = 0
+        self.evicted = 0
+        self.index_thread = threading.Thread(target=self.index_loop, daemon=True)
+        self.index_thread.start()
+
+    def __len__(self):
+        return len(self.active) + sum(len(segment) for segment in self.sealed)
+
+    def add(self, entry):
+        """Dépose un message à indexer (ne bloque jamais)"""
+        self.pending.put(entry)
+
+    def add_many(self, entries):
+        for entry in entries:
+            self.pending.put(entry)
+
+    def index_loop(self):
+        """Indexe les messages par lots, puis fusionne et abandonne des segments"""
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < INDEX_BATCH:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.pending.get(timeout=max(remaining, 0)))
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            entries = [entry for entry in batch if entry is not None]
+            if entries:
+                self.apply(entries)
+            if stop:
+                break
+
+    def apply(self, entries):
+        with self.lock:
+            for entry in entries:
+                self.active.add(entry)
+                if len(self.active) >= self.segment_docs:
+                    self.sealed.append(self.active)
+                    self.active = Segment()
+            self.indexed += len(entries)
+        self.compact()
+        self.evict()
+
+    def compact(self):
+        """Fusionne les MERGE_FACTOR derniers segments tant qu'ils sont du même niveau"""
+        # Seul ce thread modifie self.sealed: la fin de la liste ne bouge pas pendant la fusion
+        while True:
+            tail = self.sealed[-self.merge_factor:]
+            if len(tail) < self.merge_factor or len({segment.level for segment in tail}) != 1:
+                return
+            if sum(map(len, tail)) > self.max_segment_docs:
+                return
+            merged = Segment.merge(tail)
+            with self.lock:
+                self.sealed[-len(tail):] = [merged]
+            self.merges += 1
+
+    def evict(self):
+        """Abandonne les segments les plus anciens au-delà de max_messages"""
+        with self.lock:
+            while self.sealed and len(self) > self.max_messages:
+                self.evicted += len(self.sealed.pop(0))
+
+    def search(self, query, visible=None, limit=SEARCH_RESULTS):
+        """Au plus `limit` messages, du plus récent au plus ancien
+
+        visible: salons dont les messages peuvent être rendus (None: tous;
+        la clé None désigne les messages à tous).
+        """
+        with self.lock:
+            results = list(islice(self.active.search(query, visible), limit))
+            sealed = list(self.sealed)
+        for segment in reversed(sealed):
+            if len(results) >= limit:
+                break
+            results.extend(islice(segment.search(query, visible), limit - len(results)))
+        return results
+
+    def close(self):
+        """Indexe ce qui reste en file puis arrête le thread"""
+        self.pending.put(None)
+        self.index_thread.join()
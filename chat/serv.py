@@ -1,38 +1,222 @@
 #!/usr/bin/env python3
 """
 Serveur de chat multi-clients avec messagerie privée
-Utilise socket et threading pour gérer plusieurs connexions simultanées
+Utilise socket et threading pour gérer plusieurs connexions simultanées,
+ou une boucle d'événements asyncio unique (--backend asyncio)
 """
 
+import argparse
+import asyncio
+import bisect
+import os
+import select
+import signal
 import socket
+import sys
 import threading
 import json
+import hmac
+import ipaddress
+import time
+from collections import Counter
 from datetime import datetime
 
+import locks
+import protocol
+from commands import BULK, COMMAND_QUEUE, COMMAND_WORKERS, CONTROL, SYSTEM, CommandPool, CommandTable
+from heartbeat import HeartbeatMonitor
+from history import History, HistoryEntry
+from mailboxes import FULL, MAIL_TTL, MAILBOX_SIZE, MEMORY_BUDGET, Mail, MailboxStore
+from limits import ConnectionLimiter, RateLimiter, MESSAGES, SERVER_FULL
+from metrics import ChatMetrics, serve_metrics
+from registry import ClientRegistry
+from search import SEARCH_RESULTS, SEARCH_SIZE, SEARCH_USAGE, SearchIndex, parse_query
+from session import Session, SESSION_BUFFER
+from timing_wheel import TimingWheel
+from upgrade import (HotUpgrade, Link, TAKEOVER_OPTION, decode_bytes, encode_bytes,
+                     receive_state, send_state, spawn_successor)
+from connection import AsyncConnection, ClientConnection, Outbox, POLICIES, DROP_OLDEST
+
+RECV_SIZE = 65536
+DEFAULT_ROOM = 'general'
+# Noms par page de /list, et pages gardées en cache entre deux changements du registre
+LIST_PAGE_SIZE = 50
+LIST_CACHE_SIZE = 256
+# Intervalle de purge des messages expirés dans les boîtes aux lettres (secondes)
+MAILBOX_PURGE_INTERVAL = 60.0
+
+def format_duration(seconds):
+    """Durée lisible: 45s, 10 min, 24h, 7 j"""
+    if seconds < 60:
+        return f"{seconds:g}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    if seconds < 3 * 86400:
+        return f"{seconds / 3600:.0f}h"
+    return f"{seconds / 86400:.0f} j"
+
+
 class ChatServer:
-    def __init__(self, host='192.168.1.104', port=5555):
+    # Commandes connues de tous les serveurs; chaque instance en garde une copie (self.commands)
+    COMMANDS = CommandTable()
+    
+    def __init__(self, host='192.168.1.104', port=5555,
+                 queue_size=1024, slow_policy=DROP_OLDEST, block_timeout=1.0,
+                 coalesce_window=0.0, history_size=1000, history_dir=None, replay_count=0,
+                 admins=(), admin_token=None, metrics_port=0, compression=False,
+                 compress_threshold=protocol.COMPRESS_THRESHOLD,
+                 resume_timeout=30.0, session_buffer=SESSION_BUFFER,
+                 ping_interval=15.0, idle_timeout=45.0, handshake_timeout=10.0,
+                 backlog=128, max_connections=1024, message_rate=20.0, message_burst=40,
+                 byte_rate=65536, byte_burst=262144,
+                 mailbox_dir=None, mailbox_ttl=MAIL_TTL, mailbox_size=MAILBOX_SIZE,
+                 mailbox_memory=MEMORY_BUDGET, lock_sample=1, lock_check_interval=1.0,
+                 command_workers=COMMAND_WORKERS, command_queue=COMMAND_QUEUE,
+                 search_size=SEARCH_SIZE):
         self.host = host
         self.port = port
+        # File de sortie bornée de chaque client et politique en cas de débordement
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.block_timeout = block_timeout
+        # Fenêtre pendant laquelle un écrivain regroupe les trames en attente
+        self.coalesce_window = coalesce_window
+        # Compression proposée aux clients, et taille minimale d'une trame compressée
+        self.compression = compression
+        self.compress_threshold = compress_threshold
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # File d'attente des connexions non encore acceptées (listen)
+        self.backlog = backlog
+        
+        # Contrôle d'admission: plafond de connexions simultanées (0 = illimité)
+        self.connection_limiter = ConnectionLimiter(max_connections)
+        # Débit autorisé par client: messages et octets par seconde, avec rafale (0 = illimité)
+        self.message_rate = message_rate
+        self.message_burst = message_burst
+        self.byte_rate = byte_rate
+        self.byte_burst = byte_burst
+        
+        # Registre des clients connectés {nom: connexion}, lu sans verrou
+        self.clients = ClientRegistry()
+        # Pages de /list déjà encodées: (clé de la version du registre, {(préfixe, page): ...})
+        self.list_cache = (None, {})
+        # Métriques d'exécution (/stats et export Prometheus)
+        self.metrics = ChatMetrics()
+        self.metrics.registry.gauge('chat_connected_clients', "Clients connectés",
+                                    lambda: len(self.clients))
+        self.metrics.registry.gauge('chat_outbox_depth_max', "Plus longue file de sortie",
+                                    lambda: max(self.queue_depths().values(), default=0))
+        self.metrics.registry.gauge('chat_outbox_depth_total', "Trames en attente dans les files de sortie",
+                                    lambda: sum(self.queue_depths().values()))
+        # Clients autorisés à utiliser /stats, port HTTP local des métriques (0 = aucun).
+        # Un nom ne suffit pas: il faut aussi admin_token dans JOIN, ou, sans jeton
+        # configuré, une connexion depuis la machine locale (voir check_admin)
+        self.admins = set(admins)
+        self.admin_token = admin_token
+        self.verified_admins = set()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        
+        # Lock des index de salons et des sessions (le registre des clients n'en a pas besoin)
+        # Instrumenté (locks.py): attente et détention mesurées sur une acquisition sur
+        # lock_sample, interblocages recherchés toutes les lock_check_interval secondes d'attente
+        locks.MONITOR.check_interval = lock_check_interval
+        self.clients_lock = self.metrics.timed_lock('clients_lock', lock_sample)
+        
+        # Index des salons (protégés par clients_lock):
+        # {salon: set(noms)}, {nom: set(salons)} et {nom: salon actif}
+        self.rooms = {}
+        self.memberships = {}
+        self.active_rooms = {}
         
-        # Dictionnaire des clients connectés: {nom: socket}
-        self.clients = {}
-        # Lock pour synchroniser l'accès au dictionnaire clients
-        self.clients_lock = threading.Lock()
+        # Sessions reprenables {nom: Session} (protégées par clients_lock), gardées
+        # resume_timeout secondes après une coupure (0 = pas de reprise)
+        self.sessions = {}
+        self.resume_timeout = resume_timeout
+        self.session_buffer = session_buffer
+        
+        # Minuteurs (poignée de main, pings, inactivité, expiration des sessions)
+        # dans une roue de temporisation: O(1) pour armer ou annuler
+        self.wheel = TimingWheel()
+        self.heartbeat = HeartbeatMonitor(self.wheel, ping_interval, idle_timeout, handshake_timeout,
+                                          on_reap=self.reap_connection,
+                                          on_rtt=self.metrics.ping_rtt_seconds.observe)
+        
+        # Historique: tampons en mémoire + journal sur disque si history_dir est donné
+        self.history = History(history_size, history_dir)
+        # Nombre de messages rejoués à l'arrivée dans un salon (0 = aucun)
+        self.replay_count = replay_count
+        
+        # Index de recherche des messages archivés (/search), tenu par son propre thread;
+        # au plus search_size messages (0 = désactivé)
+        self.search_index = None
+        if search_size:
+            self.search_index = SearchIndex(search_size)
+            self.search_index.add_many(self.history.entries())
+            self.metrics.registry.gauge('chat_search_indexed_messages', "Messages dans l'index de recherche",
+                                        lambda: len(self.search_index))
+        
+        # Messages privés gardés pour les clients hors ligne (mailbox_size = 0: désactivé)
+        self.mailboxes = None
+        if mailbox_size:
+            # Les remises et avis qui suivent une lecture du disque passent par le pool
+            self.mailboxes = MailboxStore(mailbox_dir, mailbox_ttl, mailbox_size, memory_budget=mailbox_memory,
+                                          dispatch=lambda func, *args: self.command_pool.submit(SYSTEM, func, *args))
+            self.metrics.registry.gauge('chat_mailboxes', "Boîtes aux lettres non vides",
+                                        lambda: len(self.mailboxes.boxes))
+            self.metrics.registry.gauge('chat_mailbox_memory_bytes', "Mémoire occupée par les boîtes aux lettres",
+                                        lambda: self.mailboxes.memory)
+        
+        # Commandes: table propre à l'instance (extensible), et pool des commandes lourdes
+        # (command_workers threads, au plus command_queue en attente)
+        self.commands = self.COMMANDS.copy()
+        self.command_pool = CommandPool(command_workers, command_queue,
+                                        wait_histogram=self.metrics.command_wait_seconds)
+        self.metrics.registry.gauge('chat_command_queue_depth', "Commandes lourdes en attente",
+                                    self.command_pool.depth)
+        
+        # Relais à chaud (SIGUSR2): connexions vivantes, ligne de commande du successeur,
+        # et état reçu du prédécesseur (descripteurs, état) quand c'est nous le successeur
+        self.links = set()
+        self.upgrading = threading.Event()
+        self.upgrade_argv = None
+        self.inherited = None
+        # Réveille les lecteurs bloqués en attente de données quand le relais commence
+        self.wakeup_read, self.wakeup_write = os.pipe()
         
     def start(self):
         """Démarre le serveur et attend les connexions"""
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.listen()
             print(f"[SERVEUR] Démarré sur {self.host}:{self.port}")
             print(f"[SERVEUR] En attente de connexions...")
+            self.wheel.start_thread()
+            self.on_started()
+            if self.upgrade_argv:
+                signal.signal(signal.SIGUSR2, self.request_upgrade)
+            
+            # Connexions héritées d'un relais à chaud: un thread chacune, comme les autres
+            # (toutes réenregistrées avant de lire, sinon une diffusion en oublierait)
+            links = []
+            for sock, record in self.inherited_connections():
+                connection = ClientConnection(sock, self.new_outbox(), self.coalesce_window)
+                link = self.adopt(connection, sock, record)
+                if link:
+                    links.append(link)
+            for link in links:
+                threading.Thread(target=self.handle_client, args=(link.sock, link.address, link),
+                                 daemon=True).start()
             
             while True:
                 client_socket, address = self.server_socket.accept()
                 print(f"[SERVEUR] Nouvelle connexion depuis {address}")
                 
+                # Pas de thread pour une connexion de trop: refus immédiat
+                if not self.admit_connection():
+                    self.reject_connection(client_socket)
+                    continue
+                
                 # Créer un thread pour gérer ce client
                 client_thread = threading.Thread(
                     target=self.handle_client,
@@ -43,188 +227,1434 @@ class ChatServer:
                 
         except KeyboardInterrupt:
             print("\n[SERVEUR] Arrêt du serveur...")
+        except HotUpgrade:
+            if self.hand_over():
+                sys.stdout.flush()
+                os._exit(0)
+            print("[SERVEUR] ❌ Relais à chaud échoué, arrêt du serveur")
         finally:
-            self.shutdown()
+            for connection in self.shutdown():
+                connection.wait_closed(timeout=1.0)
+    
+    def listen(self):
+        """Ouvre le socket d'écoute, ou reprend celui du processus précédent"""
+        if self.inherited:
+            fds, _ = self.inherited
+            self.server_socket.close()
+            self.server_socket = socket.socket(fileno=fds[0])
+            self.server_socket.setblocking(True)
+            return
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
     
-    def handle_client(self, client_socket, address):
-        """Gère la communication avec un client spécifique"""
-        client_name = None
+    def on_started(self):
+        """Appelé une fois le serveur en écoute (point d'extension)"""
+        if self.mailboxes:
+            self.call_later(MAILBOX_PURGE_INTERVAL, self.purge_mailboxes)
+        # Le moniteur des verrous est global au processus: retiré par stop_metrics
+        locks.MONITOR.listeners.append(self.metrics.count_lock_report)
+        if self.metrics_port:
+            self.metrics_server = serve_metrics(self.metrics.registry, port=self.metrics_port)
+            print(f"[SERVEUR] 📊 Métriques sur http://127.0.0.1:{self.metrics_port}/metrics")
+    
+    def admit_connection(self):
+        """Réserve une place pour une nouvelle connexion; False si le serveur est plein"""
+        if self.connection_limiter.acquire():
+            return True
+        self.metrics.rejected.inc(value=SERVER_FULL)
+        print(f"[SERVEUR] ⛔ Connexion refusée: serveur plein ({self.connection_limiter.limit} connexions)")
+        return False
+    
+    def reject_connection(self, raw_socket):
+        """Répond REJECT à une connexion refusée avant toute poignée de main, puis la ferme"""
+        try:
+            raw_socket.settimeout(1.0)
+            protocol.send_json(raw_socket, protocol.REJECT, {'reason': SERVER_FULL})
+        except OSError:
+            pass
+        finally:
+            raw_socket.close()
+    
+    def new_rate_limiter(self):
+        """Crée les seaux à jetons d'une nouvelle connexion"""
+        return RateLimiter(self.message_rate, self.message_burst, self.byte_rate, self.byte_burst)
+    
+    def throttle(self, limiter, frame, client_socket):
+        """Applique la limite de débit; True si la trame doit être ignorée"""
+        exceeded = limiter.check(len(frame.payload))
+        if exceeded is None:
+            limiter.throttled = False
+            return False
+        
+        limit, wait = exceeded
+        self.metrics.throttled.inc(value=limit)
+        if not limiter.throttled:
+            # Un seul avertissement par épisode, pour ne pas amplifier le flot
+            limiter.throttled = True
+            what = "messages" if limit == MESSAGES else "données"
+            protocol.send_text(client_socket,
+                               f"⏳ Trop de {what}: message ignoré, réessayez dans {max(wait, 0.1):.1f}s\n")
+        return True
+    
+    def stop_metrics(self):
+        """Arrête l'export des métriques et libère son port"""
+        if self.metrics.count_lock_report in locks.MONITOR.listeners:
+            locks.MONITOR.listeners.remove(self.metrics.count_lock_report)
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+    
+    def new_outbox(self, blocking=True):
+        """Crée la file de sortie d'une nouvelle connexion"""
+        return Outbox(self.queue_size, self.slow_policy, self.block_timeout, blocking=blocking)
+    
+    def handle_client(self, raw_socket, address, link=None):
+        """Gère la communication avec un client spécifique (link: connexion héritée d'un relais)"""
+        adopted = link is not None
+        if not adopted:
+            # Les envois passent par la file de sortie, servie par un thread écrivain
+            connection = ClientConnection(raw_socket, self.new_outbox(), self.coalesce_window)
+            link = self.new_link(connection, raw_socket, protocol.FrameDecoder(), address)
+        connection = link.connection
+        decoder = link.decoder
+        client_name = link.name
+        # Après la poignée de main: la connexion, ou la session qui l'enveloppe
+        client_socket = link.client or connection
+        watch = self.heartbeat.watch(connection)
+        if client_name:
+            self.heartbeat.joined(watch)
+        limiter = self.new_rate_limiter()
+        # Attente des données ou du début d'un relais à chaud
+        poller = select.poll()
+        poller.register(raw_socket, select.POLLIN)
+        poller.register(self.wakeup_read, select.POLLIN)
         
         try:
-            # Demander le nom du client
-            client_socket.send("ENTER_NAME".encode('utf-8'))
-            client_name = client_socket.recv(1024).decode('utf-8').strip()
-            
-            # Vérifier si le nom est déjà utilisé
-            with self.clients_lock:
-                if client_name in self.clients:
-                    client_socket.send("NAME_TAKEN".encode('utf-8'))
-                    client_socket.close()
-                    return
-                
-                # Ajouter le client
-                self.clients[client_name] = client_socket
-                
-            print(f"[SERVEUR] '{client_name}' a rejoint le chat")
-            
-            # Envoyer message de bienvenue
-            welcome_msg = f"\n{'='*50}\n🎉 Bienvenue {client_name}! 🎉\n{'='*50}\n"
-            client_socket.send(welcome_msg.encode('utf-8'))
-            
-            # Envoyer la liste des clients connectés
-            self.send_clients_list(client_socket, client_name)
+            # Annoncer la version du protocole et attendre le nom du client
+            if not adopted:
+                protocol.send_json(connection, protocol.HELLO, self.hello())
             
-            # Informer les autres clients de la nouvelle connexion
-            self.broadcast(f"[SYSTÈME] {client_name} a rejoint le chat", exclude=client_name)
-            
-            # Envoyer les instructions
-            instructions = """
-📋 COMMANDES DISPONIBLES:
-   /list          - Afficher la liste des clients connectés
-   /to <nom>      - Envoyer un message privé à un client
-   /all <message> - Envoyer un message à tous
-   /quit          - Quitter le chat
-   
-💬 Tapez simplement votre message pour envoyer à tous
-"""
-            client_socket.send(instructions.encode('utf-8'))
-            
-            # Boucle de réception des messages
+            # Boucle de réception: un recv peut contenir plusieurs trames
             while True:
-                message = client_socket.recv(4096).decode('utf-8').strip()
+                poller.poll()
+                if self.upgrading.is_set():
+                    # Le socket part dans un autre processus: ne plus rien y lire
+                    link.parked.set()
+                    return
+                data = raw_socket.recv(RECV_SIZE)
                 
-                if not message:
+                if not data:
                     break
                 
-                # Traiter les commandes
-                if message.startswith('/'):
-                    self.handle_command(client_name, message, client_socket)
-                else:
-                    # Message broadcast par défaut
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    formatted_msg = f"[{timestamp}] {client_name}: {message}"
-                    self.broadcast(formatted_msg, exclude=client_name)
+                watch.touch()
+                for frame in decoder.feed(data):
+                    if self.handle_control(frame, connection):
+                        continue
+                    if client_name is None:
+                        client_name, client_socket = self.accept_join(frame, connection, link.address)
+                        if client_name is None:
+                            return
+                        link.name, link.client = client_name, client_socket
+                        self.heartbeat.joined(watch)
+                    else:
+                        self.process_frame(client_name, frame, client_socket, limiter)
                     
         except Exception as e:
             print(f"[ERREUR] Client {client_name}: {e}")
         finally:
-            # Nettoyer la connexion
-            if client_name:
-                with self.clients_lock:
-                    if client_name in self.clients:
-                        del self.clients[client_name]
+            self.heartbeat.release(watch)
+            # Connexion transmise à un autre processus: rien à nettoyer ici
+            if not link.parked.is_set():
+                self.links.discard(link)
+                self.connection_limiter.release()
+                # Nettoyer la connexion
+                if client_name:
+                    self.client_disconnected(client_name, client_socket, connection)
                 
-                print(f"[SERVEUR] '{client_name}' s'est déconnecté")
-                self.broadcast(f"[SYSTÈME] {client_name} a quitté le chat", exclude=client_name)
+                connection.close()
+                connection.wait_closed()
+    
+    def new_link(self, connection, sock, decoder, address):
+        """Enregistre une connexion vivante (pour un éventuel relais à chaud)"""
+        connection.on_sent = self.metrics.note_sent
+        link = Link(connection, sock, decoder, address)
+        self.links.add(link)
+        return link
+    
+    def hello(self):
+        """Annonce envoyée à chaque nouvelle connexion"""
+        return {'version': protocol.PROTOCOL_VERSION,
+                'compression': [protocol.COMPRESSION] if self.compression else [],
+                'resume': self.resume_timeout,
+                'ping_interval': self.heartbeat.ping_interval,
+                'idle_timeout': self.heartbeat.idle_timeout}
+    
+    def handle_control(self, frame, connection):
+        """Traite PING/PONG, hors du flux des messages; True si la trame est consommée"""
+        if frame.kind == protocol.PING:
+            connection.send(protocol.encode_frame(protocol.PONG, frame.payload))
+            return True
+        if frame.kind == protocol.PONG:
+            self.heartbeat.pong(frame.payload)
+            return True
+        return False
+    
+    def reap_connection(self, connection, reason):
+        """Ferme une connexion muette (poignée de main trop lente ou client inactif)"""
+        self.metrics.reaped.inc(value=reason)
+        print(f"[SERVEUR] 💀 Connexion récoltée ({reason})")
+        connection.abort()
+    
+    def accept_join(self, frame, connection, address=None):
+        """Traite la trame JOIN de la poignée de main
+        
+        Renvoie (nom accepté, connexion ou session du client), ou (None, connexion).
+        """
+        if frame.kind != protocol.JOIN:
+            raise protocol.ProtocolError(f"trame JOIN attendue, reçu le type {frame.kind}")
+        
+        request = frame.json()
+        if request.get('version') != protocol.PROTOCOL_VERSION:
+            protocol.send_json(connection, protocol.REJECT, {'reason': 'VERSION'})
+            connection.close()
+            return None, connection
+        
+        client_name = str(request.get('name', '')).strip()
+        # Compression si le client la demande et que le serveur la propose
+        compression = self.compression and request.get('compression') == protocol.COMPRESSION
+        accept = {'name': client_name, 'compression': protocol.COMPRESSION if compression else None}
+        if compression:
+            # Les trames suivantes sont compressées par l'écrivain de la connexion
+            connection.deflater = protocol.Deflater(self.compress_threshold)
+        
+        # Reprise d'une session existante: pas de nouvel accueil
+        token = request.get('session')
+        if isinstance(token, str) and self.resume_timeout:
+            session = self.resume_session(client_name, token, request.get('received', 0), connection, accept)
+            if session:
+                return client_name, session
+            if self.redirect_resume(client_name, connection):
+                return None, connection
+        
+        client_socket = connection
+        if token and self.resume_timeout:
+            client_socket = Session(client_name, connection, self.session_buffer)
+        if not self.register_client(client_name, client_socket):
+            return None, connection
+        self.check_admin(client_name, request.get('admin_token'), address)
+        
+        if isinstance(client_socket, Session):
+            with self.clients_lock:
+                self.sessions[client_name] = client_socket
+            accept.update(session=client_socket.token, resumed=False, received=0)
+        protocol.send_json(connection, protocol.ACCEPT, accept)
+        self.welcome_client(client_name, client_socket)
+        return client_name, client_socket
+    
+    def check_admin(self, client_name, token, address):
+        """Accorde les droits d'administrateur à un nom de --admin qui le prouve"""
+        if client_name not in self.admins:
+            return
+        if self.admin_token:
+            proven = isinstance(token, str) and hmac.compare_digest(token, self.admin_token)
+        else:
+            try:
+                proven = address is not None and ipaddress.ip_address(address[0]).is_loopback
+            except ValueError:
+                proven = False
+        if proven:
+            self.verified_admins.add(client_name)
+        else:
+            print(f"[SERVEUR] ⚠️ '{client_name}' connecté sans preuve d'administrateur: droits refusés")
+    
+    def is_admin(self, client_name):
+        return client_name in self.verified_admins
+    
+    def resume_session(self, client_name, token, received, connection, accept):
+        """Rattache une connexion à la session d'un client, None si elle n'existe plus"""
+        with self.clients_lock:
+            session = self.sessions.get(client_name)
+            if session is None or not hmac.compare_digest(session.token, token):
+                return None
             
+            # Sous clients_lock: l'expiration ne peut pas passer entre la vérification et la reprise
+            accept.update(session=session.token, resumed=True, received=session.received)
+            protocol.send_json(connection, protocol.ACCEPT, accept)
+            replayed, lost = session.attach(connection, int(received))
+        
+        print(f"[SERVEUR] 🔄 '{client_name}' a repris sa session ({replayed} trames renvoyées)")
+        if lost:
+            protocol.send_text(session, f"⚠️ {lost} message(s) perdu(s) pendant la coupure\n")
+        return session
+    
+    def redirect_resume(self, client_name, connection):
+        """Refuse une reprise dont la session est tenue ailleurs (voir shards.py); False ici"""
+        return False
+    
+    def client_disconnected(self, client_name, client_socket, connection):
+        """Fin d'une connexion: retire le client, ou garde sa session pour une reprise"""
+        if isinstance(client_socket, Session):
+            if not client_socket.detach(connection):
+                return  # la session a déjà été reprise par une nouvelle connexion
+            if not client_socket.ended:
+                print(f"[SERVEUR] 🔌 '{client_name}' déconnecté, session gardée {self.resume_timeout:g}s")
+                self.schedule_expiry(client_name, client_socket)
+                return
+            with self.clients_lock:
+                if self.sessions.get(client_name) is client_socket:
+                    del self.sessions[client_name]
+        
+        self.unregister_client(client_name)
+    
+    def schedule_expiry(self, client_name, session):
+        """Arme l'expiration d'une session détachée
+        
+        La roue ne fait que confier l'expiration au pool: elle prévient les salons
+        du client, et un dépôt peut bloquer (politique BLOCK) sans retarder les
+        autres minuteurs.
+        """
+        self.call_later(self.resume_timeout, self.command_pool.submit, SYSTEM,
+                        self.expire_session, client_name, session, session.generation)
+    
+    def expire_session(self, client_name, session, generation):
+        """Retire le client d'une session qui n'a pas été reprise à temps"""
+        with self.clients_lock:
+            if self.sessions.get(client_name) is not session or session.generation != generation:
+                return
+            del self.sessions[client_name]
+        
+        print(f"[SERVEUR] ⌛ Session de '{client_name}' expirée")
+        self.unregister_client(client_name)
+    
+    def register_client(self, client_name, client_socket):
+        """Enregistre un client, renvoie False si le nom est déjà utilisé"""
+        # Ajouter le client, sauf si le nom est déjà utilisé
+        if not self.clients.add(client_name, client_socket):
+            protocol.send_json(client_socket, protocol.REJECT, {'reason': 'NAME_TAKEN'})
             client_socket.close()
+            return False
+        
+        print(f"[SERVEUR] '{client_name}' a rejoint le chat")
+        return True
     
-    def handle_command(self, sender, message, sender_socket):
-        """Traite les commandes du client"""
-        parts = message.split(maxsplit=1)
-        command = parts[0].lower()
+    def welcome_client(self, client_name, client_socket):
+        """Accueille un client qui vient d'être enregistré"""
+        # Envoyer message de bienvenue
+        welcome_msg = f"\n{'='*50}\n🎉 Bienvenue {client_name}! 🎉\n{'='*50}\n"
+        protocol.send_text(client_socket, welcome_msg)
         
-        if command == '/list':
-            self.send_clients_list(sender_socket, sender)
+        # Envoyer la liste des clients connectés
+        self.send_clients_list(client_socket, client_name)
+        
+        # Entrer dans le salon par défaut et prévenir ses membres
+        self.join_room(client_name, DEFAULT_ROOM)
+        self.room_broadcast(DEFAULT_ROOM, f"[SYSTÈME] {client_name} a rejoint le chat", exclude=client_name)
+        if self.replay_count:
+            self.send_history(client_socket, DEFAULT_ROOM, self.replay_count)
+        
+        # Envoyer les instructions (/stats n'est montrée qu'aux administrateurs)
+        stats_help = "   /stats         - Afficher les métriques du serveur\n" if self.is_admin(client_name) else ""
+        instructions = f"""
+📋 COMMANDES DISPONIBLES:
+   /list [préfixe] [page] - Afficher les clients connectés (filtrés, par page)
+   /to <nom>      - Envoyer un message privé à un client (gardé s'il est absent)
+   /all <message> - Envoyer un message à tous
+   /join <salon>  - Rejoindre un salon (il devient le salon actif)
+   /leave [salon] - Quitter un salon (par défaut le salon actif)
+   /rooms         - Afficher la liste des salons
+   /history [n]   - Afficher les n derniers messages du salon actif
+   {SEARCH_USAGE} - Chercher dans les messages récents
+{stats_help}   /quit          - Quitter le chat
+   
+💬 Tapez simplement votre message pour l'envoyer au salon actif (#{DEFAULT_ROOM})
+"""
+        protocol.send_text(client_socket, instructions)
+        
+        # Messages privés reçus pendant l'absence, en un seul envoi
+        if self.mailboxes:
+            self.deliver_mailbox(client_name, client_socket)
+    
+    def process_frame(self, client_name, frame, client_socket, limiter=None):
+        """Traite une trame reçue d'un client déjà enregistré"""
+        if isinstance(client_socket, Session):
+            # Compté pour dire au client, à la reprise, ce qui a déjà été traité (même ignoré)
+            client_socket.received += 1
+        if frame.kind == protocol.TEXT:
+            message = frame.text().strip()
+            # /quit passe toujours: un client limité doit pouvoir partir
+            if limiter and message != '/quit' and self.throttle(limiter, frame, client_socket):
+                return
+            if message:
+                self.process_message(client_name, message, client_socket)
+    
+    def process_message(self, client_name, message, client_socket):
+        """Traite un message reçu d'un client (commande ou chat)"""
+        # Traiter les commandes
+        if message.startswith('/'):
+            self.handle_command(client_name, message, client_socket)
+        else:
+            self.metrics.messages_in.inc(value='message')
+            # Message envoyé au salon actif
+            with self.clients_lock:
+                room = self.active_rooms.get(client_name)
+            
+            if room is None:
+                protocol.send_text(client_socket, "❌ Vous n'êtes dans aucun salon. Utilisez /join <salon>\n")
+                return
             
-        elif command == '/to' and len(parts) > 1:
-            # Format: /to nom:message
-            try:
-                recipient_and_msg = parts[1].split(maxsplit=1)
-                if len(recipient_and_msg) < 2:
-                    sender_socket.send("❌ Format incorrect. Utilisez: /to <nom> <message>\n".encode('utf-8'))
-                    return
-                
-                recipient = recipient_and_msg[0]
-                private_msg = recipient_and_msg[1]
-                
-                self.send_private_message(sender, recipient, private_msg, sender_socket)
-            except Exception as e:
-                sender_socket.send(f"❌ Erreur: {e}\n".encode('utf-8'))
-                
-        elif command == '/all' and len(parts) > 1:
-            broadcast_msg = parts[1]
             timestamp = datetime.now().strftime("%H:%M:%S")
-            formatted_msg = f"[{timestamp}] {sender} (à tous): {broadcast_msg}"
-            self.broadcast(formatted_msg, exclude=sender)
-            sender_socket.send(f"✓ Message envoyé à tous\n".encode('utf-8'))
+            formatted_msg = f"[{timestamp}] [#{room}] {client_name}: {message}"
+            self.room_broadcast(room, formatted_msg, exclude=client_name)
+            self.record_message(room, client_name, message, formatted_msg)
+    
+    def unregister_client(self, client_name):
+        """Retire un client du chat et prévient les membres de ses salons"""
+        self.clients.remove(client_name)
+        self.verified_admins.discard(client_name)
+        
+        print(f"[SERVEUR] '{client_name}' s'est déconnecté")
+        rooms = self.leave_all_rooms(client_name)
+        self.rooms_broadcast(rooms, f"[SYSTÈME] {client_name} a quitté le chat", exclude=client_name)
+    
+    def join_room(self, client_name, room):
+        """Ajoute un client à un salon (créé au besoin), qui devient son salon actif"""
+        with self.clients_lock:
+            members = self.rooms.setdefault(room, set())
+            joined = client_name not in members
+            members.add(client_name)
+            self.memberships.setdefault(client_name, set()).add(room)
+            self.active_rooms[client_name] = room
+        
+        if joined:
+            self.on_room_changed(room)
+        return joined
+    
+    def leave_room(self, client_name, room):
+        """Retire un client d'un salon; renvoie False s'il n'en était pas membre"""
+        with self.clients_lock:
+            members = self.rooms.get(room)
+            if not members or client_name not in members:
+                return False
             
-        elif command == '/quit':
-            sender_socket.send("👋 Au revoir!\n".encode('utf-8'))
-            sender_socket.close()
+            members.discard(client_name)
+            if not members:
+                del self.rooms[room]
             
-        else:
-            sender_socket.send("❌ Commande inconnue. Tapez /list pour voir les commandes\n".encode('utf-8'))
+            remaining = self.memberships.get(client_name, set())
+            remaining.discard(room)
+            if self.active_rooms.get(client_name) == room:
+                self.active_rooms[client_name] = min(remaining) if remaining else None
+        
+        self.on_room_changed(room)
+        return True
     
-    def send_private_message(self, sender, recipient, message, sender_socket):
-        """Envoie un message privé d'un client à un autre"""
+    def leave_all_rooms(self, client_name):
+        """Retire un client de tous ses salons et renvoie la liste de ces salons"""
         with self.clients_lock:
-            if recipient not in self.clients:
-                sender_socket.send(f"❌ Client '{recipient}' non trouvé\n".encode('utf-8'))
+            rooms = self.memberships.pop(client_name, set())
+            self.active_rooms.pop(client_name, None)
+            for room in rooms:
+                members = self.rooms.get(room)
+                if members is not None:
+                    members.discard(client_name)
+                    if not members:
+                        del self.rooms[room]
+        
+        for room in rooms:
+            self.on_room_changed(room)
+        return sorted(rooms)
+    
+    def on_room_changed(self, room):
+        """Appelé quand les membres d'un salon changent (point d'extension)"""
+    
+    def room_sizes(self):
+        """Nombre de membres de chaque salon"""
+        with self.clients_lock:
+            return {room: len(members) for room, members in self.rooms.items()}
+    
+    def handle_command(self, sender, message, sender_socket):
+        """Traite les commandes du client: sur place, ou dans le pool si elle est lourde"""
+        parts = message.split(maxsplit=1)
+        command = self.commands.get(parts[0].lower())
+        args = parts[1] if len(parts) > 1 else ''
+        
+        # Compté sous le nom inscrit: un mot inventé par le client ne crée pas de nouvelle étiquette
+        self.metrics.messages_in.inc(value=command.name if command else 'unknown')
+        if command is None or (command.needs_args and not args):
+            protocol.send_text(sender_socket, "❌ Commande inconnue. Tapez /list pour voir les commandes\n")
+            return
+        if command.admin and not self.is_admin(sender):
+            protocol.send_text(sender_socket, "❌ Commande réservée aux administrateurs\n")
+            return
+        if not command.heavy:
+            command.run(self, sender, args, sender_socket)
+            return
+        
+        if not self.command_pool.submit(command.priority, self.run_command, command, sender, args, sender_socket):
+            self.metrics.commands_rejected.inc(value=command.name)
+            protocol.send_text(sender_socket, f"⏳ Serveur occupé: réessayez {command.name} dans un instant\n")
+    
+    def run_command(self, command, sender, args, sender_socket):
+        """Exécute une commande lourde dans un thread du pool"""
+        try:
+            with self.metrics.command_seconds.time():
+                command.run(self, sender, args, sender_socket)
+        except ConnectionError:
+            pass  # le client est parti entre-temps
+    
+    @COMMANDS.register('/list', usage="/list [préfixe] [page]")
+    def command_list(self, sender, args, sender_socket):
+        args = args.split()
+        if args and args[-1].isdigit():
+            page = int(args.pop())
+        else:
+            page = 1
+        if len(args) > 1 or page < 1:
+            protocol.send_text(sender_socket, "❌ Format incorrect. Utilisez: /list [préfixe] [page]\n")
+            return
+        self.send_clients_list(sender_socket, sender, args[0] if args else '', page)
+    
+    @COMMANDS.register('/to', needs_args=True, usage="/to <nom> <message>")
+    def command_to(self, sender, args, sender_socket):
+        try:
+            recipient_and_msg = args.split(maxsplit=1)
+            if len(recipient_and_msg) < 2:
+                protocol.send_text(sender_socket, "❌ Format incorrect. Utilisez: /to <nom> <message>\n")
                 return
             
-            recipient_socket = self.clients[recipient]
+            recipient = recipient_and_msg[0]
+            private_msg = recipient_and_msg[1]
+            
+            self.send_private_message(sender, recipient, private_msg, sender_socket)
+        except Exception as e:
+            protocol.send_text(sender_socket, f"❌ Erreur: {e}\n")
+    
+    @COMMANDS.register('/all', needs_args=True, usage="/all <message>")
+    def command_all(self, sender, args, sender_socket):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        formatted_msg = f"[{timestamp}] {sender} (à tous): {args}"
+        self.broadcast(formatted_msg, exclude=sender)
+        self.record_message(None, sender, args, formatted_msg)
+        protocol.send_text(sender_socket, f"✓ Message envoyé à tous\n")
+    
+    @COMMANDS.register('/join', needs_args=True, usage="/join <salon>")
+    def command_join(self, sender, args, sender_socket):
+        room = args.split()[0].lstrip('#')
+        if not room or len(room) > 32:
+            protocol.send_text(sender_socket, "❌ Nom de salon invalide\n")
+            return
+        
+        if self.join_room(sender, room):
+            self.room_broadcast(room, f"[SYSTÈME] {sender} a rejoint #{room}", exclude=sender)
+        protocol.send_text(sender_socket, f"✓ Salon actif: #{room}\n")
+        if self.replay_count:
+            self.send_history(sender_socket, room, self.replay_count)
+    
+    @COMMANDS.register('/leave', usage="/leave [salon]")
+    def command_leave(self, sender, args, sender_socket):
+        with self.clients_lock:
+            active = self.active_rooms.get(sender)
+        room = args.split()[0].lstrip('#') if args else active
+        
+        if room is None or not self.leave_room(sender, room):
+            protocol.send_text(sender_socket, f"❌ Vous n'êtes pas dans le salon #{room}\n")
+            return
+        
+        self.room_broadcast(room, f"[SYSTÈME] {sender} a quitté #{room}", exclude=sender)
+        with self.clients_lock:
+            active = self.active_rooms.get(sender)
+        if active:
+            protocol.send_text(sender_socket, f"✓ Vous avez quitté #{room}. Salon actif: #{active}\n")
+        else:
+            protocol.send_text(sender_socket, f"✓ Vous avez quitté #{room}. Vous n'êtes plus dans aucun salon\n")
+    
+    @COMMANDS.register('/rooms')
+    def command_rooms(self, sender, args, sender_socket):
+        self.send_rooms_list(sender_socket, sender)
+    
+    # Relit le journal sur disque quand les messages ne sont plus en mémoire
+    @COMMANDS.register('/history', heavy=True, priority=BULK, usage="/history [n]")
+    def command_history(self, sender, args, sender_socket):
+        try:
+            count = int(args) if args else 20
+        except ValueError:
+            protocol.send_text(sender_socket, "❌ Format incorrect. Utilisez: /history [n]\n")
+            return
+        
+        with self.clients_lock:
+            room = self.active_rooms.get(sender)
+        self.send_history(sender_socket, room, max(1, min(count, 500)))
+    
+    # Parcourt l'index (mots les plus fréquents: beaucoup de positions à croiser)
+    @COMMANDS.register('/search', heavy=True, priority=BULK, needs_args=True,
+                       usage=SEARCH_USAGE)
+    def command_search(self, sender, args, sender_socket):
+        if self.search_index is None:
+            protocol.send_text(sender_socket, "❌ Recherche désactivée sur ce serveur\n")
+            return
+        try:
+            query = parse_query(args)
+        except ValueError as e:
+            protocol.send_text(sender_socket, f"❌ {e}. Utilisez: {SEARCH_USAGE}\n")
+            return
+        
+        # Messages à tous et salons du client; les administrateurs cherchent partout
+        visible = None
+        if not self.is_admin(sender):
+            with self.clients_lock:
+                visible = set(self.memberships.get(sender, ())) | {None}
+        self.send_search_results(sender_socket, args, query, visible)
+    
+    # Parcourt les files de tous les clients et calcule les quantiles
+    @COMMANDS.register('/stats', heavy=True, priority=CONTROL, admin=True)
+    def command_stats(self, sender, args, sender_socket):
+        self.send_stats(sender_socket)
+    
+    @COMMANDS.register('/quit', priority=CONTROL)
+    def command_quit(self, sender, args, sender_socket):
+        protocol.send_text(sender_socket, "👋 Au revoir!\n")
+        sender_socket.close()
+    
+    def send_private_message(self, sender, recipient, message, sender_socket):
+        """Envoie un message privé d'un client à un autre"""
+        if recipient not in self.clients:
+            if self.mailboxes:
+                self.leave_mail(sender, recipient, message, sender_socket)
+            else:
+                protocol.send_text(sender_socket, f"❌ Client '{recipient}' non trouvé\n")
+            return
+        
+        if self.deliver_private(sender, recipient, message):
+            protocol.send_text(sender_socket, f"✓ Message privé envoyé à {recipient}\n")
+        else:
+            protocol.send_text(sender_socket, f"❌ Impossible d'envoyer le message à {recipient}\n")
+    
+    def deliver_private(self, sender, recipient, message):
+        """Remet un message privé à un client connecté à ce serveur"""
+        recipient_socket = self.clients.get(recipient)
+        
+        if recipient_socket is None:
+            return False
         
         timestamp = datetime.now().strftime("%H:%M:%S")
         private_msg = f"[{timestamp}] 💌 Message privé de {sender}: {message}\n"
         
         try:
-            recipient_socket.send(private_msg.encode('utf-8'))
-            sender_socket.send(f"✓ Message privé envoyé à {recipient}\n".encode('utf-8'))
+            protocol.send_text(recipient_socket, private_msg)
+            self.metrics.messages_out.inc(value='private')
+            return True
         except:
-            sender_socket.send(f"❌ Impossible d'envoyer le message à {recipient}\n".encode('utf-8'))
+            return False
+    
+    def leave_mail(self, sender, recipient, message, sender_socket):
+        """Garde un message privé pour un client hors ligne"""
+        mail, error = self.mailboxes.put(recipient, sender, message)
+        if mail is None:
+            reason = "sa boîte aux lettres est pleine" if error == FULL else "le serveur n'a plus de place"
+            protocol.send_text(sender_socket, f"❌ {recipient} est hors ligne et {reason}: message non gardé\n")
+            return
+        
+        self.metrics.messages_out.inc(value='mailbox')
+        protocol.send_text(sender_socket, f"📭 {recipient} est hors ligne: message gardé "
+                                          f"{format_duration(self.mailboxes.ttl)}, remis à sa prochaine connexion\n")
+    
+    def deliver_mailbox(self, client_name, client_socket):
+        """Remet à un client qui arrive les messages gardés pour lui"""
+        self.mailboxes.take(client_name, lambda mails: self.deliver_mails(client_name, client_socket, mails))
     
-    def send_clients_list(self, client_socket, current_client):
-        """Envoie la liste des clients connectés"""
+    def deliver_mails(self, client_name, client_socket, mails):
+        """Envoie les messages d'une boîte en une trame, puis les accusés de réception"""
+        if not mails:
+            return
+        lines = []
+        for mail in mails:
+            timestamp = datetime.fromtimestamp(mail.sent).strftime("%d/%m %H:%M:%S")
+            if mail.sender is None:
+                lines.append(f"[{timestamp}] 📨 {mail.text}")
+            else:
+                lines.append(f"[{timestamp}] 💌 Message privé de {mail.sender}: {mail.text}")
+        protocol.send_text(client_socket, f"\n📬 {len(mails)} message(s) reçu(s) pendant votre absence:\n"
+                                          + "\n".join(lines) + "\n")
+        
+        # Un accusé par expéditeur (les avis du serveur n'en donnent pas)
+        senders = Counter(mail.sender for mail in mails if mail.sender is not None)
+        for sender, count in senders.items():
+            self.notify(sender, f"✓ {count} message(s) privé(s) remis à {client_name}")
+    
+    def notify(self, client_name, text):
+        """Avis du serveur à un client: envoyé tout de suite, ou gardé dans sa boîte"""
+        client_socket = self.clients.get(client_name)
+        if client_socket is not None:
+            try:
+                protocol.send_text(client_socket, f"{text}\n")
+                return
+            except ConnectionError:
+                pass
+        if self.mailboxes:
+            self.mailboxes.put(client_name, None, text)
+    
+    def purge_mailboxes(self):
+        """Minuteur: confie la purge des boîtes au pool (peut lire le disque), en priorité"""
+        self.command_pool.submit(SYSTEM, self.purge_expired_mails)
+        self.call_later(MAILBOX_PURGE_INTERVAL, self.purge_mailboxes)
+    
+    def purge_expired_mails(self):
+        """Retire les messages expirés et prévient leurs expéditeurs"""
+        self.mailboxes.purge(self.report_expired_mail)
+    
+    def report_expired_mail(self, recipient, mail):
+        if mail.sender is not None:
+            self.notify(mail.sender, f"⌛ Votre message à {recipient} a expiré sans être remis")
+    
+    def client_names(self):
+        """Noms des clients connectés"""
+        return list(self.clients)
+    
+    def listing(self):
+        """(clé de version, noms triés) pour /list; la clé change avec le registre"""
+        snapshot = self.clients.snapshot
+        return snapshot, snapshot.sorted_names()
+    
+    def send_clients_list(self, client_socket, current_client, prefix='', page=1):
+        """Envoie une page de la liste des clients connectés
+        
+        Les pages sont encodées une fois par version du registre; seule celle
+        où figure le demandeur est retouchée pour y ajouter « (vous) ».
+        """
+        key, names = self.listing()
+        cache_key, pages = self.list_cache
+        if cache_key != key:
+            pages = {}
+            self.list_cache = (key, pages)
+        
+        entry = pages.get((prefix, page))
+        if entry is None:
+            if len(pages) >= LIST_CACHE_SIZE:
+                pages.clear()
+            msg, page_names = self.render_clients_page(names, prefix, page)
+            entry = pages[(prefix, page)] = (protocol.encode_text(msg), msg, page_names)
+        
+        frame, msg, page_names = entry
+        if current_client in page_names:
+            frame = protocol.encode_text(msg.replace(f"   • {current_client}\n",
+                                                     f"   • {current_client} (vous)\n", 1))
+        client_socket.sendall(frame)
+    
+    def render_clients_page(self, names, prefix, page):
+        """Texte d'une page de /list et noms qu'elle contient (names est trié)"""
+        # Les noms commençant par le préfixe forment une tranche contiguë de la liste triée
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + '\U0010ffff') if prefix else len(names)
+        total = end - start
+        
+        if not prefix and total <= 1:
+            return f"{protocol.LIST_HEADER}:\n   Vous êtes seul pour le moment\n", frozenset(names)
+        if not total:
+            return f"{protocol.LIST_HEADER} commençant par '{prefix}': aucun\n", frozenset()
+        
+        page_count = -(-total // LIST_PAGE_SIZE)
+        page = min(page, page_count)
+        first = start + (page - 1) * LIST_PAGE_SIZE
+        page_names = names[first:min(first + LIST_PAGE_SIZE, end)]
+        
+        title = f" commençant par '{prefix}'" if prefix else ""
+        lines = [f"{protocol.LIST_HEADER}{title} ({total}):\n"]
+        lines.extend(f"   • {name}\n" for name in page_names)
+        if page_count > 1:
+            lines.append(f"   Page {page}/{page_count} - /list [préfixe] [page]\n")
+        return ''.join(lines), frozenset(page_names)
+    
+    def send_rooms_list(self, client_socket, current_client):
+        """Envoie la liste des salons avec leur nombre de membres"""
+        sizes = self.room_sizes()
         with self.clients_lock:
-            clients_list = list(self.clients.keys())
+            joined = set(self.memberships.get(current_client, ()))
+            active = self.active_rooms.get(current_client)
         
-        if len(clients_list) <= 1:
-            msg = "\n👥 CLIENTS CONNECTÉS:\n   Vous êtes seul pour le moment\n"
-        else:
-            msg = "\n👥 CLIENTS CONNECTÉS:\n"
-            for name in clients_list:
-                if name == current_client:
-                    msg += f"   • {name} (vous)\n"
-                else:
-                    msg += f"   • {name}\n"
+        msg = "\n🏠 SALONS:\n"
+        for room in sorted(sizes):
+            marker = " (actif)" if room == active else " (membre)" if room in joined else ""
+            msg += f"   • #{room} - {sizes[room]} membre(s){marker}\n"
         
-        client_socket.send(msg.encode('utf-8'))
+        protocol.send_text(client_socket, msg)
     
-    def broadcast(self, message, exclude=None):
-        """Envoie un message à tous les clients sauf celui exclu"""
-        message_with_newline = message + "\n"
+    def send_stats(self, client_socket):
+        """Envoie un résumé des métriques du serveur"""
+        metrics = self.metrics
+        uptime = int(time.time() - metrics.started)
+        depths = self.queue_depths()
+        
+        msg = "\n📊 STATISTIQUES DU SERVEUR:\n"
+        msg += f"   • En service depuis {uptime // 3600}h{uptime // 60 % 60:02d}m{uptime % 60:02d}s\n"
+        msg += f"   • Clients connectés: {len(depths)}\n"
+        msg += f"   • Messages reçus: {metrics.messages_in.total()}\n"
+        for command, count in sorted(metrics.messages_in.values.items()):
+            msg += f"       {command}: {count}\n"
+        msg += f"   • Messages diffusés: {metrics.messages_out.total()}\n"
+        for route, count in sorted(metrics.messages_out.values.items()):
+            msg += f"       {route}: {count}\n"
+        msg += f"   • Envoyé: {metrics.frames_sent.total()} trames, {metrics.bytes_sent.total()} octets\n"
+        msg += f"   • Clients lents retirés: {metrics.slow_consumers.total()}\n"
+        msg += f"   • Messages limités: {metrics.throttled.total()}\n"
+        for limit, count in sorted(metrics.throttled.values.items()):
+            msg += f"       {limit}: {count}\n"
+        msg += f"   • Connexions refusées: {metrics.rejected.total()}\n"
+        msg += f"   • Connexions inactives récoltées: {metrics.reaped.total()}\n"
+        for reason, count in sorted(metrics.reaped.values.items()):
+            msg += f"       {reason}: {count}\n"
+        rtt = metrics.ping_rtt_seconds
+        if rtt.count:
+            msg += f"   • Aller-retour des pings: p50 {rtt.quantile(0.5) * 1e3:.1f} ms ({rtt.count} pongs)\n"
+        msg += f"   • Commandes lourdes en attente: {self.command_pool.depth()}"
+        if metrics.commands_rejected.total():
+            msg += f", {metrics.commands_rejected.total()} refusées (file pleine)"
+        msg += "\n"
+        if self.search_index is not None:
+            index = self.search_index
+            msg += (f"   • Index de recherche: {len(index)} messages, {len(index.sealed) + 1} segments, "
+                    f"{index.merges} fusions\n")
+        for label, histogram in (("Diffusion", metrics.fanout_seconds),
+                                 ("Attente des commandes lourdes", metrics.command_wait_seconds),
+                                 ("Exécution des commandes lourdes", metrics.command_seconds),
+                                 ("Attente clients_lock", metrics.lock_wait_seconds),
+                                 ("Détention clients_lock", metrics.lock_hold_seconds)):
+            msg += (f"   • {label}: p50 {histogram.quantile(0.5) * 1e6:.0f} µs, "
+                    f"p99 {histogram.quantile(0.99) * 1e6:.0f} µs ({histogram.count} mesures)\n")
+        lock_stats = self.clients_lock.stats
+        if lock_stats.acquisitions:
+            msg += (f"   • clients_lock: {lock_stats.acquisitions} acquisitions, "
+                    f"{lock_stats.contended / lock_stats.acquisitions:.1%} en attente\n")
+        if metrics.lock_reports.total():
+            msg += f"   • Interblocages signalés: {metrics.lock_reports.total()}\n"
+            for kind, count in sorted(metrics.lock_reports.values.items()):
+                msg += f"       {kind}: {count}\n"
+        
+        laggards = sorted(depths.items(), key=lambda item: item[1], reverse=True)[:5]
+        laggards = [(name, depth) for name, depth in laggards if depth]
+        if laggards:
+            msg += "   • Files de sortie les plus longues:\n"
+            for name, depth in laggards:
+                msg += f"       {name}: {depth} trames\n"
+        
+        protocol.send_text(client_socket, msg)
+    
+    def record_message(self, room, sender, text, line):
+        """Archive un message diffusé (room vaut None pour un message à tous)"""
+        entry = self.history.append(room, sender, text, line)
+        if self.search_index is not None:
+            self.search_index.add(entry)
+    
+    def send_search_results(self, client_socket, args, query, visible):
+        """Envoie les messages trouvés, du plus récent au plus ancien"""
+        started = time.perf_counter()
+        entries = self.search_index.search(query, visible, SEARCH_RESULTS)
+        elapsed = (time.perf_counter() - started) * 1e3
+        
+        title = f"\n🔎 RECHERCHE « {args} »"
+        if not entries:
+            protocol.send_text(client_socket, f"{title}: aucun message ({elapsed:.1f} ms)\n")
+            return
         
+        # Date en plus de l'heure du message: les résultats peuvent remonter à plusieurs jours
+        lines = "\n".join(f"{datetime.fromtimestamp(entry.timestamp):%d/%m} {entry.line}" for entry in entries)
+        more = f", les {SEARCH_RESULTS} plus récents" if len(entries) == SEARCH_RESULTS else ""
+        protocol.send_text(client_socket, f"{title} ({len(entries)} messages{more}, {elapsed:.1f} ms):\n{lines}\n")
+    
+    def send_history(self, client_socket, room, count):
+        """Envoie les derniers messages d'un salon"""
+        entries = self.history.recent(room, count)
+        title = f"#{room}" if room else "(messages à tous)"
+        
+        if not entries:
+            protocol.send_text(client_socket, f"\n📜 HISTORIQUE {title}: aucun message\n")
+            return
+        
+        lines = "\n".join(entry.line for entry in entries)
+        protocol.send_text(client_socket, f"\n📜 HISTORIQUE {title} ({len(entries)} messages):\n{lines}\n")
+    
+    def room_broadcast(self, room, message, exclude=None):
+        """Envoie un message aux seuls membres d'un salon"""
+        self.rooms_broadcast((room,), message, exclude)
+    
+    def rooms_broadcast(self, rooms, message, exclude=None):
+        """Envoie un message une seule fois à chaque membre d'un des salons
+        
+        Grâce à l'index salon -> membres, le coût est proportionnel à la
+        taille des salons et non au nombre total de clients.
+        """
+        frame = protocol.encode_text(message + "\n")
+        
+        clients = self.clients.snapshot.clients
         with self.clients_lock:
-            disconnected = []
-            for name, client_socket in self.clients.items():
-                if name != exclude:
-                    try:
-                        client_socket.send(message_with_newline.encode('utf-8'))
-                    except:
-                        disconnected.append(name)
-            
-            # Nettoyer les clients déconnectés
-            for name in disconnected:
-                del self.clients[name]
+            if len(rooms) == 1:
+                names = self.rooms.get(rooms[0], ())
+            else:
+                names = set().union(*(self.rooms.get(room, ()) for room in rooms))
+            recipients = [(name, clients[name]) for name in names
+                          if name != exclude and name in clients]
+        
+        self.fanout(recipients, frame, 'room')
+    
+    def broadcast(self, message, exclude=None):
+        """Envoie un message à tous les clients sauf celui exclu
+        
+        Le message est encodé une seule fois, puis la même trame est déposée
+        dans la file de chaque destinataire: aucun envoi bloquant n'a lieu
+        ici, et aucun verrou n'est pris: on parcourt l'instantané du registre.
+        """
+        frame = protocol.encode_text(message + "\n")
+        
+        recipients = [(name, client_socket) for name, client_socket in self.clients.items()
+                      if name != exclude]
+        
+        self.fanout(recipients, frame, 'all')
+    
+    def fanout(self, recipients, frame, route):
+        """Dépose une trame déjà encodée dans la file de chaque destinataire"""
+        disconnected = []
+        with self.metrics.fanout_seconds.time():
+            for name, client_socket in recipients:
+                try:
+                    client_socket.sendall(frame)
+                except:
+                    disconnected.append((name, client_socket))
+        self.metrics.messages_out.inc(len(recipients) - len(disconnected), route)
+        
+        # Nettoyer les clients déconnectés (ou trop lents)
+        if disconnected:
+            self.metrics.slow_consumers.inc(len(disconnected))
+            for name, client_socket in disconnected:
+                self.clients.remove(name, client_socket)
+            for name, client_socket in disconnected:
+                print(f"[SERVEUR] '{name}' retiré (file de sortie pleine ou connexion perdue)")
+                client_socket.abort()
+    
+    def call_soon(self, callback, *args):
+        """Exécute callback dans le contexte du serveur (ici: directement)"""
+        callback(*args)
+    
+    def call_later(self, delay, callback, *args):
+        """Exécute callback après delay secondes, depuis la roue de temporisation"""
+        return self.wheel.schedule(delay, callback, *args)
+    
+    def queue_depths(self):
+        """Profondeur de la file de sortie de chaque client, pour repérer les retardataires"""
+        return {name: client_socket.queue_depth() for name, client_socket in self.clients.items()}
     
     def shutdown(self):
         """Arrête proprement le serveur"""
         print("[SERVEUR] Fermeture des connexions...")
         
+        clients = self.clients.clear()
         with self.clients_lock:
-            for client_socket in self.clients.values():
-                try:
-                    client_socket.send("SERVER_SHUTDOWN".encode('utf-8'))
-                    client_socket.close()
-                except:
-                    pass
-            self.clients.clear()
+            self.sessions.clear()
+        
+        shutdown_frame = protocol.encode_frame(protocol.SHUTDOWN)
+        for client_socket in clients:
+            try:
+                client_socket.sendall(shutdown_frame)
+                client_socket.close()
+            except:
+                pass
+        
+        # Attendre les connexions elles-mêmes, pas les sessions qui les enveloppent
+        connections = [client.connection if isinstance(client, Session) else client for client in clients]
+        connections = [connection for connection in connections if connection is not None]
         
         self.server_socket.close()
+        self.wheel.stop()
+        self.command_pool.stop()
+        self.history.close()
+        if self.search_index is not None:
+            self.search_index.close()
+        if self.mailboxes:
+            self.mailboxes.close()
+        self.stop_metrics()
         print("[SERVEUR] Arrêté")
+        # L'appelant attend que les écrivains aient vidé leur file
+        return connections
+
+    # Relais à chaud (voir upgrade.py)
+    
+    def enable_hot_upgrade(self, argv):
+        """Sur SIGUSR2, passer les connexions à un nouveau processus lancé avec argv"""
+        self.upgrade_argv = list(argv)
+    
+    def take_over(self, fd):
+        """Reçoit du processus précédent son socket d'écoute, ses connexions et son état"""
+        self.inherited = receive_state(fd)
+        print(f"[SERVEUR] 🔁 Relais reçu: {len(self.inherited[1]['connections'])} connexion(s)")
+    
+    def request_upgrade(self, signum=None, frame=None):
+        """Gestionnaire de SIGUSR2: interrompt la boucle d'acceptation"""
+        if not self.upgrading.is_set():
+            raise HotUpgrade()
+    
+    def hand_over(self):
+        """Arrête de lire et d'écrire, puis transmet tout au successeur; True si c'est fait"""
+        print("[SERVEUR] 🔁 Relais à chaud: transmission des connexions...")
+        self.upgrading.set()
+        os.write(self.wakeup_write, b'!')
+        self.wheel.stop()
+        
+        # Tous les lecteurs d'abord: un lecteur pas encore garé peut encore diffuser
+        # vers les autres connexions (un lecteur occupé termine sa trame en cours)
+        links = [link for link in list(self.links) if link.parked.wait(self.block_timeout + 1.0)]
+        exported = []
+        for link in links:
+            pending = link.connection.detach()
+            if pending is None:
+                # Écrivain bloqué au milieu d'une trame: le client reprendra sa session
+                link.connection.abort()
+                continue
+            exported.append((link, pending))
+        return self.transfer(self.server_socket.fileno(), exported)
+    
+    def transfer(self, listen_fd, exported):
+        """Démarre le successeur et lui envoie descripteurs et état"""
+        # Le successeur relit le journal et les boîtes sur disque, et ouvre le port des
+        # métriques: les libérer d'abord
+        self.history.close()
+        if self.mailboxes:
+            self.mailboxes.flush()
+        self.stop_metrics()
+        
+        fds, state = self.export_state(listen_fd, exported)
+        channel, process = spawn_successor(self.upgrade_argv)
+        try:
+            done = send_state(channel, fds, state)
+        except OSError as e:
+            print(f"[ERREUR] Relais à chaud: {e}")
+            done = False
+        finally:
+            channel.close()
+        
+        if done:
+            print(f"[SERVEUR] ✅ {len(exported)} connexion(s) transmise(s) au PID {process.pid}")
+        return done
+    
+    def export_state(self, listen_fd, exported):
+        """Descripteurs à transmettre (écoute en premier) et état JSON qui les décrit"""
+        fds = [listen_fd]
+        connections = []
+        index = {}
+        for link, pending in exported:
+            buffered, window = link.decoder.export()
+            index[id(link.connection)] = len(connections)
+            fds.append(link.sock.fileno())
+            connections.append({
+                'name': link.name,
+                'address': list(link.address) if link.address else None,
+                'session': isinstance(link.client, Session),
+                'compression': link.connection.deflater is not None,
+                'buffered': encode_bytes(buffered),
+                'window': encode_bytes(window) if window is not None else None,
+                'pending': [encode_bytes(frame) for frame in pending],
+            })
+        
+        sessions = {}
+        with self.clients_lock:
+            for name, session in self.sessions.items():
+                with session.lock:
+                    sessions[name] = {
+                        'token': session.token,
+                        'sent': session.sent,
+                        'received': session.received,
+                        'replay': [encode_bytes(frame) for frame in session.replay],
+                        # None: session détachée, en attente de reprise
+                        'connection': index.get(id(session.connection)),
+                    }
+            # Les clients qui n'ont pas pu être transmis quittent leurs salons
+            names = {link.name for link, _ in exported if link.name} | set(sessions)
+            rooms = {room: sorted(members & names) for room, members in self.rooms.items() if members & names}
+            active_rooms = {name: room for name, room in self.active_rooms.items() if name in names}
+        
+        # Avec un journal sur disque, le successeur recharge l'historique lui-même
+        history = [] if self.history.log else [list(entry) for entry in self.history.entries()]
+        # Boîtes aux lettres: seulement la partie en mémoire, le disque reste en place
+        mail = [[recipient, *entry] for recipient, entry in self.mailboxes.entries()] if self.mailboxes else []
+        return fds, {'connections': connections, 'sessions': sessions, 'rooms': rooms,
+                     'active_rooms': active_rooms, 'history': history, 'mail': mail,
+                     'admins': sorted(self.verified_admins & names)}
+    
+    def inherited_connections(self):
+        """Restaure l'état hérité d'un relais et renvoie [(socket client, description)]"""
+        if not self.inherited:
+            return []
+        fds, state = self.inherited
+        self.inherited = None
+        self.restore_state(state)
+        
+        connections = []
+        for fd, record in zip(fds[1:], state['connections']):
+            sock = socket.socket(fileno=fd)
+            sock.setblocking(True)
+            connections.append((sock, record))
+        return connections
+    
+    def restore_state(self, state):
+        """Recharge salons, sessions et historique transmis par le processus précédent"""
+        with self.clients_lock:
+            for room, members in state['rooms'].items():
+                self.rooms[room] = set(members)
+                for member in members:
+                    self.memberships.setdefault(member, set()).add(room)
+            self.active_rooms.update(state['active_rooms'])
+        
+        for name, data in state['sessions'].items():
+            session = Session(name, None, self.session_buffer)
+            session.token = data['token']
+            session.sent = data['sent']
+            session.received = data['received']
+            session.replay.extend(decode_bytes(frame) for frame in data['replay'])
+            with self.clients_lock:
+                self.sessions[name] = session
+            self.clients.add(name, session)
+            if data['connection'] is None:
+                self.schedule_expiry(name, session)
+        
+        self.verified_admins.update(state.get('admins', ()))
+        
+        entries = [HistoryEntry(*entry) for entry in state['history']]
+        self.history.restore(entries)
+        if self.search_index is not None:
+            self.search_index.add_many(entries)
+        if self.mailboxes:
+            self.mailboxes.restore((recipient, Mail(*entry)) for recipient, *entry in state['mail'])
+    
+    def adopt(self, connection, sock, record):
+        """Reprend une connexion transmise par le processus précédent; None si refusée"""
+        if not self.connection_limiter.acquire():
+            connection.abort()
+            return None
+        if record['compression']:
+            # Nouveau flux sortant: le client le décode sans le dictionnaire précédent
+            connection.deflater = protocol.Deflater(self.compress_threshold)
+        window = record['window']
+        decoder = protocol.FrameDecoder.restore(decode_bytes(record['buffered']),
+                                                decode_bytes(window) if window is not None else None)
+        link = self.new_link(connection, sock, decoder, tuple(record['address'] or ()))
+        
+        name = record['name']
+        if name:
+            if record['session']:
+                link.client = self.sessions[name]
+                link.client.connection = connection
+            else:
+                link.client = connection
+                self.clients.add(name, connection)
+            link.name = name
+        
+        for frame in record['pending']:
+            connection.send(decode_bytes(frame))
+        return link
+
+
+class AsyncChatServer(ChatServer):
+    """Serveur de chat servant toutes les connexions depuis une seule boucle asyncio
+    
+    Mêmes commandes et même logique que ChatServer, mais sans un thread par client:
+    chaque connexion est une coroutine, ce qui tient des milliers de clients
+    dans un seul thread.
+    """
+    
+    def start(self):
+        """Démarre le serveur et la boucle d'événements"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n[SERVEUR] Arrêt du serveur...")
+    
+    def call_soon(self, callback, *args):
+        """Programme callback dans la boucle (appelable depuis un autre thread)"""
+        self.loop.call_soon_threadsafe(callback, *args)
+    
+    async def serve(self):
+        """Accepte les connexions dans la boucle d'événements"""
+        self.loop = asyncio.get_running_loop()
+        self.listen()
+        self.async_server = server = await asyncio.start_server(self.handle_client_async,
+                                                                sock=self.server_socket)
+        # La roue avance depuis la boucle: ses minuteurs s'y exécutent aussi
+        self.timers_task = asyncio.create_task(self.run_timers())
+        print(f"[SERVEUR] Démarré sur {self.host}:{self.port} (asyncio)")
+        print(f"[SERVEUR] En attente de connexions...")
+        self.on_started()
+        if self.upgrade_argv:
+            self.loop.add_signal_handler(signal.SIGUSR2, self.request_upgrade)
+        
+        adopted = []
+        for sock, record in self.inherited_connections():
+            reader, writer = await asyncio.open_connection(sock=sock)
+            connection = AsyncConnection(writer, self.new_outbox(blocking=False), self.coalesce_window)
+            link = self.adopt(connection, writer.get_extra_info('socket'), record)
+            if link:
+                adopted.append((reader, writer, link))
+        for reader, writer, link in adopted:
+            asyncio.create_task(self.handle_client_async(reader, writer, link))
+        
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            # server.close() d'un relais à chaud; s'il réussit, le processus se termine avant
+            if not self.upgrading.is_set():
+                raise
+            await self.upgrade_task
+            print("[SERVEUR] ❌ Relais à chaud échoué, arrêt du serveur")
+        finally:
+            self.timers_task.cancel()
+            connections = self.shutdown()
+            await asyncio.gather(*(c.wait_closed(timeout=1.0) for c in connections))
+    
+    def request_upgrade(self, signum=None, frame=None):
+        """SIGUSR2, reçu dans la boucle: lancer le relais à chaud"""
+        if not self.upgrading.is_set():
+            self.upgrading.set()
+            self.upgrade_task = asyncio.create_task(self.hand_over_async())
+    
+    async def hand_over_async(self):
+        """Relais à chaud depuis la boucle; en cas de succès le processus se termine ici"""
+        print("[SERVEUR] 🔁 Relais à chaud: transmission des connexions...")
+        # server.close() ferme le socket d'écoute: en garder une copie à transmettre
+        listen_fd = os.dup(self.server_socket.fileno())
+        self.async_server.close()
+        self.timers_task.cancel()
+        
+        links = list(self.links)
+        for link in links:
+            link.connection.writer.transport.pause_reading()
+        # Laisser chaque lecteur traiter ce qui est déjà dans son tampon
+        for _ in range(100):
+            if all(link.idle for link in links):
+                break
+            await asyncio.sleep(0)
+        
+        ready = [link for link in links if link.idle and link in self.links]
+        pendings = await asyncio.gather(*(link.connection.detach() for link in ready))
+        exported = []
+        for link, pending in zip(ready, pendings):
+            if pending is None:
+                link.connection.abort()
+                continue
+            link.parked.set()
+            exported.append((link, pending))
+        
+        if self.transfer(listen_fd, exported):
+            sys.stdout.flush()
+            os._exit(0)
+        os.close(listen_fd)
+        return False
+    
+    async def run_timers(self):
+        """Avance la roue de temporisation à chaque tick"""
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            self.wheel.run_due()
+    
+    async def handle_client_async(self, reader, writer, link=None):
+        """Gère la communication avec un client dans une coroutine"""
+        adopted = link is not None
+        if not adopted:
+            address = writer.get_extra_info('peername')
+            print(f"[SERVEUR] Nouvelle connexion depuis {address}")
+            if not self.admit_connection():
+                writer.write(protocol.encode_json(protocol.REJECT, {'reason': SERVER_FULL}))
+                writer.close()
+                return
+            
+            connection = AsyncConnection(writer, self.new_outbox(blocking=False), self.coalesce_window)
+            link = self.new_link(connection, writer.get_extra_info('socket'), protocol.FrameDecoder(), address)
+        connection = link.connection
+        client_socket = link.client or connection
+        client_name = link.name
+        decoder = link.decoder
+        watch = self.heartbeat.watch(connection)
+        if client_name:
+            self.heartbeat.joined(watch)
+        limiter = self.new_rate_limiter()
+        
+        try:
+            if not adopted:
+                protocol.send_json(connection, protocol.HELLO, self.hello())
+            
+            # Boucle de réception des trames
+            while True:
+                # idle: tampon vide, rien en cours (le relais à chaud peut prendre le socket)
+                link.idle = True
+                data = await reader.read(RECV_SIZE)
+                link.idle = False
+                
+                if not data:
+                    break
+                
+                watch.touch()
+                for frame in decoder.feed(data):
+                    if self.handle_control(frame, connection):
+                        continue
+                    if client_name is None:
+                        client_name, client_socket = self.accept_join(frame, connection, link.address)
+                        if client_name is None:
+                            return
+                        link.name, link.client = client_name, client_socket
+                        self.heartbeat.joined(watch)
+                    else:
+                        self.process_frame(client_name, frame, client_socket, limiter)
+                
+        except Exception as e:
+            print(f"[ERREUR] Client {client_name}: {e}")
+        finally:
+            self.heartbeat.release(watch)
+            self.links.discard(link)
+            self.connection_limiter.release()
+            if client_name:
+                self.client_disconnected(client_name, client_socket, connection)
+            
+            connection.close()
+            await connection.wait_closed()
+
+
+BACKENDS = {
+    'threads': ChatServer,
+    'asyncio': AsyncChatServer,
+}
 
 
 if __name__ == "__main__":
-    server = ChatServer(host='192.168.1.104', port=5555)
-    server.start()
+    parser = argparse.ArgumentParser(description="Serveur de chat multi-clients")
+    parser.add_argument('--host', default='192.168.1.104')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='threads',
+                        help="un thread par client, ou une boucle asyncio unique")
+    parser.add_argument('--queue-size', type=int, default=1024,
+                        help="taille de la file de sortie de chaque client")
+    parser.add_argument('--slow-policy', choices=POLICIES, default=DROP_OLDEST,
+                        help="que faire quand la file d'un client est pleine")
+    parser.add_argument('--block-timeout', type=float, default=1.0,
+                        help="attente maximale avec la politique 'block' (secondes)")
+    parser.add_argument('--coalesce-ms', type=float, default=0.0,
+                        help="fenêtre de regroupement des écritures par client (ms, 0 = aucune)")
+    parser.add_argument('--history-size', type=int, default=1000,
+                        help="messages gardés en mémoire par salon")
+    parser.add_argument('--history-dir', default=None,
+                        help="répertoire du journal de messages sur disque (désactivé par défaut)")
+    parser.add_argument('--replay', type=int, default=0,
+                        help="messages rejoués à l'arrivée dans un salon (0 = aucun)")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="nombre de processus partageant le port (SO_REUSEPORT), 0 = un seul")
+    parser.add_argument('--compression', action='store_true',
+                        help="proposer la compression zlib des trames aux clients")
+    parser.add_argument('--compress-threshold', type=int, default=protocol.COMPRESS_THRESHOLD,
+                        help="taille minimale (octets) d'une trame compressée")
+    parser.add_argument('--resume-timeout', type=float, default=30.0,
+                        help="délai de reprise d'une session après une coupure (secondes, 0 = désactivé)")
+    parser.add_argument('--session-buffer', type=int, default=SESSION_BUFFER,
+                        help="trames gardées par session pour être renvoyées à la reprise")
+    parser.add_argument('--ping-interval', type=float, default=15.0,
+                        help="silence (secondes) après lequel le serveur envoie un PING (0 = jamais)")
+    parser.add_argument('--idle-timeout', type=float, default=45.0,
+                        help="silence (secondes) après lequel une connexion est fermée (0 = jamais)")
+    parser.add_argument('--handshake-timeout', type=float, default=10.0,
+                        help="délai (secondes) pour envoyer JOIN après la connexion (0 = illimité)")
+    parser.add_argument('--backlog', type=int, default=128,
+                        help="connexions en attente d'acceptation (listen)")
+    parser.add_argument('--max-connections', type=int, default=1024,
+                        help="connexions simultanées au-delà desquelles le serveur refuse (0 = illimité)")
+    parser.add_argument('--message-rate', type=float, default=20.0,
+                        help="messages par seconde autorisés par client (0 = illimité)")
+    parser.add_argument('--message-burst', type=int, default=40,
+                        help="rafale de messages tolérée au-dessus du débit")
+    parser.add_argument('--byte-rate', type=int, default=65536,
+                        help="octets par seconde autorisés par client (0 = illimité)")
+    parser.add_argument('--byte-burst', type=int, default=262144,
+                        help="rafale d'octets tolérée au-dessus du débit")
+    parser.add_argument('--mailbox-size', type=int, default=MAILBOX_SIZE,
+                        help="messages privés gardés par client hors ligne (0 = désactivé)")
+    parser.add_argument('--mailbox-ttl', type=float, default=MAIL_TTL,
+                        help="durée de conservation d'un message non remis (secondes)")
+    parser.add_argument('--mailbox-memory', type=int, default=MEMORY_BUDGET,
+                        help="mémoire maximale des boîtes aux lettres (octets)")
+    parser.add_argument('--mailbox-dir', default=None,
+                        help="répertoire où les boîtes débordent sur disque (sinon refus au-delà de la mémoire)")
+    parser.add_argument('--lock-sample', type=int, default=1,
+                        help="chronométrer une acquisition de clients_lock sur N (1 = toutes)")
+    parser.add_argument('--lock-check-interval', type=float, default=1.0,
+                        help="attente (secondes) avant de chercher un interblocage sur un verrou")
+    parser.add_argument('--command-workers', type=int, default=COMMAND_WORKERS,
+                        help="threads exécutant les commandes lourdes (/history, /stats)")
+    parser.add_argument('--command-queue', type=int, default=COMMAND_QUEUE,
+                        help="commandes lourdes en attente au-delà desquelles le serveur refuse")
+    parser.add_argument('--federation-port', type=int, default=0,
+                        help="port où les autres nœuds se relient à celui-ci (0 = pas de fédération)")
+    parser.add_argument('--peer', action='append', default=[], metavar='HÔTE:PORT',
+                        help="nœud de la fédération à appeler au démarrage (répétable)")
+    parser.add_argument('--node-name', default=None, metavar='HÔTE:PORT',
+                        help="adresse de fédération annoncée aux autres nœuds (défaut: --host:--federation-port)")
+    parser.add_argument('--search-size', type=int, default=SEARCH_SIZE,
+                        help="messages récents indexés pour /search (0 = désactivé)")
+    parser.add_argument(TAKEOVER_OPTION, type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--admin', action='append', default=[], metavar='NOM',
+                        help="client autorisé à utiliser /stats (répétable); le nom seul ne suffit pas: "
+                             "il doit présenter --admin-token, ou se connecter depuis la machine locale "
+                             "si aucun jeton n'est configuré")
+    parser.add_argument('--admin-token', default=os.environ.get('CHAT_ADMIN_TOKEN'),
+                        help="secret que les administrateurs envoient dans JOIN (défaut: $CHAT_ADMIN_TOKEN); "
+                             "transmis en clair, à n'utiliser que sur un réseau de confiance")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="port HTTP local des métriques Prometheus (0 = désactivé)")
+    args = parser.parse_args()
+    
+    options = dict(queue_size=args.queue_size,
+                   slow_policy=args.slow_policy,
+                   block_timeout=args.block_timeout,
+                   coalesce_window=args.coalesce_ms / 1000,
+                   history_size=args.history_size,
+                   history_dir=args.history_dir,
+                   replay_count=args.replay,
+                   admins=args.admin,
+                   admin_token=args.admin_token,
+                   metrics_port=args.metrics_port,
+                   compression=args.compression,
+                   compress_threshold=args.compress_threshold,
+                   resume_timeout=args.resume_timeout,
+                   session_buffer=args.session_buffer,
+                   ping_interval=args.ping_interval,
+                   idle_timeout=args.idle_timeout,
+                   handshake_timeout=args.handshake_timeout,
+                   backlog=args.backlog,
+                   max_connections=args.max_connections,
+                   message_rate=args.message_rate,
+                   message_burst=args.message_burst,
+                   byte_rate=args.byte_rate,
+                   byte_burst=args.byte_burst,
+                   mailbox_dir=args.mailbox_dir,
+                   mailbox_ttl=args.mailbox_ttl,
+                   mailbox_size=args.mailbox_size,
+                   mailbox_memory=args.mailbox_memory,
+                   lock_sample=args.lock_sample,
+                   lock_check_interval=args.lock_check_interval,
+                   command_workers=args.command_workers,
+                   command_queue=args.command_queue,
+                   search_size=args.search_size)
+    
+    if args.shards and args.federation_port:
+        parser.error("--shards et --federation-port ne se combinent pas")
+    
+    if args.shards:
+        from shards import run_shards
+        run_shards(args.backend, args.shards, args.host, args.port, **options)
+    elif args.federation_port:
+        # Pas de relais à chaud: les liaisons avec les autres nœuds ne se transmettent pas
+        from federation import FEDERATED_BACKENDS
+        server = FEDERATED_BACKENDS[args.backend](host=args.host, port=args.port,
+                                                  federation_port=args.federation_port,
+                                                  peers=args.peer, node_name=args.node_name, **options)
+        server.start()
+    else:
+        server = BACKENDS[args.backend](host=args.host, port=args.port, **options)
+        # kill -USR2 <pid>: relais à chaud vers un nouveau processus, sans déconnecter personne
+        server.enable_hot_upgrade(sys.argv)
+        if args.takeover_fd is not None:
+            server.take_over(args.takeover_fd)
+        server.start()
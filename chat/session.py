@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Sessions reprenables
+
+Un client qui le demande (JOIN avec "session": true) reçoit un jeton de
+session. Tant que la session vit, toutes les trames qui lui sont destinées
+passent par elle et sont numérotées et gardées dans un tampon circulaire.
+Si la connexion TCP tombe, la session reste inscrite dans le chat pendant
+un délai de grâce; le client qui se reconnecte avec son jeton et le nombre
+de trames déjà reçues se voit renvoyer celles qu'il a manquées, et apprend
+combien de ses propres messages le serveur a traités.
+"""
+
+import secrets
+import threading
+from collections import deque
+
+SESSION_BUFFER = 1024
+
+
+class Session:
+    """Connexion logique d'un client, qui survit à une coupure du lien TCP
+
+    Expose send/sendall/close comme une connexion, si bien que ChatServer
+    l'enregistre dans clients à la place de la connexion elle-même.
+    """
+
+    def __init__(self, name, connection, buffer_size=SESSION_BUFFER):
+        self.name = name
+        self.token = secrets.token_hex(16)
+        self.connection = connection
+        # Dernières trames envoyées, pour les renvoyer après une reprise
+        self.replay = deque(maxlen=buffer_size)
+        # Trames envoyées au client / reçues du client depuis le début de la session
+        self.sent = 0
+        self.received = 0
+        # Vrai après /quit ou l'arrêt du serveur: la session ne sera pas gardée
+        self.ended = False
+        # Incrémenté à chaque détachement et reprise (invalide les expirations en cours)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        with self.lock:
+            self.sent += 1
+            self.replay.append(data)
+            if self.connection is not None:
+                try:
+                    self.connection.send(data)
+                except ConnectionError:
+                    # La connexion est perdue: le client rattrapera cette trame à la reprise
+                    pass
+        return len(data)
+
+    sendall = send
+
+    def attach(self, connection, received):
+        """Rattache une nouvelle connexion et lui renvoie les trames manquées
+
+        Renvoie (trames renvoyées, trames perdues car sorties du tampon).
+        """
+        with self.lock:
+            old = self.connection
+            missed = max(0, self.sent - received)
+            frames = list(self.replay)[-missed:] if missed else []
+            for data in frames:
+                connection.send(data)
+            self.connection = connection
+            self.generation += 1
+
+        if old is not None and old is not connection:
+            old.abort()
+        return len(frames), missed - len(frames)
+
+    def detach(self, connection):
+        """Détache la connexion fermée; False si une reprise l'a déjà remplacée"""
+        with self.lock:
+            if self.connection is not connection:
+                return False
+            self.connection = None
+            self.generation += 1
+            return True
+
+    def close(self):
+        self.ended = True
+        connection = self.connection
+        if connection is not None:
+            connection.close()
+
+    def abort(self):
+        connection = self.connection
+        if connection is not None:
+            connection.abort()
+
+    def queue_depth(self):
+        connection = self.connection
+        return connection.queue_depth() if connection is not None else 0
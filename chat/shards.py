@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Serveur de chat réparti sur plusieurs processus (un shard par cœur)
+
+Chaque shard est un serveur de chat complet qui écoute sur le même port
+grâce à SO_REUSEPORT: le noyau répartit les nouvelles connexions entre les
+processus. Les shards sont reliés par un bus local (une file
+multiprocessing par shard) et partagent un annuaire nom -> shard, si bien
+que broadcast, /to et /list portent sur l'ensemble des clients.
+
+L'annuaire du processus manager n'est consulté que pour réserver et libérer
+un nom (un seul arbitre garantit qu'il est unique). Chaque shard en garde
+une copie locale, ainsi que la taille des salons, tenues à jour par les
+événements du bus: /to, les avis, /list et /rooms ne font aucun aller-retour
+vers le manager (qui bloquerait la boucle asyncio et sérialiserait les shards).
+
+Une reprise de session (--resume-timeout) n'arrive pas forcément sur le shard
+qui tient la session: celui-ci la refuse avec WRONG_SHARD (et le numéro du
+bon shard), et client_lib réessaie aussitôt, sans attente exponentielle,
+jusqu'à tomber sur le bon shard.
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import zlib
+from multiprocessing.managers import SyncManager
+
+import protocol
+from serv import AsyncChatServer, ChatServer, format_duration
+
+# Refus d'une reprise de session arrivée sur un autre shard que le sien
+WRONG_SHARD = 'WRONG_SHARD'
+
+
+class ShardBus:
+    """Bus inter-processus et annuaire partagé entre les shards"""
+
+    def __init__(self, shard_count, manager):
+        self.shard_count = shard_count
+        # Une boîte de réception par shard
+        self.inboxes = [multiprocessing.Queue() for _ in range(shard_count)]
+        # Annuaire partagé {nom: numéro du shard}, arbitre des réservations
+        self.directory = manager.dict()
+
+    def claim(self, name, shard_id):
+        """Réserve un nom pour tout le réseau, False s'il est déjà pris"""
+        # setdefault s'exécute en une seule opération dans le processus manager
+        return self.directory.setdefault(name, shard_id) == shard_id
+
+    def release(self, name, shard_id):
+        # Seul le shard propriétaire libère un nom: pas de course possible
+        if self.directory.get(name) == shard_id:
+            self.directory.pop(name, None)
+
+    def send(self, shard_id, message):
+        self.inboxes[shard_id].put(message)
+
+    def publish(self, message, origin):
+        """Envoie un message à tous les shards sauf celui d'origine"""
+        for shard_id, inbox in enumerate(self.inboxes):
+            if shard_id != origin:
+                inbox.put(message)
+
+
+class ShardMixin:
+    """Ajoute à un serveur de chat la participation à un ensemble de shards"""
+
+    def __init__(self, *args, shard_id=0, bus=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_id = shard_id
+        self.bus = bus
+        # Copies locales, tenues à jour par le bus: {nom: shard} et {(salon, shard): membres}
+        self.directory = {}
+        self.room_table = {}
+        # Change à chaque mise à jour de l'annuaire local (cache de /list)
+        self.directory_version = 0
+        # Noms triés de tout le réseau pour /list, (seconde, noms)
+        self.network_listing = (None, ())
+        # Plusieurs processus écoutent sur le même port
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    def on_started(self):
+        super().on_started()
+        threading.Thread(target=self.listen_bus, daemon=True).start()
+
+    def listen_bus(self):
+        """Relaie localement les messages venus des autres shards"""
+        inbox = self.bus.inboxes[self.shard_id]
+        while True:
+            kind, *args = inbox.get()
+            if kind == 'claimed':
+                self.note_claimed(*args)
+            elif kind == 'released':
+                self.note_released(*args)
+            elif kind == 'room_count':
+                self.note_room_count(*args)
+            elif kind == 'broadcast':
+                self.call_soon(self.local_broadcast, *args)
+            elif kind == 'rooms':
+                self.call_soon(self.local_rooms_broadcast, *args)
+            elif kind == 'history':
+                self.call_soon(self.local_record_message, *args)
+            elif kind == 'private':
+                self.call_soon(self.receive_private, *args)
+            elif kind == 'notice':
+                self.call_soon(self.notify, *args)
+            elif kind == 'mail':
+                self.call_soon(self.store_mail, *args)
+            elif kind == 'mail_fetch':
+                self.call_soon(self.send_mailbox, *args)
+            elif kind == 'mail_batch':
+                self.call_soon(self.deliver_remote_mails, *args)
+            elif kind == 'mail_return':
+                self.call_soon(self.mailboxes.restore, *args)
+
+    # Annuaire local: les événements du bus d'un même shard arrivent dans l'ordre
+    
+    def note_claimed(self, name, shard_id):
+        self.directory[name] = shard_id
+        self.directory_version += 1
+    
+    def note_released(self, name, shard_id):
+        # Un nom déjà repris par un autre shard (événements croisés) n'est pas retiré
+        if self.directory.get(name) == shard_id:
+            del self.directory[name]
+            self.directory_version += 1
+    
+    def note_room_count(self, room, shard_id, count):
+        if count:
+            self.room_table[(room, shard_id)] = count
+        else:
+            self.room_table.pop((room, shard_id), None)
+    
+    def locate(self, name):
+        return self.directory.get(name)
+    
+    def redirect_resume(self, client_name, connection):
+        # SO_REUSEPORT répartit les reconnexions au hasard: la session est peut-être
+        # sur un autre shard, le client réessaie aussitôt au lieu d'ouvrir une session neuve
+        owner = self.locate(client_name)
+        if owner is None or owner == self.shard_id:
+            return False
+        protocol.send_json(connection, protocol.REJECT, {'reason': WRONG_SHARD, 'shard': owner})
+        connection.close()
+        return True
+    
+    def register_client(self, client_name, client_socket):
+        # Nom connu sur un autre shard: refus sans interroger le manager
+        owner = self.locate(client_name)
+        taken = owner is not None and owner != self.shard_id
+        if taken or not self.bus.claim(client_name, self.shard_id):
+            protocol.send_json(client_socket, protocol.REJECT, {'reason': 'NAME_TAKEN'})
+            client_socket.close()
+            return False
+        self.note_claimed(client_name, self.shard_id)
+        self.bus.publish(('claimed', client_name, self.shard_id), self.shard_id)
+        return super().register_client(client_name, client_socket)
+
+    def unregister_client(self, client_name):
+        self.release_name(client_name)
+        super().unregister_client(client_name)
+    
+    def release_name(self, client_name):
+        self.bus.release(client_name, self.shard_id)
+        self.note_released(client_name, self.shard_id)
+        self.bus.publish(('released', client_name, self.shard_id), self.shard_id)
+
+    def client_names(self):
+        return list(self.directory)
+    
+    def listing(self):
+        key = self.directory_version
+        if self.network_listing[0] != key:
+            self.network_listing = (key, tuple(sorted(list(self.directory))))
+        return self.network_listing
+
+    def broadcast(self, message, exclude=None):
+        self.local_broadcast(message, exclude)
+        self.bus.publish(('broadcast', message, exclude), self.shard_id)
+
+    def local_broadcast(self, message, exclude=None):
+        """Diffuse aux seuls clients de ce shard"""
+        super().broadcast(message, exclude)
+
+    def rooms_broadcast(self, rooms, message, exclude=None):
+        self.local_rooms_broadcast(rooms, message, exclude)
+        self.bus.publish(('rooms', tuple(rooms), message, exclude), self.shard_id)
+
+    def local_rooms_broadcast(self, rooms, message, exclude=None):
+        """Diffuse aux membres des salons présents sur ce shard"""
+        super().rooms_broadcast(rooms, message, exclude)
+
+    def on_room_changed(self, room):
+        super().on_room_changed(room)
+        with self.clients_lock:
+            count = len(self.rooms.get(room, ()))
+        self.note_room_count(room, self.shard_id, count)
+        self.bus.publish(('room_count', room, self.shard_id, count), self.shard_id)
+
+    def room_sizes(self):
+        sizes = {}
+        for (room, _), count in list(self.room_table.items()):
+            sizes[room] = sizes.get(room, 0) + count
+        return sizes
+
+    def record_message(self, room, sender, text, line):
+        # Chaque shard garde un historique complet du réseau
+        self.local_record_message(room, sender, text, line)
+        self.bus.publish(('history', room, sender, text, line), self.shard_id)
+
+    def local_record_message(self, room, sender, text, line):
+        super().record_message(room, sender, text, line)
+
+    def send_private_message(self, sender, recipient, message, sender_socket):
+        shard_id = self.locate(recipient)
+        if shard_id is None or shard_id == self.shard_id:
+            super().send_private_message(sender, recipient, message, sender_socket)
+            return
+
+        self.bus.send(shard_id, ('private', sender, recipient, message))
+        protocol.send_text(sender_socket, f"✓ Message privé envoyé à {recipient}\n")
+    
+    def receive_private(self, sender, recipient, message):
+        """Message privé venu d'un autre shard; si le destinataire est parti entre-temps,
+        il va dans sa boîte aux lettres et l'expéditeur est prévenu"""
+        if self.deliver_private(sender, recipient, message):
+            return
+        if not self.mailboxes:
+            self.notify(sender, f"❌ Impossible d'envoyer le message à {recipient}")
+            return
+        home = self.home_shard(recipient)
+        if home == self.shard_id:
+            self.store_mail(sender, recipient, message)
+        else:
+            self.bus.send(home, ('mail', sender, recipient, message))
+        self.notify(sender, f"📭 {recipient} s'est déconnecté entre-temps: message gardé "
+                            f"{format_duration(self.mailboxes.ttl)}, remis à sa prochaine connexion")
+
+    # Boîtes aux lettres: celle d'un nom vit toujours sur le même shard (son « domicile »),
+    # quel que soit le shard où le client se connecte
+    
+    def home_shard(self, name):
+        return zlib.crc32(name.encode('utf-8')) % self.bus.shard_count
+    
+    def leave_mail(self, sender, recipient, message, sender_socket):
+        home = self.home_shard(recipient)
+        if home == self.shard_id:
+            super().leave_mail(sender, recipient, message, sender_socket)
+            return
+        # Un refus éventuel revient à l'expéditeur sous forme d'avis
+        self.bus.send(home, ('mail', sender, recipient, message))
+        protocol.send_text(sender_socket, f"📭 {recipient} est hors ligne: message gardé "
+                                          f"{format_duration(self.mailboxes.ttl)}, remis à sa prochaine connexion\n")
+    
+    def store_mail(self, sender, recipient, message):
+        """Dépose dans une boîte de ce shard un message venu d'un autre"""
+        mail, error = self.mailboxes.put(recipient, sender, message)
+        if mail is None and sender is not None:
+            self.notify(sender, f"❌ Boîte aux lettres de {recipient} pleine: message non gardé")
+    
+    def deliver_mailbox(self, client_name, client_socket):
+        home = self.home_shard(client_name)
+        if home == self.shard_id:
+            super().deliver_mailbox(client_name, client_socket)
+        else:
+            self.bus.send(home, ('mail_fetch', client_name, self.shard_id))
+    
+    def send_mailbox(self, client_name, shard_id):
+        """Envoie le contenu d'une boîte au shard où son destinataire vient d'arriver"""
+        self.mailboxes.take(client_name, lambda mails: self.forward_mails(client_name, shard_id, mails))
+    
+    def forward_mails(self, client_name, shard_id, mails):
+        if mails:
+            self.bus.send(shard_id, ('mail_batch', client_name, mails))
+    
+    def deliver_remote_mails(self, client_name, mails):
+        client_socket = self.clients.get(client_name)
+        if client_socket is None:
+            # Reparti entre-temps: les messages retournent dans sa boîte
+            self.bus.send(self.home_shard(client_name), ('mail_return', [(client_name, mail) for mail in mails]))
+            return
+        self.deliver_mails(client_name, client_socket, mails)
+    
+    def notify(self, client_name, text):
+        shard_id = self.locate(client_name)
+        if shard_id is None:
+            shard_id = self.home_shard(client_name)
+            if shard_id != self.shard_id:
+                self.bus.send(shard_id, ('mail', None, client_name, text))
+                return
+        elif shard_id != self.shard_id:
+            self.bus.send(shard_id, ('notice', client_name, text))
+            return
+        super().notify(client_name, text)
+    
+    def shutdown(self):
+        for name in list(self.clients):
+            self.release_name(name)
+        return super().shutdown()
+
+
+class ShardedChatServer(ShardMixin, ChatServer):
+    """Shard utilisant un thread par client"""
+
+
+class AsyncShardedChatServer(ShardMixin, AsyncChatServer):
+    """Shard servant ses clients depuis une boucle asyncio"""
+
+
+SHARD_BACKENDS = {
+    'threads': ShardedChatServer,
+    'asyncio': AsyncShardedChatServer,
+}
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_shard(backend, shard_id, bus, host, port, options):
+    """Point d'entrée d'un processus shard"""
+    # L'arrêt est piloté par le processus parent (SIGTERM), une seule fois
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, interrupt)
+    print(f"[SHARD {shard_id}] PID {os.getpid()}")
+    if options.get('history_dir'):
+        # Un journal par shard: un seul écrivain par fichier
+        options = dict(options, history_dir=os.path.join(options['history_dir'], f"shard-{shard_id}"))
+    if options.get('mailbox_dir'):
+        options = dict(options, mailbox_dir=os.path.join(options['mailbox_dir'], f"shard-{shard_id}"))
+    if options.get('metrics_port'):
+        # Chaque shard expose ses propres métriques sur le port suivant
+        options = dict(options, metrics_port=options['metrics_port'] + shard_id)
+    server = SHARD_BACKENDS[backend](host=host, port=port, shard_id=shard_id, bus=bus, **options)
+    server.start()
+
+
+def run_shards(backend, shard_count, host, port, **options):
+    """Lance shard_count processus serveurs sur le même port et attend leur fin"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise SystemExit("❌ SO_REUSEPORT n'est pas disponible sur ce système")
+
+    # Le manager ignore Ctrl+C: il doit survivre aux shards qui s'arrêtent
+    manager = SyncManager()
+    manager.start(signal.signal, (signal.SIGINT, signal.SIG_IGN))
+    bus = ShardBus(shard_count, manager)
+
+    processes = [
+        multiprocessing.Process(target=run_shard,
+                                args=(backend, shard_id, bus, host, port, options))
+        for shard_id in range(shard_count)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n[SERVEUR] Arrêt des shards...")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    finally:
+        manager.shutdown()
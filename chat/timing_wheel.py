@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Roue de temporisation hiérarchique (Varghese & Lauck)
+
+Armer ou annuler un minuteur coûte O(1), quel que soit le nombre de
+minuteurs en attente: chacun est rangé dans la case de sa date
+d'expiration (arrondie au tick). Le premier niveau couvre les 256
+prochains ticks; les niveaux suivants, de plus en plus grossiers, sont
+redescendus d'un cran (cascade) à chaque tour complet du niveau inférieur.
+
+Avec un tick de 0,1 s: 25,6 s au niveau 0, 27 min au niveau 1, 29 h au
+niveau 2, 77 jours au niveau 3.
+"""
+
+import math
+import threading
+import time
+import traceback
+
+LEVEL0_BITS = 8
+LEVEL_BITS = 6
+LEVELS = 4
+DEFAULT_TICK = 0.1
+
+
+class Timer:
+    """Minuteur armé dans une roue; cancel() est O(1)"""
+
+    __slots__ = ('expires', 'callback', 'args', 'bucket', 'wheel')
+
+    def __init__(self, wheel, expires, callback, args):
+        self.wheel = wheel
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.bucket = None
+
+    def cancel(self):
+        with self.wheel.lock:
+            if self.bucket is not None:
+                self.bucket.discard(self)
+                self.bucket = None
+
+    def run(self):
+        self.callback(*self.args)
+
+
+class TimingWheel:
+    """Roue hiérarchique: 2**8 cases au premier niveau, 2**6 aux suivants"""
+
+    def __init__(self, tick=DEFAULT_TICK, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.origin = clock()
+        self.current = 0  # dernier tick traité
+        self.lock = threading.Lock()
+        self.levels = [[set() for _ in range(1 << LEVEL0_BITS)]]
+        self.levels += [[set() for _ in range(1 << LEVEL_BITS)] for _ in range(LEVELS - 1)]
+        self.stopped = threading.Event()
+
+    def schedule(self, delay, callback, *args):
+        """Arme un minuteur qui appellera callback(*args) dans `delay` secondes"""
+        with self.lock:
+            expires = self.current + max(1, math.ceil(delay / self.tick))
+            timer = Timer(self, expires, callback, args)
+            self._insert(timer)
+        return timer
+
+    def _insert(self, timer):
+        remaining = timer.expires - self.current
+        if remaining < 1 << LEVEL0_BITS:
+            bucket = self.levels[0][timer.expires & ((1 << LEVEL0_BITS) - 1)]
+        else:
+            for level in range(1, LEVELS):
+                shift = LEVEL0_BITS + LEVEL_BITS * (level - 1)
+                if remaining < 1 << (shift + LEVEL_BITS) or level == LEVELS - 1:
+                    break
+            # Au-delà du dernier niveau, le minuteur repasse par une cascade de plus
+            bucket = self.levels[level][(timer.expires >> shift) & ((1 << LEVEL_BITS) - 1)]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def _cascade(self, level, index):
+        """Redescend les minuteurs d'une case d'un niveau supérieur; renvoie l'indice"""
+        bucket = self.levels[level][index]
+        self.levels[level][index] = set()
+        for timer in bucket:
+            self._insert(timer)
+        return index
+
+    def advance(self, now=None):
+        """Fait avancer la roue jusqu'à `now` et renvoie les minuteurs expirés"""
+        target = int(((self.clock() if now is None else now) - self.origin) / self.tick)
+        due = []
+        with self.lock:
+            while self.current < target:
+                self.current += 1
+                tick = self.current
+                index = tick & ((1 << LEVEL0_BITS) - 1)
+                if index == 0:
+                    # Tour complet du niveau 0: cascade des niveaux supérieurs
+                    for level in range(1, LEVELS):
+                        shift = LEVEL0_BITS + LEVEL_BITS * (level - 1)
+                        if self._cascade(level, (tick >> shift) & ((1 << LEVEL_BITS) - 1)):
+                            break
+
+                bucket = self.levels[0][index]
+                self.levels[0][index] = set()
+                for timer in bucket:
+                    timer.bucket = None
+                due.extend(bucket)
+        return due
+
+    def run_due(self, now=None):
+        """Exécute les minuteurs expirés (une erreur n'arrête pas les suivants)"""
+        for timer in self.advance(now):
+            try:
+                timer.run()
+            except Exception:
+                traceback.print_exc()
+
+    def run_forever(self):
+        """Boucle d'un thread dédié: un passage par tick"""
+        while not self.stopped.wait(self.tick):
+            self.run_due()
+
+    def start_thread(self):
+        thread = threading.Thread(target=self.run_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stopped.set()
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(bucket) for level in self.levels for bucket in level)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Relais à chaud: remplacer le processus serveur sans déconnecter personne
+
+Sur SIGUSR2, le serveur en place démarre un nouveau processus (même
+commande, plus --takeover-fd) relié par une paire de sockets Unix. Il
+cesse de lire et d'accepter, vide ses écrivains, puis transmet au nouveau
+processus le socket d'écoute et chaque socket client (SCM_RIGHTS), avec
+l'état qui va avec: noms, salons, sessions, octets reçus mais pas encore
+décodés, trames pas encore envoyées. Une fois l'accusé de réception
+arrivé, l'ancien processus se termine sans fermer les connexions: les
+clients ne voient rien, hormis quelques millisecondes de latence.
+
+Le transfert utilise SOCK_SEQPACKET, qui garde les limites de messages:
+- b'F' + descripteurs (au plus FDS_PER_MESSAGE par message);
+- b'D' + un morceau de l'état JSON;
+- b'E' pour finir; le nouveau processus répond b'K'.
+"""
+
+import base64
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+TAKEOVER_OPTION = '--takeover-fd'
+# SCM_MAX_FD vaut 253 sous Linux
+FDS_PER_MESSAGE = 200
+CHUNK_SIZE = 32768
+
+FDS = b'F'
+DATA = b'D'
+END = b'E'
+ACK = b'K'
+
+
+class HotUpgrade(Exception):
+    """Levée dans la boucle d'acceptation par le gestionnaire de SIGUSR2"""
+
+
+class Link:
+    """Connexion vivante, avec ce qu'il faut pour la transmettre à un autre processus"""
+
+    __slots__ = ('connection', 'sock', 'decoder', 'address', 'name', 'client', 'parked', 'idle')
+
+    def __init__(self, connection, sock, decoder, address):
+        self.connection = connection
+        self.sock = sock
+        self.decoder = decoder
+        self.address = address
+        # Nom et connexion (ou session) une fois la poignée de main faite
+        self.name = None
+        self.client = None
+        # Le lecteur s'est arrêté pour le relais: plus rien ne sera lu de ce socket ici
+        self.parked = threading.Event()
+        # (asyncio) le lecteur attend des données, son tampon est vide
+        self.idle = False
+
+
+def encode_bytes(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_bytes(text):
+    return base64.b64decode(text)
+
+
+def successor_argv(argv):
+    """Ligne de commande du nouveau processus: la même, sans l'option de reprise"""
+    args = list(argv)
+    if TAKEOVER_OPTION in args:
+        position = args.index(TAKEOVER_OPTION)
+        del args[position:position + 2]
+    return args
+
+
+def spawn_successor(argv):
+    """Démarre le nouveau serveur; renvoie (socket de transfert, processus)"""
+    parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        # Mêmes options de l'interpréteur (-u...) que le processus courant
+        options = sys.orig_argv[1:len(sys.orig_argv) - len(sys.argv)]
+        command = [sys.executable, *options, *successor_argv(argv), TAKEOVER_OPTION, str(child.fileno())]
+        process = subprocess.Popen(command, pass_fds=[child.fileno()])
+    finally:
+        child.close()
+    return parent, process
+
+
+def send_state(channel, fds, state, timeout=10.0):
+    """Transmet les descripteurs puis l'état; True une fois l'accusé de réception reçu"""
+    channel.settimeout(timeout)
+    for start in range(0, len(fds), FDS_PER_MESSAGE):
+        socket.send_fds(channel, [FDS], fds[start:start + FDS_PER_MESSAGE])
+    data = json.dumps(state, ensure_ascii=False).encode('utf-8')
+    for start in range(0, len(data), CHUNK_SIZE):
+        channel.send(DATA + data[start:start + CHUNK_SIZE])
+    channel.send(END)
+    try:
+        return channel.recv(1) == ACK
+    except OSError:
+        return False
+
+
+def receive_state(fd):
+    """Côté nouveau processus: renvoie (descripteurs, état) reçus de l'ancien"""
+    channel = socket.socket(fileno=fd)
+    fds = []
+    chunks = []
+    try:
+        while True:
+            message, received, flags, _ = socket.recv_fds(channel, CHUNK_SIZE + 1, FDS_PER_MESSAGE)
+            fds += received
+            if not message:
+                raise ConnectionError("transfert interrompu par l'ancien processus")
+            if flags & socket.MSG_CTRUNC:
+                raise ConnectionError("descripteurs tronqués pendant le transfert")
+            if message[:1] == DATA:
+                chunks.append(message[1:])
+            elif message[:1] == END:
+                break
+        state = json.loads(b''.join(chunks).decode('utf-8'))
+        channel.send(ACK)
+    finally:
+        channel.close()
+    return fds, state
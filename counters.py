@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Compteurs partagés entre threads (et entre processus)
+
+race_condition.py montre le compteur non protégé qui perd des incréments,
+race_condition_verrou.py le corrige avec un seul verrou global. Ce verrou
+devient le goulot d'étranglement dès que beaucoup de threads comptent en
+même temps: ils font tous la queue devant le même verrou. Stratégies
+proposées, du plus simple au plus rapide:
+
+- LockedCounter: un verrou global (la version de race_condition_verrou.py);
+- StripedCounter: N cases, chacune avec son verrou; un thread écrit toujours
+  dans la même case, la lecture fait la somme;
+- LocalCounter: chaque thread accumule dans sa variable locale et verse le
+  total dans le compteur partagé tous les `flush_every` incréments (et à sa
+  fin); la lecture peut avoir un peu de retard sur les threads en cours;
+- SharedCounter: entre processus, une case par processus dans une mémoire
+  partagée (multiprocessing.Array), chaque case sur sa propre ligne de cache;
+- ProcessLockedCounter: entre processus, un multiprocessing.Value et son
+  verrou, la référence pour SharedCounter.
+
+Tous exposent increment(amount=1) et value(). bench_counters.py mesure leur
+débit et vérifie qu'aucun incrément n'est perdu.
+"""
+
+import multiprocessing
+import os
+import threading
+
+# Une ligne de cache = 64 octets = 8 entiers de 64 bits
+CACHE_LINE_SLOTS = 8
+
+# Protège la réservation des cases de SharedCounter; recréé dans chaque fils après un fork
+_claim_lock = threading.Lock()
+
+
+def _reinit_after_fork():
+    global _claim_lock
+    _claim_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+class UnsafeCounter:
+    """Sans verrou, comme race_condition.py: des incréments peuvent se perdre"""
+
+    def __init__(self):
+        self.count = 0
+
+    def increment(self, amount=1):
+        self.count += amount
+
+    def value(self):
+        return self.count
+
+
+class LockedCounter:
+    """Un seul verrou pour tout le compteur"""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def increment(self, amount=1):
+        with self.lock:
+            self.count += amount
+
+    def value(self):
+        with self.lock:
+            return self.count
+
+
+class StripedCounter:
+    """Compteur réparti sur plusieurs cases à verrou, pour limiter la contention"""
+
+    def __init__(self, stripes=None):
+        stripes = stripes or 4 * (os.cpu_count() or 1)
+        # Puissance de deux: l'indice se calcule avec un masque
+        self.size = 1 << (stripes - 1).bit_length()
+        self.mask = self.size - 1
+        self.counts = [0] * self.size
+        self.locks = [threading.Lock() for _ in range(self.size)]
+
+    def stripe(self):
+        # Les identifiants de thread sont des adresses alignées: on ignore les bits de poids faible
+        ident = threading.get_ident()
+        return (ident ^ (ident >> 12)) & self.mask
+
+    def increment(self, amount=1):
+        index = self.stripe()
+        with self.locks[index]:
+            self.counts[index] += amount
+
+    def value(self):
+        total = 0
+        for index in range(self.size):
+            with self.locks[index]:
+                total += self.counts[index]
+        return total
+
+
+class _Pending:
+    """Incréments pas encore versés par un thread; versés aussi à la fin du thread"""
+
+    __slots__ = ('counter', 'count')
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.count = 0
+
+    def __del__(self):
+        if self.count:
+            self.counter.merge(self)
+
+
+class LocalCounter:
+    """Accumulation locale à chaque thread, fusionnée périodiquement
+
+    value() est exact une fois les threads terminés (ou après leur flush());
+    pendant qu'ils comptent, il peut manquer au plus flush_every - 1 incréments
+    par thread en cours.
+    """
+
+    def __init__(self, flush_every=1024):
+        self.flush_every = flush_every
+        self.count = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def pending(self):
+        try:
+            return self.local.pending
+        except AttributeError:
+            pending = self.local.pending = _Pending(self)
+            return pending
+
+    def increment(self, amount=1):
+        pending = self.pending()
+        pending.count += amount
+        if pending.count >= self.flush_every:
+            self.merge(pending)
+
+    def merge(self, pending):
+        with self.lock:
+            self.count += pending.count
+        pending.count = 0
+
+    def flush(self):
+        """Verse tout de suite les incréments du thread appelant"""
+        pending = self.pending()
+        if pending.count:
+            self.merge(pending)
+
+    def value(self):
+        with self.lock:
+            return self.count
+
+
+class SharedCounter:
+    """Compteur partagé entre processus: une case par processus en mémoire partagée
+
+    Chaque processus réserve une case au premier incrément et n'écrit que
+    dans celle-là (les threads d'un même processus se la partagent sous un
+    verrou local). Au-delà de `slots` processus, les suivants écrivent tous
+    dans une case commune protégée par le verrou partagé.
+    À transmettre aux processus fils en argument de Process (ou par
+    l'initializer d'un Pool), comme tout objet de synchronisation, créé
+    dans le même contexte (`context`, fork ou spawn) que ces processus.
+    """
+
+    def __init__(self, slots=None, context=None):
+        context = context or multiprocessing.get_context()
+        self.slots = slots or 2 * (os.cpu_count() or 1)
+        # Case 0: débordement; chaque case sur sa propre ligne de cache
+        self.cells = context.Array('q', (self.slots + 1) * CACHE_LINE_SLOTS, lock=False)
+        self.next_slot = context.Value('i', 1, lock=False)
+        self.shared_lock = context.Lock()
+        self._reset_local()
+
+    def _reset_local(self):
+        self.owner = None
+        self.index = None
+        self.local_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('owner', 'index', 'local_lock'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_local()
+
+    def claim(self):
+        """Case du processus courant (une nouvelle après un fork)"""
+        with _claim_lock:
+            if self.owner != os.getpid():
+                # Le verrou local hérité du père a pu être copié verrouillé
+                self.local_lock = threading.Lock()
+                with self.shared_lock:
+                    slot = self.next_slot.value
+                    if slot <= self.slots:
+                        self.next_slot.value = slot + 1
+                    else:
+                        slot = 0
+                self.index = slot * CACHE_LINE_SLOTS
+                self.owner = os.getpid()
+            return self.index
+
+    def increment(self, amount=1):
+        index = self.index if self.owner == os.getpid() else self.claim()
+        if index:
+            with self.local_lock:
+                self.cells[index] += amount
+        else:
+            with self.shared_lock:
+                self.cells[0] += amount
+
+    def value(self):
+        cells = self.cells
+        return sum(cells[slot * CACHE_LINE_SLOTS] for slot in range(self.slots + 1))
+
+
+class ProcessLockedCounter:
+    """Entre processus, avec un seul verrou partagé (multiprocessing.Value)"""
+
+    def __init__(self, context=None):
+        context = context or multiprocessing.get_context()
+        self.count = context.Value('q', 0)
+
+    def increment(self, amount=1):
+        with self.count.get_lock():
+            self.count.value += amount
+
+    def value(self):
+        with self.count.get_lock():
+            return self.count.value
+
+
+STRATEGIES = {
+    'unsafe': UnsafeCounter,
+    'lock': LockedCounter,
+    'striped': StripedCounter,
+    'local': LocalCounter,
+    'shared': SharedCounter,
+    'process-lock': ProcessLockedCounter,
+}
+
+# Stratégies utilisables depuis plusieurs processus
+PROCESS_SAFE = ('shared', 'process-lock')
+
+
+def make_counter(strategy, **options):
+    """Crée un compteur d'après le nom de sa stratégie"""
+    try:
+        factory = STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(f"stratégie inconnue: {strategy}") from None
+    return factory(**options)
+
+
+def compteur(counter, iterations=100):
+    """L'exemple de race_condition.py, sur un compteur au choix"""
+    for _ in range(iterations):
+        counter.increment()
+
+
+if __name__ == "__main__":
+    for strategy in ('unsafe', 'lock', 'striped', 'local'):
+        counter = make_counter(strategy)
+        threads = [threading.Thread(target=compteur, args=(counter, 100000)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"{strategy:>8}: {counter.value()} (attendu: 500000)")
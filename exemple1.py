@@ -1,6 +1,8 @@
 import multiprocessing
 import time
 
+from warm_pool import WarmPool
+
 def calculs():
     result = 0  
     time.sleep(0.2)  # Simule un calcul intensif
@@ -29,4 +31,16 @@ if __name__ == "__main__":
     for p in processes:
         p.join()
     end_time = time.time()
-    print(f"Temps pris en multiprocessing: {end_time - start_time} secondes")
\ No newline at end of file
+    print(f"Temps pris en multiprocessing: {end_time - start_time} secondes")
+
+    print("Début exécution avec un pool au chaud (warm_pool.py)")
+
+    # Démarrage payé une fois: les processus servent ensuite à chaque lot
+    with WarmPool(workers=3) as pool:
+        pool.warm()
+        start_time = time.time()
+        taches = [pool.submit(calculs) for _ in range(3)]
+        for tache in taches:
+            tache.get()
+        end_time = time.time()
+    print(f"Temps pris avec le pool au chaud: {end_time - start_time} secondes")
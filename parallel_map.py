@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Map parallèle adaptatif: threads ou processus, découpage automatique, résultats en flux
+
+pool.py compare une compréhension de liste avec Pool(processes=8).map: nombre
+de processus écrit en dur, chunksize par défaut, et tous les résultats gardés
+en mémoire jusqu'à la fin. parallel_map():
+
+- calibre le coût d'une tâche sur les premiers éléments, exécutés sur place
+  (leurs résultats ne sont pas perdus): temps écoulé et temps CPU;
+- choisit le mode: sur place si le travail total est trop petit pour amortir
+  un pool, threads si la tâche attend plus qu'elle ne calcule (E/S, sleep: le
+  GIL est relâché), processus si elle calcule et qu'il y a plusieurs cœurs;
+- dimensionne le pool d'après os.cpu_count(): un processus par cœur, ou
+  cœurs × (1 + attente / calcul) threads;
+- règle chunksize pour qu'un lot dure environ target_chunk secondes, et le
+  réajuste au fil des lots d'après la latence mesurée par élément;
+- rend les résultats au fil de l'eau (générateur), dans l'ordre ou non, avec
+  au plus max_in_flight lots soumis et pas encore rendus: la mémoire reste
+  bornée, même sur un itérable sans fin.
+"""
+
+import itertools
+import math
+import multiprocessing
+import operator
+import os
+import pickle
+import queue
+import time
+from multiprocessing.pool import ThreadPool
+
+AUTO = 'auto'
+INLINE = 'inline'
+THREADS = 'threads'
+PROCESSES = 'processes'
+MODES = (AUTO, INLINE, THREADS, PROCESSES)
+
+# Calibration: au plus tant d'éléments, ou tant de secondes (au moins un élément)
+CALIBRATION_ITEMS = 8
+CALIBRATION_SECONDS = 0.05
+# Durée visée pour un lot (secondes), et taille maximale d'un lot
+TARGET_CHUNK_SECONDS = 0.02
+MAX_CHUNK = 10000
+# Travail total (secondes) en dessous duquel tout est fait sur place
+INLINE_MAX_WORK = 0.01
+# Travail total (secondes) nécessaire pour amortir le démarrage des processus
+PROCESS_MIN_WORK = 0.5
+# Part de temps CPU au-delà de laquelle une tâche est considérée comme du calcul
+CPU_BOUND_RATIO = 0.5
+MAX_THREADS = 64
+# Poids d'une nouvelle mesure dans la moyenne mobile de la latence par élément
+SMOOTHING = 0.3
+
+
+def run_chunk(func, items):
+    """Exécuté par un travailleur: applique func au lot et mesure sa durée"""
+    start = time.perf_counter()
+    results = [func(item) for item in items]
+    return results, time.perf_counter() - start
+
+
+def picklable(func):
+    """Vrai si func peut être envoyée à un autre processus (pas une lambda, par exemple)"""
+    try:
+        pickle.dumps(func)
+    except Exception:
+        return False
+    return True
+
+
+class Calibration:
+    """Coût mesuré des premiers éléments, exécutés sur place"""
+
+    __slots__ = ('items', 'wall', 'cpu')
+
+    def __init__(self):
+        self.items = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def add(self, wall, cpu):
+        self.items += 1
+        self.wall += wall
+        self.cpu += cpu
+
+    @property
+    def per_item(self):
+        return self.wall / self.items if self.items else 0.0
+
+    @property
+    def cpu_ratio(self):
+        """Part du temps passée à calculer (1.0) plutôt qu'à attendre (0.0)"""
+        return min(1.0, self.cpu / self.wall) if self.wall else 1.0
+
+
+class Plan:
+    """Décision du moteur pour un appel à map()"""
+
+    __slots__ = ('mode', 'workers', 'chunksize', 'per_item', 'cpu_ratio', 'chunks')
+
+    def __init__(self, mode, workers, chunksize, per_item, cpu_ratio):
+        self.mode = mode
+        self.workers = workers
+        # Taille du premier lot (elle s'ajuste ensuite)
+        self.chunksize = chunksize
+        self.per_item = per_item
+        self.cpu_ratio = cpu_ratio
+        self.chunks = 0
+
+    def __repr__(self):
+        return (f"Plan({self.mode}, {self.workers} travailleur(s), lots de {self.chunksize}, "
+                f"{self.per_item * 1e3:.3f} ms/élément, CPU {self.cpu_ratio:.0%})")
+
+
+class ParallelMap:
+    """Moteur de map parallèle; les pools sont gardés d'un appel à l'autre jusqu'à close()"""
+
+    def __init__(self, mode=AUTO, workers=None, chunksize=None, max_in_flight=None,
+                 target_chunk=TARGET_CHUNK_SECONDS, calibration=CALIBRATION_SECONDS):
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu: {mode}")
+        self.mode = mode
+        # None = choisis d'après os.cpu_count() et la calibration
+        self.workers = workers
+        self.chunksize = chunksize
+        self.max_in_flight = max_in_flight
+        self.target_chunk = target_chunk
+        self.calibration = calibration
+        self.pools = {}
+        # Plan du dernier appel à map() (pour les bancs et le débogage)
+        self.last_plan = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self, wait=True):
+        """Arrête les pools; sans wait, les lots encore en cours sont abandonnés"""
+        pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            if wait:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+
+    def pool(self, mode, workers):
+        key = (mode, workers)
+        if key not in self.pools:
+            self.pools[key] = (multiprocessing.Pool if mode == PROCESSES else ThreadPool)(workers)
+        return self.pools[key]
+
+    def plan(self, func, calibration, remaining):
+        """Choisit le mode et le nombre de travailleurs d'après la calibration"""
+        cpus = os.cpu_count() or 1
+        per_item = calibration.per_item
+        cpu_ratio = calibration.cpu_ratio
+        work = per_item * remaining if remaining is not None else math.inf
+
+        mode = self.mode
+        if mode == AUTO:
+            if work < INLINE_MAX_WORK:
+                mode = INLINE
+            elif cpu_ratio < CPU_BOUND_RATIO:
+                mode = THREADS
+            elif cpus > 1 and work >= PROCESS_MIN_WORK and picklable(func):
+                mode = PROCESSES
+            else:
+                # Calcul pur sur un seul cœur (ou trop court, ou func non transmissible):
+                # des threads ne feraient qu'ajouter des changements de contexte sous le GIL
+                mode = INLINE
+
+        workers = self.workers
+        if workers is None:
+            if mode == PROCESSES:
+                workers = cpus
+            elif mode == THREADS:
+                # Loi de Goetz: cœurs × (1 + attente / calcul)
+                waiting = (1 - cpu_ratio) / max(cpu_ratio, 0.01)
+                workers = min(MAX_THREADS, max(2, round(cpus * (1 + waiting))))
+            else:
+                workers = 1
+        if remaining is not None:
+            workers = max(1, min(workers, remaining))
+
+        return Plan(mode, workers, self.chunk_size(per_item, workers, remaining), per_item, cpu_ratio)
+
+    def chunk_size(self, per_item, workers, remaining):
+        """Assez d'éléments pour qu'un lot dure target_chunk, mais au moins ~4 lots par travailleur"""
+        if self.chunksize:
+            return self.chunksize
+        size = int(self.target_chunk / per_item) if per_item > 0 else MAX_CHUNK
+        if remaining is not None:
+            size = min(size, math.ceil(remaining / (4 * workers)))
+        return max(1, min(size, MAX_CHUNK))
+
+    def map(self, func, iterable, ordered=True):
+        """Générateur des func(élément), dans l'ordre de l'itérable si ordered"""
+        remaining = operator.length_hint(iterable, -1)
+        remaining = remaining if remaining >= 0 else None
+        iterator = iter(iterable)
+
+        # Calibration sur place: les premiers résultats sont rendus tout de suite
+        calibration = Calibration()
+        while calibration.items < CALIBRATION_ITEMS and (not calibration.items or
+                                                          calibration.wall < self.calibration):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            wall, cpu = time.perf_counter(), time.thread_time()
+            result = func(item)
+            calibration.add(time.perf_counter() - wall, time.thread_time() - cpu)
+            yield result
+        if remaining is not None:
+            remaining = max(0, remaining - calibration.items)
+
+        plan = self.last_plan = self.plan(func, calibration, remaining)
+        if plan.mode == INLINE:
+            for item in iterator:
+                yield func(item)
+            return
+
+        yield from self.stream(func, iterator, plan, remaining, ordered)
+
+    def stream(self, func, iterator, plan, remaining, ordered):
+        pool = self.pool(plan.mode, plan.workers)
+        max_in_flight = self.max_in_flight or 2 * plan.workers
+        per_item = plan.per_item
+        # Résultats des lots, déposés par le thread de rappel du pool
+        done = queue.Queue()
+        submitted = 0
+        in_flight = 0
+        exhausted = False
+        # ordered: lots terminés en avance, en attente de leur tour
+        early = {}
+        next_index = 0
+
+        while True:
+            while not exhausted and in_flight < max_in_flight:
+                size = self.chunk_size(per_item, plan.workers, remaining)
+                chunk = list(itertools.islice(iterator, size))
+                if not chunk:
+                    exhausted = True
+                    break
+                if remaining is not None:
+                    remaining = max(0, remaining - len(chunk))
+                pool.apply_async(run_chunk, (func, chunk),
+                                 callback=lambda result, index=submitted, count=len(chunk):
+                                     done.put((index, count, result, None)),
+                                 error_callback=lambda error, index=submitted: done.put((index, 0, None, error)))
+                submitted += 1
+                in_flight += 1
+            if not in_flight:
+                return
+
+            index, count, result, error = done.get()
+            if error is not None:
+                raise error
+            results, elapsed = result
+            plan.chunks += 1
+            per_item += SMOOTHING * (elapsed / count - per_item)
+
+            if not ordered:
+                in_flight -= 1
+                yield from results
+                continue
+            early[index] = results
+            while next_index in early:
+                # Un lot rendu libère sa place: la mémoire reste bornée à max_in_flight lots
+                in_flight -= 1
+                yield from early.pop(next_index)
+                next_index += 1
+
+
+def parallel_map(func, iterable, ordered=True, **options):
+    """Comme map(func, iterable), en parallèle et en flux (options: voir ParallelMap)"""
+    engine = ParallelMap(**options)
+    try:
+        yield from engine.map(func, iterable, ordered)
+    finally:
+        # Générateur abandonné ou erreur: inutile d'attendre les lots encore en cours
+        engine.close(wait=False)
+
+
+def calcul_carre(n):
+    """Calcule le carré d'un nombre (comme pool.py)."""
+    time.sleep(0.1)
+    return n * n
+
+
+if __name__ == "__main__":
+    debut = time.time()
+    with ParallelMap() as engine:
+        resultats = list(engine.map(calcul_carre, range(1, 41)))
+        print(f"{engine.last_plan}")
+    print(f"Temps: {time.time() - debut:.2f}s pour 40 éléments de 0.1s")
+    print(f"Résultats: {resultats[:10]}...")
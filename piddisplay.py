@@ -2,6 +2,8 @@ import os
 import multiprocessing
 import threading
 
+from warm_pool import WarmPool
+
 def display_pidThread():
     print(f"PID dans [thread]: {os.getpid()}")
 
@@ -22,3 +24,8 @@ if __name__ == "__main__":
     process2 = multiprocessing.Process(target=display_pidProcess)
     process2.start()
     process2.join()
+
+    # Pool au chaud: le même processus exécute les deux tâches (même PID)
+    with WarmPool(workers=1) as pool:
+        pool.run(display_pidProcess)
+        pool.run(display_pidProcess)
@@ -1,6 +1,8 @@
 from multiprocessing import Pool
 import time
 
+from parallel_map import ParallelMap
+
 def calcul_carre(n):
     """Calcule le carré d'un nombre."""
     time.sleep(0.1)  # Simule un calcul
@@ -23,4 +25,14 @@ if __name__ == "__main__":
     print(f"Temps: {temps_par:.2f}s")
     print(f"Accélération: {temps_seq/temps_par:.2f}x")
     
+    print("\nCalcul parallèle adaptatif (parallel_map.py)...")
+    debut = time.time()
+    with ParallelMap() as moteur:
+        # Résultats rendus au fil de l'eau, dans l'ordre
+        resultats_adapt = list(moteur.map(calcul_carre, nombres))
+        print(f"Choix: {moteur.last_plan}")
+    temps_adapt = time.time() - debut
+    print(f"Temps: {temps_adapt:.2f}s")
+    print(f"Accélération: {temps_seq/temps_adapt:.2f}x")
+    
     print(f"\nRésultats: {resultats_par}")
\ No newline at end of file
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Canal entre processus sur un tampon circulaire en mémoire partagée
+
+pipes.py échange des messages avec multiprocessing.Pipe: chaque objet est
+picklé, puis copié deux fois par le noyau (écriture, lecture), avec un appel
+système de chaque côté. RingChannel pose un tampon circulaire dans un
+segment multiprocessing.shared_memory:
+
+- l'émetteur copie le message une seule fois, directement dans le segment,
+  puis publie sa nouvelle position d'écriture (head);
+- le récepteur lit sur place: recv_view() rend une memoryview sur le
+  segment, sans copie (np.frombuffer(view, dtype) pour un tableau NumPy);
+  la place n'est rendue à l'émetteur qu'au recv suivant (ou à release());
+- send_many()/recv_many() traitent un lot en ne publiant les positions
+  qu'une fois;
+- en mode bloquant, chacun tourne un peu puis s'endort sur un sémaphore
+  que l'autre ne réveille que s'il sait qu'on l'attend; block=False lève
+  queue.Full / queue.Empty comme multiprocessing.Queue.
+
+Un seul récepteur; un seul émetteur, ou plusieurs avec multi_producer=True
+(ils se relaient alors sous un verrou partagé).
+
+Format: chaque message est précédé de sa longueur (4 octets) et aligné sur
+8 octets; un message qui ne tient pas avant la fin du tampon est précédé
+d'un marqueur de bouclage et écrit au début. Les positions head et tail
+sont des compteurs d'octets qui ne font que croître, chacun sur sa ligne de
+cache et écrit par un seul côté. Sans barrière mémoire en Python, l'ordre
+des écritures repose sur celui du processeur (x86-64: stores dans l'ordre).
+"""
+
+import ctypes
+import multiprocessing
+import os
+import pickle
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+# En-tête: chaque compteur sur sa propre ligne de cache
+HEAD = 0
+TAIL = 64
+CLOSED = 128
+READER_WAITING = 136
+WRITER_WAITING = 144
+HEADER_SIZE = 192
+
+LENGTH = struct.Struct('<I')
+WRAP = 0xFFFFFFFF
+ALIGN = 8
+
+DEFAULT_CAPACITY = 1 << 20
+# Tours d'attente active avant de s'endormir, et durée d'un somme (secondes)
+SPIN = 64
+WAIT_SLICE = 0.01
+
+
+def record_size(length):
+    return (LENGTH.size + length + ALIGN - 1) & ~(ALIGN - 1)
+
+
+class RingChannel:
+    """Canal à un récepteur sur un tampon circulaire en mémoire partagée
+
+    À transmettre aux processus fils en argument de Process, comme un Pipe.
+    Le créateur appelle unlink() une fois le canal devenu inutile.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, multi_producer=False, context=None):
+        context = context or multiprocessing.get_context()
+        # Capacité multiple de l'alignement: un message ne dépasse jamais la moitié
+        self.capacity = capacity - capacity % ALIGN
+        self.max_message = self.capacity // 2 - ALIGN
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + self.capacity)
+        self.shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        self.owner = os.getpid()
+        # Sonnettes: « il y a des messages » et « il y a de la place »
+        self.readable = context.Semaphore(0)
+        self.writable = context.Semaphore(0)
+        self.producer_lock = context.Lock() if multi_producer else None
+        self._attach()
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'capacity': self.capacity, 'owner': self.owner,
+                'readable': self.readable, 'writable': self.writable,
+                'producer_lock': self.producer_lock}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.max_message = self.capacity // 2 - ALIGN
+        self.owner = state['owner']
+        self.readable = state['readable']
+        self.writable = state['writable']
+        self.producer_lock = state['producer_lock']
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self._attach()
+
+    def _attach(self):
+        buf = self.shm.buf
+        self.data = buf[HEADER_SIZE:HEADER_SIZE + self.capacity]
+        self.head = ctypes.c_uint64.from_buffer(buf, HEAD)
+        self.tail = ctypes.c_uint64.from_buffer(buf, TAIL)
+        self.closed = ctypes.c_uint64.from_buffer(buf, CLOSED)
+        self.reader_waiting = ctypes.c_uint64.from_buffer(buf, READER_WAITING)
+        self.writer_waiting = ctypes.c_uint64.from_buffer(buf, WRITER_WAITING)
+        # Positions locales: ce qui a été lu mais pas encore rendu (recv_view)
+        self.read_position = self.tail.value
+        self.attached = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+        if os.getpid() == self.owner:
+            self.unlink()
+
+    # Émission
+
+    def send_bytes(self, data, block=True, timeout=None):
+        """Copie un message (bytes, bytearray, memoryview, tableau NumPy...) dans le tampon"""
+        self.send_many((data,), block, timeout)
+
+    def send(self, obj, block=True, timeout=None):
+        """Comme Pipe.send: l'objet est picklé"""
+        self.send_bytes(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), block, timeout)
+
+    def send_many(self, buffers, block=True, timeout=None):
+        """Écrit plusieurs messages; head n'est publié qu'à la fin (ou avant d'attendre)"""
+        if self.producer_lock:
+            with self.producer_lock:
+                self._send_many(buffers, block, timeout)
+        else:
+            self._send_many(buffers, block, timeout)
+
+    def _send_many(self, buffers, block, timeout):
+        if self.closed.value:
+            raise BrokenPipeError("canal fermé")
+        capacity = self.capacity
+        data = self.data
+        head = published = self.head.value
+        # Place libre connue sans relire tail (qui ne peut que croître)
+        free = capacity - (head - self.tail.value)
+        deadline = None
+        try:
+            for buffer in buffers:
+                if not isinstance(buffer, (bytes, bytearray)):
+                    buffer = memoryview(buffer).cast('B')
+                length = len(buffer)
+                if length > self.max_message:
+                    raise ValueError(f"message de {length} octets: au plus {self.max_message} "
+                                     f"pour un tampon de {capacity}")
+                size = (LENGTH.size + length + ALIGN - 1) & ~(ALIGN - 1)
+                offset = head % capacity
+                # Pas assez de place avant la fin: marqueur de bouclage, puis écriture au début
+                padding = capacity - offset if offset + size > capacity else 0
+
+                if free < padding + size:
+                    if head != published:
+                        self._publish(head)
+                        published = head
+                    if deadline is None and timeout is not None:
+                        deadline = time.monotonic() + timeout
+                    free = self._wait_for_room(head, padding + size, block, deadline)
+
+                if padding:
+                    LENGTH.pack_into(data, offset, WRAP)
+                    offset = 0
+                LENGTH.pack_into(data, offset, length)
+                data[offset + LENGTH.size:offset + LENGTH.size + length] = buffer
+                head += padding + size
+                free -= padding + size
+        finally:
+            if head != published:
+                self._publish(head)
+
+    def _publish(self, head):
+        self.head.value = head
+        if self.reader_waiting.value:
+            self.reader_waiting.value = 0
+            self.readable.release()
+
+    def _wait_for_room(self, head, needed, block, deadline):
+        """Attend que le récepteur libère `needed` octets; renvoie la place libre"""
+        capacity = self.capacity
+        spins = 0
+        while True:
+            free = capacity - (head - self.tail.value)
+            if free >= needed:
+                return free
+            if not block:
+                raise queue.Full
+            if spins < SPIN:
+                spins += 1
+                os.sched_yield()
+                continue
+            self.writer_waiting.value = 1
+            # Revérifier après s'être annoncé: le récepteur a pu libérer entre-temps
+            if capacity - (head - self.tail.value) >= needed:
+                continue
+            wait = WAIT_SLICE
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Full
+            self.writable.acquire(timeout=wait)
+
+    # Réception
+
+    def recv_view(self, block=True, timeout=None):
+        """Prochain message, sans copie; valable jusqu'au recv suivant ou à release()"""
+        self.release()
+        position = self.read_position
+        if self.head.value == position:
+            self._wait_for_data(position, block, timeout)
+        data = self.data
+        offset = position % self.capacity
+        (length,) = LENGTH.unpack_from(data, offset)
+        if length == WRAP:
+            # Le marqueur et le message qui le suit sont publiés ensemble
+            position += self.capacity - offset
+            offset = 0
+            (length,) = LENGTH.unpack_from(data, 0)
+        self.read_position = position + record_size(length)
+        start = offset + LENGTH.size
+        return data[start:start + length]
+
+    def recv_bytes(self, block=True, timeout=None):
+        return bytes(self.recv_view(block, timeout))
+
+    def recv(self, block=True, timeout=None):
+        """Comme Pipe.recv: l'objet est dépicklé"""
+        return pickle.loads(self.recv_view(block, timeout))
+
+    def recv_many(self, max_items=64, block=True, timeout=None, copy=True):
+        """Jusqu'à max_items messages déjà arrivés (au moins un en mode bloquant)
+
+        Avec copy=False, des memoryview sur le tampon, valables jusqu'au recv suivant.
+        """
+        self.release()
+        position = self.read_position
+        head = self.head.value
+        if head == position:
+            head = self._wait_for_data(position, block, timeout)
+
+        capacity = self.capacity
+        data = self.data
+        messages = []
+        while position != head and len(messages) < max_items:
+            offset = position % capacity
+            (length,) = LENGTH.unpack_from(data, offset)
+            if length == WRAP:
+                position += capacity - offset
+                continue
+            start = offset + LENGTH.size
+            view = data[start:start + length]
+            messages.append(bytes(view) if copy else view)
+            position += record_size(length)
+
+        self.read_position = position
+        if copy:
+            self.release()
+        return messages
+
+    def release(self):
+        """Rend à l'émetteur la place des messages déjà lus"""
+        position = self.read_position
+        if self.tail.value != position:
+            self.tail.value = position
+            if self.writer_waiting.value:
+                self.writer_waiting.value = 0
+                self.writable.release()
+
+    def _wait_for_data(self, position, block, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        spins = 0
+        while True:
+            head = self.head.value
+            if head != position:
+                return head
+            if self.closed.value:
+                raise EOFError("canal fermé par l'émetteur")
+            if not block:
+                raise queue.Empty
+            if spins < SPIN:
+                spins += 1
+                os.sched_yield()
+                continue
+            self.reader_waiting.value = 1
+            if self.head.value != position:
+                continue
+            wait = WAIT_SLICE
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Empty
+            self.readable.acquire(timeout=wait)
+
+    def poll(self, timeout=0.0):
+        """Vrai si un message est disponible (comme Connection.poll)"""
+        try:
+            self._wait_for_data(self.read_position, timeout != 0, timeout)
+        except (queue.Empty, EOFError):
+            return False
+        return True
+
+    # Fin de vie
+
+    def close(self):
+        """Côté émetteur: plus de messages; le récepteur reçoit EOFError une fois le tampon vidé"""
+        self.closed.value = 1
+        self.readable.release()
+
+    def detach(self):
+        """Libère la projection locale
+
+        Lève BufferError tant que des memoryview rendues par recv_view() sont vivantes.
+        """
+        if not self.attached:
+            return
+        if self.data is not None:
+            for name in ('head', 'tail', 'closed', 'reader_waiting', 'writer_waiting'):
+                setattr(self, name, None)
+            self.data.release()
+            self.data = None
+        self.shm.close()
+        self.attached = False
+
+    def unlink(self):
+        """Détruit le segment (créateur seulement)"""
+        self.shm.unlink()
+
+
+def consommateur(channel):
+    """Comme processus_enfant dans pipes.py"""
+    message = channel.recv()
+    print(message)
+    channel.detach()
+
+
+if __name__ == "__main__":
+    with RingChannel(capacity=4096) as channel:
+        p = multiprocessing.Process(target=consommateur, args=(channel,))
+        p.start()
+        channel.send(f"message du parent PID {os.getpid()}")
+        p.join()
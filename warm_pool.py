@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Pool de processus gardés au chaud, démarrés par un forkserver préchargé
+
+exemple1.py et piddisplay.py créent un multiprocessing.Process par tâche:
+chaque tâche paie le démarrage d'un interpréteur (spawn) ou d'une copie du
+parent (fork), puis ses propres imports. Pour des tâches courtes, ce coût
+dépasse le travail lui-même. WarmPool:
+
+- démarre ses processus avec la méthode forkserver: un serveur, lancé une
+  fois, importe les modules de `preload`, puis chaque travailleur est un fork
+  de ce serveur (rapide, et sans hériter des threads ni des sockets du
+  parent, contrairement à fork);
+- garde les travailleurs d'un lot de tâches à l'autre, jusqu'à close();
+- recycle un travailleur après max_tasks tâches (maxtasksperchild de Pool),
+  pour borner la mémoire qu'il accumule (caches, fuites);
+- retombe sur spawn là où forkserver n'existe pas (Windows, macOS ancien):
+  les modules de `preload` sont alors importés par chaque travailleur.
+
+Le préchargement vaut pour tout le forkserver du processus: il n'est pris en
+compte que si le serveur n'a pas encore démarré (premier WarmPool, premier
+Process en forkserver).
+"""
+
+import importlib
+import multiprocessing
+import os
+import time
+
+DEFAULT_MAX_TASKS = 100
+# Durée d'une tâche de warm() (secondes)
+WARM_DELAY = 0.05
+
+
+def preload_modules(modules):
+    """Initialiseur des travailleurs: sans effet si le forkserver les a déjà importés"""
+    for name in modules:
+        importlib.import_module(name)
+
+
+def call(func, args, kwargs):
+    """Exécuté par un travailleur: rend aussi son PID, pour suivre le recyclage"""
+    return os.getpid(), func(*args, **kwargs)
+
+
+def ping(delay):
+    """Tâche vide: occupe le travailleur assez longtemps pour que chacun en reçoive une"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def call_many(func, items):
+    return os.getpid(), [func(item) for item in items]
+
+
+def start_method():
+    """forkserver si la plateforme le permet, spawn sinon"""
+    methods = multiprocessing.get_all_start_methods()
+    return 'forkserver' if 'forkserver' in methods else 'spawn'
+
+
+class WarmPool:
+    """Processus réutilisés d'un lot de tâches à l'autre, jusqu'à close()"""
+
+    def __init__(self, workers=None, preload=(), max_tasks=DEFAULT_MAX_TASKS, method=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.preload = tuple(preload)
+        self.max_tasks = max_tasks
+        self.method = method or start_method()
+        context = multiprocessing.get_context(self.method)
+        if self.method == 'forkserver' and self.preload:
+            context.set_forkserver_preload(list(self.preload))
+        self.pool = context.Pool(self.workers, initializer=preload_modules, initargs=(self.preload,),
+                                 maxtasksperchild=max_tasks)
+        # PID de chaque travailleur ayant exécuté au moins une tâche
+        self.pids = set()
+        self.tasks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self, wait=True):
+        """Arrête les travailleurs; sans wait, les tâches encore en cours sont abandonnées"""
+        if wait:
+            self.pool.close()
+        else:
+            self.pool.terminate()
+        self.pool.join()
+
+    def warm(self):
+        """Attend que chaque travailleur ait démarré et réponde; renvoie leurs PID"""
+        started = time.perf_counter()
+        pids = set(self.map(ping, [WARM_DELAY] * self.workers, chunksize=1))
+        return pids, time.perf_counter() - started
+
+    def submit(self, func, *args, **kwargs):
+        """Comme Pool.apply_async; result.get() rend le résultat de func"""
+        return Result(self, self.pool.apply_async(call, (func, args, kwargs)))
+
+    def run(self, func, *args, **kwargs):
+        return self.submit(func, *args, **kwargs).get()
+
+    def map(self, func, items, chunksize=None):
+        """Comme Pool.map: résultats dans l'ordre de items"""
+        items = list(items)
+        if chunksize is None:
+            chunksize = max(1, len(items) // (4 * self.workers))
+        tasks = [(func, items[start:start + chunksize]) for start in range(0, len(items), chunksize)]
+        results = []
+        for pid, chunk in self.pool.starmap(call_many, tasks, chunksize=1):
+            self.pids.add(pid)
+            results.extend(chunk)
+        self.tasks += len(tasks)
+        return results
+
+    @property
+    def recycled(self):
+        """Travailleurs remplacés après max_tasks tâches (ou morts) depuis le démarrage"""
+        return max(0, len(self.pids) - self.workers)
+
+    def __repr__(self):
+        return (f"WarmPool({self.method}, {self.workers} travailleur(s), "
+                f"recyclés après {self.max_tasks} tâches, préchargés: {', '.join(self.preload) or 'aucun'})")
+
+
+class Result:
+    """Résultat d'une tâche soumise; note le PID du travailleur qui l'a exécutée"""
+
+    def __init__(self, pool, async_result):
+        self.warm_pool = pool
+        self.async_result = async_result
+
+    def ready(self):
+        return self.async_result.ready()
+
+    def get(self, timeout=None):
+        pid, result = self.async_result.get(timeout)
+        self.warm_pool.pids.add(pid)
+        self.warm_pool.tasks += 1
+        return result
+
+
+def calculs():
+    """Comme dans exemple1.py"""
+    result = 0
+    time.sleep(0.2)
+    for i in range(1, 1001):
+        result += i
+    return result
+
+
+if __name__ == "__main__":
+    with WarmPool(workers=3, preload=['json', 'decimal'], max_tasks=2) as pool:
+        print(pool)
+        pids, seconds = pool.warm()
+        print(f"Travailleurs prêts en {seconds:.3f}s: {sorted(pids)}")
+        for lot in range(3):
+            debut = time.time()
+            resultats = [tache.get() for tache in [pool.submit(calculs) for _ in range(3)]]
+            print(f"Lot {lot + 1}: {resultats} en {time.time() - debut:.3f}s")
+        print(f"{len(pool.pids)} PID vus, {pool.recycled} travailleur(s) recyclé(s)")